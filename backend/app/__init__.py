@@ -2,15 +2,23 @@ from flask import Flask, json
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from app.config import Config
+import logging
 import secrets
+import time
 import os
 
+logger = logging.getLogger(__name__)
+
 db = SQLAlchemy()   #データベース操作のツールを準備（定義）
 migrate = Migrate() #データベース構造の変更を管理（変更）
 
 def create_app():
+    started_at = time.perf_counter()  #起動時間の計測開始
     app = Flask(__name__)   #Flaskアプリケーションのインスタンスを作成
     app.config.from_object(Config)  #Configクラスの設定をFlaskアプリケーションに適用
+
+    from app.logging_config import configure_logging
+    configure_logging()   #ログを別スレッドで出力する設定（LOG_LEVEL / LOG_FORMAT）
     
     db.init_app(app)  #Flaskアプリとデータベースを接続
     migrate.init_app(app,db)    #スキーマ変更の管理を接続
@@ -18,20 +26,46 @@ def create_app():
     # secret_keyを設定（環境変数から取得、なければランダムなキーを生成）
     app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
 
-    first_request_handled = False #最初期のリクエスト前かどうかのフラグ
-
-    @app.before_request
-    def before_first_request():
-        nonlocal first_request_handled  #グローバル変数を関数内で使うときの宣言
-        if not first_request_handled:
-            from app.seeds import register_master_data  #初期処理としてマスタデータを登録
-            register_master_data()
-            first_request_handled = True    
+    from app.seeds import seed_command
+    app.cli.add_command(seed_command)   #マスタデータ登録コマンド（flask seed）
+    from app.services.word_batch import word_batch_cli
+    app.cli.add_command(word_batch_cli)   #用語モードのバッチ回答コマンド（flask word-batch submit / poll）
 
     from app.routes.qa_controller import question_bp
     from app.routes.auth_controller import auth_bp 
+    from app.routes.metrics_controller import metrics_bp
     app.register_blueprint(question_bp, url_prefix='/api/questions')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')  
+    app.register_blueprint(metrics_bp, url_prefix='/metrics')   #処理時間などのメトリクス（Prometheus形式）
+
+    from app.services.tracing import instrument_db_commits
+    instrument_db_commits()   #DBのコミット時間をスパンとして記録
+
+    with app.app_context():
+        if app.config['SEED_ON_STARTUP']:
+            from app.seeds import register_master_data  #起動時にマスタデータを登録
+            register_master_data()
+        _preload_master_data()
+
+    from app.services.question_worker import question_worker
+    question_worker.init_app(app)   #質問処理ワーカープールを起動
+
+    # ワーカーごとのコールドスタートにかかった時間を記録
+    app.config['STARTUP_SECONDS'] = time.perf_counter() - started_at
+    logger.info("Application startup took %.1f ms (pid %d).", app.config['STARTUP_SECONDS'] * 1000, os.getpid())
 
     return app
 
+
+def _preload_master_data():
+    """
+    最初のリクエストで読み込まずに済むよう、マスタデータを起動時に読み込む。
+    テーブル作成前（flask db upgrade 実行時など）は読み込みを省略する。
+    """
+    from app.repositories.master_data import master_data
+    try:
+        master_data.load()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Master data was not preloaded: %s", e)
+
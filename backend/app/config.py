@@ -1,6 +1,8 @@
 #アプリケーションの設定ファイル
 
+import json
 import os
+import tempfile
 from dotenv import load_dotenv
 
 
@@ -23,3 +25,176 @@ class Config:
 
     #データベースの変更追跡機能を無効
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    #質問処理ワーカーのスレッド数
+    QUESTION_WORKER_COUNT = int(os.getenv('QUESTION_WORKER_COUNT', '4'))
+
+    #質問処理キューの最大長（超えた場合は429を返す）
+    QUESTION_QUEUE_MAXSIZE = int(os.getenv('QUESTION_QUEUE_MAXSIZE', '100'))
+
+    #起動時にワーカーを開始し、PENDINGの質問を再投入するかどうか
+    QUESTION_WORKER_AUTOSTART = os.getenv('QUESTION_WORKER_AUTOSTART', 'True').lower() in ('true', '1')
+
+    #質問履歴の1ページあたりの最大件数（limit がこれを超える場合は400を返す）
+    QUESTION_HISTORY_MAX_LIMIT = int(os.getenv('QUESTION_HISTORY_MAX_LIMIT', '100'))
+
+    #質問の処理権（claim）の有効秒数（これを過ぎても完了していない質問は他のプロセスが処理し直せる）
+    QUESTION_CLAIM_LEASE_SECONDS = int(os.getenv('QUESTION_CLAIM_LEASE_SECONDS', '900'))
+
+    #PENDINGの質問をデータベースから再投入する間隔（秒）。処理権の期限が切れた質問（処理中に終了したプロセスの質問）を拾い直す。0で無効
+    QUESTION_RECOVERY_INTERVAL = float(os.getenv('QUESTION_RECOVERY_INTERVAL', '60'))
+
+    #最新情報モードのパイプライン（sync: 逐次実行、async: asyncioで並行実行）
+    LATEST_PIPELINE = os.getenv('LATEST_PIPELINE', 'sync')
+
+    #最新情報モードの回答の元にする情報（snippet: 検索結果のスニペット、scrape: ページ本文、compact: スニペットから並べ替えと回答生成を1回で行う）
+    LATEST_ANSWER_SOURCE = os.getenv('LATEST_ANSWER_SOURCE', 'snippet')
+
+    #非同期パイプラインでのスクレイピング・要約の同時実行数
+    LATEST_PIPELINE_CONCURRENCY = int(os.getenv('LATEST_PIPELINE_CONCURRENCY', '4'))
+
+    #非同期パイプラインの各段階のタイムアウト秒数
+    LATEST_OPENAI_TIMEOUT = float(os.getenv('LATEST_OPENAI_TIMEOUT', '30'))
+    LATEST_SEARCH_TIMEOUT = float(os.getenv('LATEST_SEARCH_TIMEOUT', '15'))
+    LATEST_SCRAPE_TIMEOUT = float(os.getenv('LATEST_SCRAPE_TIMEOUT', '10'))
+
+    #回答キャッシュの最大件数と、モードごとの有効期限（秒、0で無効）
+    ANSWER_CACHE_MAXSIZE = int(os.getenv('ANSWER_CACHE_MAXSIZE', '10000'))
+    ANSWER_CACHE_TTL_LATEST = float(os.getenv('ANSWER_CACHE_TTL_LATEST', '600'))
+    ANSWER_CACHE_TTL_WORD = float(os.getenv('ANSWER_CACHE_TTL_WORD', '604800'))
+
+    #Googleのユーザー情報キャッシュ（アクセストークンごと）の最大件数と、有効期限の上限（秒）
+    USER_INFO_CACHE_MAXSIZE = int(os.getenv('USER_INFO_CACHE_MAXSIZE', '10000'))
+    USER_INFO_CACHE_TTL = float(os.getenv('USER_INFO_CACHE_TTL', '300'))
+    #トークンの有効期限が分からない場合（ログイン時に有効期限を受け取っていないトークン）のキャッシュの有効期限（秒）
+    USER_INFO_CACHE_UNKNOWN_EXPIRY_TTL = float(os.getenv('USER_INFO_CACHE_UNKNOWN_EXPIRY_TTL', '60'))
+
+    #ユーザー行キャッシュの最大件数と有効期限（秒）
+    USER_CACHE_MAXSIZE = int(os.getenv('USER_CACHE_MAXSIZE', '10000'))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '600'))
+
+    #質問の完了を待つエンドポイント（ロングポーリング・SSE）の最大待機秒数と、SSEのキープアライブ間隔（秒）
+    QUESTION_WAIT_TIMEOUT = float(os.getenv('QUESTION_WAIT_TIMEOUT', '60'))
+    QUESTION_SSE_KEEPALIVE = float(os.getenv('QUESTION_SSE_KEEPALIVE', '15'))
+
+    #完了待ちの間にデータベースでステータスを確認し直す間隔（秒）。完了の通知はプロセス内のみのため、
+    #別のプロセス（flask word-batch poll、他のワーカープロセス）で完了した質問はこの確認で検知する
+    QUESTION_WAIT_POLL_INTERVAL = float(os.getenv('QUESTION_WAIT_POLL_INTERVAL', '2'))
+
+    #回答をストリーミングで生成し、/api/questions/<id>/stream に中継するかどうか
+    ANSWER_STREAMING = os.getenv('ANSWER_STREAMING', 'False').lower() in ('true', '1')
+
+    #起動時にマスタデータを登録するかどうか（通常は flask db upgrade または flask seed で登録）
+    SEED_ON_STARTUP = os.getenv('SEED_ON_STARTUP', 'False').lower() in ('true', '1')
+
+    #存在しないモード名・ステータス名を参照した際にマスタデータを読み込み直す最短の間隔（秒）
+    MASTER_DATA_RELOAD_INTERVAL = float(os.getenv('MASTER_DATA_RELOAD_INTERVAL', '60'))
+
+    #外部HTTP通信の接続プール（保持するホスト数と、ホストごとの最大接続数）
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '20'))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+
+    #接続先ごとのタイムアウト（秒）とリトライの設定
+    HTTP_CLIENT_PROFILES = {
+        'google_auth': {
+            'timeout': float(os.getenv('HTTP_GOOGLE_AUTH_TIMEOUT', '10')),
+            'retries': int(os.getenv('HTTP_GOOGLE_AUTH_RETRIES', '5')),
+            'backoff_factor': 1,
+            'retry_statuses': True
+        },
+        'google_search': {
+            'timeout': float(os.getenv('HTTP_GOOGLE_SEARCH_TIMEOUT', '10')),
+            'retries': int(os.getenv('HTTP_GOOGLE_SEARCH_RETRIES', '2')),
+            'backoff_factor': 0.5,
+            'retry_statuses': True
+        },
+        'scrape': {
+            'timeout': float(os.getenv('HTTP_SCRAPE_TIMEOUT', '10')),
+            'retries': int(os.getenv('HTTP_SCRAPE_RETRIES', '1')),
+            'backoff_factor': 0.3,
+            'retry_statuses': False
+        },
+        'duckduckgo_shim': {
+            'timeout': float(os.getenv('HTTP_DUCKDUCKGO_SHIM_TIMEOUT', '10')),
+            'retries': 0,
+            'backoff_factor': 0,
+            'retry_statuses': False
+        },
+    }
+
+    #検索結果キャッシュの最大件数、新しい結果とみなす秒数、期限切れ後も古い結果を返しつつ再検索する秒数
+    SEARCH_CACHE_MAXSIZE = int(os.getenv('SEARCH_CACHE_MAXSIZE', '1000'))
+    SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '1800'))
+    SEARCH_CACHE_STALE_TTL = float(os.getenv('SEARCH_CACHE_STALE_TTL', '86400'))
+    #検索結果キャッシュを再起動後も保持するSQLiteファイルのパス（空の場合はメモリのみ）
+    SEARCH_CACHE_DB_PATH = os.getenv('SEARCH_CACHE_DB_PATH', '')
+
+    #検索の方式（fallback: Googleのエラー時のみDuckDuckGo / hedged: 一定時間内に結果がなければ並行して検索）
+    SEARCH_STRATEGY = os.getenv('SEARCH_STRATEGY', 'fallback')
+    #hedged でDuckDuckGoの検索を開始するまでの秒数（0で最初から並行）
+    SEARCH_HEDGE_DELAY = float(os.getenv('SEARCH_HEDGE_DELAY', '1.0'))
+    #hedged で両方の結果をURLで重複を除いて結合するかどうかと、結合のためにもう一方を待つ最大秒数
+    SEARCH_MERGE = os.getenv('SEARCH_MERGE', 'False').lower() in ('true', '1')
+    SEARCH_MERGE_WAIT = float(os.getenv('SEARCH_MERGE_WAIT', '1.0'))
+    SEARCH_EXECUTOR_WORKERS = int(os.getenv('SEARCH_EXECUTOR_WORKERS', '8'))
+
+    #スクレイピングしたページのテキストを保存するディレクトリ（空の場合は保存しない）、合計サイズの上限（バイト）、再検証せずに使う秒数
+    PAGE_CACHE_DIR = os.getenv('PAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'seiji_talk_page_cache'))
+    PAGE_CACHE_MAX_BYTES = int(os.getenv('PAGE_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+    PAGE_CACHE_TTL = float(os.getenv('PAGE_CACHE_TTL', '3600'))
+
+    #HTMLからのテキスト抽出方式（auto: lxmlがあればlxml、なければstream / lxml / stream / bs4: 従来のBeautifulSoup）
+    HTML_EXTRACT_ENGINE = os.getenv('HTML_EXTRACT_ENGINE', 'auto')
+    #スクレイピングで読み込む本文の最大バイト数
+    SCRAPE_MAX_BYTES = int(os.getenv('SCRAPE_MAX_BYTES', str(2 * 1024 * 1024)))
+
+    #要約に送るページ内容のトークン予算と、各ページの要約を結合した内容のトークン予算（0で制限なし）
+    SUMMARY_PAGE_TOKEN_BUDGET = int(os.getenv('SUMMARY_PAGE_TOKEN_BUDGET', '1500'))
+    SUMMARY_COMBINED_TOKEN_BUDGET = int(os.getenv('SUMMARY_COMBINED_TOKEN_BUDGET', '1500'))
+    #トークン数の数え方（approx: ネットワークを使わない近似 / tiktoken: tiktokenがインストールされている場合に使用）
+    TOKEN_COUNTER = os.getenv('TOKEN_COUNTER', 'approx')
+
+    #検索結果の並べ替え方式（local: BM25とドメイン・鮮度による並べ替え / llm: OpenAIによる並べ替え / llm_index: OpenAIに番号のみを返させる並べ替え）
+    SEARCH_RANKER = os.getenv('SEARCH_RANKER', 'local')
+
+    #OpenAI APIのモデルごとの上限（1分あたりのリクエスト数・トークン数と同時実行数）
+    #OPENAI_MODEL_LIMITS にJSONで指定したモデルの値が default を上書きする（例: {"gpt-4o-mini": {"rpm": 5000, "tpm": 2000000}}）
+    OPENAI_MODEL_LIMITS = {
+        'default': {
+            'rpm': float(os.getenv('OPENAI_RPM', '500')),
+            'tpm': float(os.getenv('OPENAI_TPM', '200000')),
+            'concurrency': int(os.getenv('OPENAI_MAX_CONCURRENCY', '8'))
+        },
+        **json.loads(os.getenv('OPENAI_MODEL_LIMITS', '{}'))
+    }
+    #OpenAI APIの429・5xx・タイムアウト時の再試行回数と、バックオフの基準・上限秒数
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '4'))
+    OPENAI_BACKOFF_BASE = float(os.getenv('OPENAI_BACKOFF_BASE', '0.5'))
+    OPENAI_BACKOFF_MAX = float(os.getenv('OPENAI_BACKOFF_MAX', '20'))
+
+    #用語モードの回答方式（realtime: ワーカープールで都度生成 / batch: flask word-batch でOpenAIのBatch APIにまとめて投入）
+    WORD_ANSWER_MODE = os.getenv('WORD_ANSWER_MODE', 'realtime')
+    #1つのバッチに含める最大件数、バッチの完了期限、flask word-batch poll --wait の確認間隔（秒）
+    WORD_BATCH_MAX_QUESTIONS = int(os.getenv('WORD_BATCH_MAX_QUESTIONS', '1000'))
+    WORD_BATCH_COMPLETION_WINDOW = os.getenv('WORD_BATCH_COMPLETION_WINDOW', '24h')
+    WORD_BATCH_POLL_INTERVAL = float(os.getenv('WORD_BATCH_POLL_INTERVAL', '60'))
+    #投入済みのバッチと質問IDの対応を保存するファイル
+    WORD_BATCH_STATE_PATH = os.getenv('WORD_BATCH_STATE_PATH', os.path.join(tempfile.gettempdir(), 'seiji_talk_word_batches.json'))
+
+    #処理段階・外部呼び出しの所要時間（スパン）をメモリに保持する件数（/metrics/spans で参照）
+    TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '5000'))
+    #/metrics/spans の参照に必要なトークン（Authorization: Bearer で指定、空の場合はエンドポイントを無効にする）と、1回に返す最大件数
+    METRICS_SPANS_TOKEN = os.getenv('METRICS_SPANS_TOKEN', '')
+    METRICS_SPANS_MAX_LIMIT = int(os.getenv('METRICS_SPANS_MAX_LIMIT', '1000'))
+
+    #Googleの認証情報・Custom Search APIのキーを記載したファイル
+    GOOGLE_CONFIG_PATH = os.getenv('GOOGLE_CONFIG_PATH', os.path.join(basedir, 'google_config.json'))
+    #Googleのユーザー情報・Custom Search APIの接続先（ベンチマークでローカルの代替サーバーを使う場合に変更）
+    GOOGLE_USERINFO_URL = os.getenv('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v2/userinfo')
+    GOOGLE_SEARCH_API_URL = os.getenv('GOOGLE_SEARCH_API_URL', 'https://www.googleapis.com/customsearch/v1')
+    #DuckDuckGoの代わりに検索結果（DDGSと同じ形式のJSON）を取得するURL（ベンチマーク用、空の場合はDuckDuckGoを使用）
+    DUCKDUCKGO_SHIM_URL = os.getenv('DUCKDUCKGO_SHIM_URL', '')
+
+    #ログの出力レベル（DEBUG / INFO / WARNING / ERROR）と形式（json: 1行1件のJSON / text: 人が読む形式）
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
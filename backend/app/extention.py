@@ -1,13 +1,57 @@
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from collections import OrderedDict
 import http
+import threading
+import time
 
-def create_repeat_session() -> requests.Session:
+RETRY_STATUSES = [
+    http.HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    http.HTTPStatus.BAD_GATEWAY.value,
+    http.HTTPStatus.SERVICE_UNAVAILABLE.value,
+    http.HTTPStatus.GATEWAY_TIMEOUT.value,
+    http.HTTPStatus.REQUEST_TIMEOUT.value
+]
+"""再試行の対象とするHTTPステータスコード"""
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    リクエスト時にタイムアウトが指定されなかった場合、既定のタイムアウトを適用するアダプタです。
+    """
+
+    def __init__(self, *args, timeout: float | None = None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_repeat_session(
+    retries: int = 5,
+    backoff_factor: float = 1,
+    retry_statuses: bool = True,
+    timeout: float | None = None,
+    pool_connections: int = 10,
+    pool_maxsize: int = 10
+) -> requests.Session:
     """
     再試行機能付きのHTTPセッションを作成する関数です。
-    この関数は、指定されたステータスコードに対して最大5回のリトライを設定し、
+    既定では、指定されたステータスコードに対して最大5回のリトライを設定し、
     各リトライの間に指数バックオフを適用します。
+    セッションはKeep-Aliveで接続を使い回すため、呼び出し側で共有して使用してください。
+
+    Args:
+        retries (int): 最大リトライ回数。
+        backoff_factor (float): 指数バックオフの係数。
+        retry_statuses (bool): RETRY_STATUSES のステータスコードでもリトライするかどうか。
+        timeout (float | None): リクエストごとに指定がない場合のタイムアウト（秒）。
+        pool_connections (int): 接続プールを保持するホストの数。
+        pool_maxsize (int): ホストごとに保持する接続の最大数。
 
     Returns:
         requests.Session: 再試行機能を持つセッションオブジェクト。
@@ -15,16 +59,126 @@ def create_repeat_session() -> requests.Session:
     
     session = requests.Session()
     retry = Retry(
-        total=5, 
-        backoff_factor=1,
-        status_forcelist=[
-                          http.HTTPStatus.INTERNAL_SERVER_ERROR.value,
-                          http.HTTPStatus.BAD_GATEWAY.value,
-                          http.HTTPStatus.SERVICE_UNAVAILABLE.value,
-                          http.HTTPStatus.GATEWAY_TIMEOUT.value,
-                          http.HTTPStatus.REQUEST_TIMEOUT.value
-                          ], 
+        total=retries, 
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES if retry_statuses else None, 
+    )
+    adapter = TimeoutHTTPAdapter(
+        max_retries=retry,
+        timeout=timeout,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize
     )
-    adapter = HTTPAdapter(max_retries=retry)
     session.mount("https://", adapter)
-    return session
\ No newline at end of file
+    session.mount("http://", adapter)
+    return session
+
+
+_http_sessions: dict[str, requests.Session] = {}
+_http_sessions_lock = threading.Lock()
+
+
+def get_http_session(name: str) -> requests.Session:
+    """
+    接続先ごとに共有するHTTPセッションを取得します。
+    初回呼び出し時に Config.HTTP_CLIENT_PROFILES の設定（タイムアウト・リトライ）と
+    接続プールの設定で作成し、以降は同じセッションを返します。
+
+    Args:
+        name (str): 接続先の名前（例: "google_auth", "google_search", "scrape"）。
+
+    Returns:
+        requests.Session: 接続先ごとに共有されるセッション。
+    """
+    from app.config import Config
+
+    with _http_sessions_lock:
+        session = _http_sessions.get(name)
+        if session is None:
+            profile = Config.HTTP_CLIENT_PROFILES[name]
+            session = create_repeat_session(
+                retries=profile["retries"],
+                backoff_factor=profile["backoff_factor"],
+                retry_statuses=profile["retry_statuses"],
+                timeout=profile["timeout"],
+                pool_connections=Config.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=Config.HTTP_POOL_MAXSIZE
+            )
+            _http_sessions[name] = session
+        return session
+
+
+class TTLCache:
+    """
+    有効期限付きのLRUキャッシュです。
+    最大件数を超えた場合は最も長く参照されていない要素から削除します。
+    複数スレッドから同時に利用できます。
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        """
+        Args:
+            maxsize (int): 保持する最大件数。
+            ttl (float | None): 既定の有効期限（秒）。Noneの場合は期限なし。
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        キーに対応する値を取得します。期限切れの場合は削除してdefaultを返します。
+
+        Args:
+            key: キャッシュのキー。
+            default: 見つからない場合に返す値。
+
+        Returns:
+            キャッシュされた値、またはdefault。
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        """
+        値を登録します。
+
+        Args:
+            key: キャッシュのキー。
+            value: 登録する値。
+            ttl (float | None): 有効期限（秒）。省略時は既定の有効期限。
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """
+        キーに対応する値を削除します。
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        すべての値を削除します。
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,88 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from app.config import Config
+from app.services.tracing import current_tags
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    ログをキューに積むだけのハンドラ（出力は QueueListener のスレッドで行う）
+
+    呼び出し元のスレッドでメッセージを組み立て、質問IDとモード（tracing の bind で設定した値）と
+    例外のトレースバックをレコードに付けてからキューに積む。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.question_id, record.mode = current_tags()
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    ログを1行のJSONとして出力するフォーマッタ
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        for key in ("question_id", "mode"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+_listener: QueueListener | None = None
+_listener_lock = threading.Lock()
+
+
+def configure_logging():
+    """
+    app 以下のロガーの出力先を設定する。複数回呼び出しても設定は1度だけ行う。
+
+    ログはキューに積み、別スレッドの QueueListener が標準出力に書き出すため、
+    リクエスト・ワーカースレッドが標準出力への書き込みで待たされることはない。
+    LOG_LEVEL 未満のログはメッセージの組み立ても行わない。
+    """
+    global _listener
+
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter() if Config.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+        log_queue = queue.Queue(-1)
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        logger = logging.getLogger("app")
+        logger.setLevel(Config.LOG_LEVEL.upper())
+        logger.addHandler(ContextQueueHandler(log_queue))
+        logger.propagate = False
@@ -1,24 +1,55 @@
 from app import db
 from sqlalchemy.orm import Mapped
+import hashlib
 import uuid
 from sqlalchemy.dialects.mysql import CHAR
 
+
+def hash_message(message: str) -> str:
+    """
+    質問内容のハッシュ値（SHA-256の16進数表記）を返す。
+    質問の重複チェックで、長い質問内容の代わりに索引付きの列として比較するために使う。
+
+    Args:
+        message (str): 質問内容。
+
+    Returns:
+        str: 64文字の16進数文字列。
+    """
+    return hashlib.sha256(message.encode("utf-8")).hexdigest()
+
+
 class Question(db.Model):
     """
     質問クラス
     """
     __tablename__ = 'questions'
+    __table_args__ = (
+        # 重複チェック（同じユーザー・モード・質問内容）用。同時に登録された重複も一意制約で防ぐ
+        db.Index('ix_questions_user_mode_message_hash', 'user_id', 'mode_id', 'message_hash', unique=True),
+        # 履歴の取得（ユーザーごとに作成日時・ID順のキーセットページング）用
+        db.Index('ix_questions_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
 
     id: str = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     """質問ID"""
     message: str = db.Column(db.String(512), nullable=False)    
     """質問内容"""
+    message_hash: str = db.Column(
+        db.String(64), nullable=False,
+        default=lambda context: hash_message(context.get_current_parameters()['message'])
+    )
+    """質問内容のハッシュ値（hash_message）"""
     user_id: str = db.Column(db.String(32), db.ForeignKey('users.id'), nullable=False)
     """ユーザーID"""
     status_id: int = db.Column(db.Integer, db.ForeignKey('statuses.id'), nullable=False)
     """ステータスID"""
     mode_id: int = db.Column(db.Integer, db.ForeignKey('modes.id'), nullable=False)
     """モードID"""
+    claimed_by: str = db.Column(db.String(64), nullable=True)
+    """処理中のワーカー（ホスト名:プロセスID）"""
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    """処理を開始した日時（UTC）"""
     updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
     """更新日時"""
     created_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
@@ -137,7 +168,7 @@ class RelatedWord(db.Model):
 
     id: int = db.Column(db.Integer, primary_key=True)
     """関連語ID"""
-    answer_id: int = db.Column(db.Integer, db.ForeignKey('answers.id'), nullable=False)
+    answer_id: int = db.Column(db.Integer, db.ForeignKey('answers.id'), nullable=False, index=True)
     """回答ID"""
     related_word: str = db.Column(db.String(64), nullable=False)
     """関連語"""
@@ -159,7 +190,7 @@ class Reference(db.Model):
 
     id: int = db.Column(db.Integer, primary_key=True)
     """参考記事リンクID"""
-    answer_id: int = db.Column(db.Integer, db.ForeignKey('answers.id'), nullable=False)
+    answer_id: int = db.Column(db.Integer, db.ForeignKey('answers.id'), nullable=False, index=True)
     """回答ID"""
     title: str = db.Column(db.String(128), nullable=False)
     """記事名"""
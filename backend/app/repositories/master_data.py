@@ -0,0 +1,132 @@
+import threading
+import time
+
+from app.config import Config
+from app.models.model import Mode, Status
+
+
+class MasterDataRegistry:
+    """
+    モード・ステータスのマスタデータをプロセス内に保持するレジストリ
+
+    マスタデータは seeds.register_master_data で登録される固定データのため、
+    初回参照時に一度だけ読み込み、以降は名前とIDの相互変換をクエリなしで行う。
+    マスタデータを変更した場合は invalidate で読み込み直す。
+
+    読み込んだデータは変更しない辞書の組として1つの属性で差し替えるため、
+    参照中に invalidate や load が実行されても、参照側は取得した時点の組を使い続けられる。
+    """
+
+    def __init__(self, reload_interval: float):
+        """
+        Args:
+            reload_interval (float): 見つからない名前・IDを参照した際に読み込み直す最短の間隔（秒）。
+        """
+        self._lock = threading.Lock()
+        self._tables: dict[str, dict] | None = None
+        """{"_mode_ids": {...}, "_mode_names": {...}, "_status_ids": {...}, "_status_names": {...}}"""
+        self._reload_interval = reload_interval
+        self._last_loaded_at = float("-inf")
+
+    def load(self) -> dict[str, dict]:
+        """
+        マスタデータをデータベースから読み込む。アプリケーションコンテキスト内で呼び出す。
+        起動時に呼び出しておくと、最初のリクエストでの読み込みを省ける。
+
+        Returns:
+            dict[str, dict]: 読み込んだマスタデータ。
+        """
+        modes = Mode.query.all()
+        statuses = Status.query.all()
+        tables = {
+            "_mode_ids": {mode.name: mode.id for mode in modes},
+            "_mode_names": {mode.id: mode.name for mode in modes},
+            "_status_ids": {status.name: status.id for status in statuses},
+            "_status_names": {status.id: status.name for status in statuses}
+        }
+        with self._lock:
+            self._tables = tables
+            self._last_loaded_at = time.monotonic()
+        return tables
+
+    def _reload_on_miss(self) -> dict[str, dict] | None:
+        """
+        見つからない名前・IDを参照した際に読み込み直す。前回の読み込みから reload_interval 秒
+        経っていない場合や、他のスレッドが読み込み直している場合は読み込まずにNoneを返す
+        （存在しないモード名を指定したリクエストのたびにクエリを発行しないように）。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_loaded_at < self._reload_interval:
+                return None
+            self._last_loaded_at = now
+        return self.load()
+
+    def _lookup(self, table_name: str, key, label: str):
+        """
+        名前またはIDで検索する。見つからない場合は読み込み直してから再検索する（_reload_on_miss）。
+        """
+        tables = self._tables
+        if tables is None:
+            tables = self.load()
+        value = tables[table_name].get(key)
+        if value is None:
+            tables = self._reload_on_miss()
+            if tables is not None:
+                value = tables[table_name].get(key)
+        if value is None:
+            raise ValueError(f"{label} '{key}' not found.")
+        return value
+
+    def mode_id(self, name: str) -> int:
+        """
+        モード名からモードIDを取得する。
+
+        Args:
+            name (str): モード名。
+
+        Returns:
+            int: モードID。
+
+        Raises:
+            ValueError: モードが存在しない場合。
+        """
+        return self._lookup("_mode_ids", name, "Mode")
+
+    def mode_name(self, mode_id: int) -> str:
+        """
+        モードIDからモード名を取得する。
+        """
+        return self._lookup("_mode_names", mode_id, "Mode")
+
+    def status_id(self, name: str) -> int:
+        """
+        ステータス名からステータスIDを取得する。
+
+        Args:
+            name (str): ステータス名。
+
+        Returns:
+            int: ステータスID。
+
+        Raises:
+            ValueError: ステータスが存在しない場合。
+        """
+        return self._lookup("_status_ids", name, "Status")
+
+    def status_name(self, status_id: int) -> str:
+        """
+        ステータスIDからステータス名を取得する。
+        """
+        return self._lookup("_status_names", status_id, "Status")
+
+    def invalidate(self):
+        """
+        保持しているマスタデータを破棄し、次回参照時に読み込み直す。
+        """
+        with self._lock:
+            self._tables = None
+            self._last_loaded_at = float("-inf")
+
+
+master_data = MasterDataRegistry(Config.MASTER_DATA_RELOAD_INTERVAL)
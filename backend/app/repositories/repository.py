@@ -1,4 +1,21 @@
-from app.models.model import db, Question,Mode,Answer,RelatedWord,Reference,Status,User
+from app.models.model import db, Question,Mode,Answer,RelatedWord,Reference,Status,User, hash_message
+from app.repositories.master_data import master_data
+from sqlalchemy import or_, and_, insert, update, literal, String
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, make_transient_to_detached
+from app.config import Config
+from app.extention import TTLCache
+from datetime import datetime, timedelta, timezone
+import base64
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+user_cache = TTLCache(Config.USER_CACHE_MAXSIZE, Config.USER_CACHE_TTL)
+"""ユーザーIDをキーにした、セッションに属さないユーザーオブジェクトのキャッシュ"""
+
 
 class SeijiTalkRepository:
     """
@@ -34,10 +51,16 @@ class SeijiTalkRepository:
             if not user_id:
                 raise ValueError("User info must contain an ID")
 
+            # キャッシュにあればクエリを発行せずにセッションへ結び付ける
+            cached_user = user_cache.get(user_id)
+            if cached_user is not None:
+                return db.session.merge(cached_user, load=False)
+
             # ユーザーが既に存在するか確認
             existing_user = SeijiTalkRepository.find_user_by_id(user_id)
             if existing_user:
-                print(f"User {user_id} already exists.")
+                logger.debug("User %s already exists.", user_id)
+                SeijiTalkRepository._cache_user(existing_user.id, existing_user.email, existing_user.name)
                 return existing_user
 
             # 新規ユーザーを作成
@@ -48,21 +71,33 @@ class SeijiTalkRepository:
             )
             db.session.add(new_user)
             db.session.commit()
-            print(f"User {user_id} added to the database.")
+            logger.info("User %s added to the database.", user_id)
+            SeijiTalkRepository._cache_user(user_id, user_info.get("email"), user_info.get("name"))
             return new_user
 
         except Exception as e:
             # エラー発生時にロールバック
             db.session.rollback()
-            print(f"Error occurred while adding user: {e}")
+            logger.error("Error occurred while adding user: %s", e)
             raise
 
     
 
+    @staticmethod
+    def _cache_user(user_id: str, email: str, name: str):
+        """
+        ユーザーをキャッシュに登録する。
+        セッション間で共有できるよう、どのセッションにも属さない複製を保持する。
+        """
+        user = User(id=user_id, email=email, name=name)
+        make_transient_to_detached(user)
+        user_cache.set(user_id, user)
+
     @staticmethod
     def create_question(user_id: str, message: str, mode_name: str) -> Question:
         """
         質問をデータベースに登録する。
+        同じ質問が登録済みの場合はその質問を返す（FAILUREの場合はPENDINGに戻す）。
 
         Args:
             user_id (str): 登録するユーザーID。
@@ -73,40 +108,386 @@ class SeijiTalkRepository:
             Question: 登録された質問オブジェクト。
         """
 
-        # モードを取得
-        mode = Mode.query.filter_by(name=mode_name).first()
-        if not mode:
-            raise ValueError(f"Mode '{mode_name}' not found.")
+        # モードを取得（マスタデータはレジストリから参照し、クエリを発行しない）
+        mode_id = master_data.mode_id(mode_name)
 
         # ステータスをデフォルトで「PENDING」に設定
-        status = Status.query.filter_by(name="PENDING").first()
-        if not status:
-            raise ValueError("Default status 'PENDING' not found.")
+        status_id = master_data.status_id("PENDING")
 
-        # 質問の重複チェック
-        existing_question = Question.query.filter_by(
-            user_id=user_id,
-            message=message,
-            mode_id=mode.id
-        ).first()
+        # 質問の重複チェック（質問内容ではなく、索引のあるハッシュ値で検索する）
+        message_hash = hash_message(message)
+        existing_question = SeijiTalkRepository.find_duplicate_question(user_id, mode_id, message_hash)
         if existing_question:
-            print(f"Question already exists: {existing_question.id}")
-            return existing_question
+            logger.debug("Question already exists: %s", existing_question.id)
+            return SeijiTalkRepository.reopen_failed_question(existing_question)
 
         # 新しい質問を登録
         new_question = Question(
             message=message,
+            message_hash=message_hash,
             user_id=user_id,
-            status_id=status.id,
-            mode_id=mode.id
+            status_id=status_id,
+            mode_id=mode_id
         )
         db.session.add(new_question)
-        db.session.commit()
-        print(f"Question {new_question.id} added to the database.")
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 同じ質問が同時に登録された場合は一意制約で弾かれるため、先に登録された質問を返す
+            db.session.rollback()
+            existing_question = SeijiTalkRepository.find_duplicate_question(user_id, mode_id, message_hash)
+            if existing_question is None:
+                raise
+            logger.debug("Question already exists: %s", existing_question.id)
+            return SeijiTalkRepository.reopen_failed_question(existing_question)
+        logger.debug("Question %s added to the database.", new_question.id)
         return new_question
 
+    @staticmethod
+    def find_duplicate_question(user_id: str, mode_id: int, message_hash: str) -> Question | None:
+        """
+        同じユーザー・モード・質問内容の質問を取得する。
+
+        Args:
+            user_id (str): ユーザーID。
+            mode_id (int): モードID。
+            message_hash (str): 質問内容のハッシュ値（hash_message）。
+
+        Returns:
+            Question | None: 登録済みの質問、存在しない場合はNone。
+        """
+        return Question.query.filter_by(
+            user_id=user_id,
+            mode_id=mode_id,
+            message_hash=message_hash
+        ).first()
+
             
 
+    @staticmethod
+    def _question_with_answer_options() -> list:
+        """
+        質問と、その回答・回答の子要素をまとめて読み込むためのオプション。
+        モード・ステータスはマスタデータのレジストリから参照する。
+        件数によらず一定回数のクエリで取得できる。
+        """
+        return [
+            selectinload(Question.answers).selectinload(Answer.references),
+            selectinload(Question.answers).selectinload(Answer.related_words)
+        ]
+
+    @staticmethod
+    def find_question_with_answer(question_id: str) -> Question:
+        """
+        質問IDで質問を検索し、回答と参考記事・関連語も合わせて読み込む。
+
+        Args:
+            question_id (str): 検索する質問ID。
+
+        Returns:
+            Question: 見つかった質問オブジェクト、または None。
+        """
+        return Question.query\
+            .options(*SeijiTalkRepository._question_with_answer_options())\
+            .filter_by(id=question_id)\
+            .first()
+
+    @staticmethod
+    def release_connection():
+        """
+        現在のトランザクションを終了し、データベース接続をプールに返す。
+        長時間待機するリクエストが接続を保持し続けないようにするために使う。
+        """
+        db.session.commit()
+
+    @staticmethod
+    def find_question_status_id(question_id: str) -> int | None:
+        """
+        質問のステータスIDのみを取得し、データベース接続をプールに返す。
+        完了待ちの間に、別のプロセスで処理が完了したかどうかを確認するために使う。
+
+        Args:
+            question_id (str): 質問ID。
+
+        Returns:
+            int | None: ステータスID、質問が存在しない場合はNone。
+        """
+        status_id = db.session.query(Question.status_id).filter(Question.id == question_id).scalar()
+        db.session.commit()
+        return status_id
+
+    @staticmethod
+    def reload_question_with_answer(question_id: str) -> Question:
+        """
+        現在のトランザクションを終了してから質問を取得し直す。
+        別スレッドで更新されたステータスや回答を読み取るために使う。
+
+        Args:
+            question_id (str): 検索する質問ID。
+
+        Returns:
+            Question: 見つかった質問オブジェクト、または None。
+        """
+        db.session.commit()
+        return SeijiTalkRepository.find_question_with_answer(question_id)
+
+    @staticmethod
+    def encode_history_cursor(question: Question) -> str:
+        """
+        質問履歴の次ページを取得するためのカーソルを作成する。
+
+        Args:
+            question (Question): ページの最後の質問。
+
+        Returns:
+            str: (created_at, id) をエンコードしたカーソル文字列。
+        """
+        raw = json.dumps([question.created_at.isoformat(), question.id])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_history_cursor(cursor: str) -> tuple[datetime, str]:
+        """
+        encode_history_cursor で作成したカーソルを復元する。
+
+        Args:
+            cursor (str): カーソル文字列。
+
+        Returns:
+            tuple[datetime, str]: 作成日時と質問ID。
+
+        Raises:
+            ValueError: カーソルの形式が不正な場合。
+        """
+        try:
+            created_at, question_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(created_at), str(question_id)
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    @staticmethod
+    def get_question_history(user_id: str, limit: int, cursor: str | None = None, offset: int = 0) -> tuple[list[Question], str | None]:
+        """
+        ユーザーの質問履歴を新しい順に取得する。回答と子要素もまとめて読み込む。
+
+        cursor を指定した場合は (created_at, id) によるキーセットページングで、
+        そのカーソルより古い質問を取得する。指定しない場合は offset を使用する。
+
+        Args:
+            user_id (str): ユーザーID。
+            limit (int): 取得する最大件数。
+            cursor (str | None): 前ページの next_cursor。
+            offset (int): cursor を指定しない場合の読み飛ばし件数。
+
+        Returns:
+            tuple:
+                - list[Question]: 質問オブジェクトのリスト。
+                - str | None: 次ページのカーソル。続きがない場合は None。
+        """
+        query = Question.query\
+            .options(*SeijiTalkRepository._question_with_answer_options())\
+            .filter(Question.user_id == user_id)\
+            .order_by(Question.created_at.desc(), Question.id.desc())
+
+        if cursor:
+            created_at, question_id = SeijiTalkRepository.decode_history_cursor(cursor)
+            value = created_at
+            if db.engine.dialect.name == "sqlite":
+                # SQLiteのCURRENT_TIMESTAMPはマイクロ秒なしの文字列で保存されるため、比較する値の形式を揃える
+                # （列を関数で変換すると (user_id, created_at, id) の索引が使われなくなる）
+                timespec = "microseconds" if created_at.microsecond else "seconds"
+                value = literal(created_at.isoformat(sep=" ", timespec=timespec), String)
+            query = query.filter(or_(
+                Question.created_at < value,
+                and_(Question.created_at == value, Question.id < question_id)
+            ))
+        elif offset:
+            query = query.offset(offset)
+
+        if limit <= 0:
+            return [], None
+
+        # 次ページの有無を判定するため1件多く取得する
+        questions = query.limit(limit + 1).all()
+
+        if len(questions) <= limit:
+            return questions, None
+        questions = questions[:limit]
+        return questions, SeijiTalkRepository.encode_history_cursor(questions[-1])
+
+    @staticmethod
+    def claim_cutoff() -> datetime:
+        """
+        この日時より前に取得された処理権は期限切れとみなす（QUESTION_CLAIM_LEASE_SECONDS）。
+        """
+        return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=Config.QUESTION_CLAIM_LEASE_SECONDS)
+
+    @staticmethod
+    def claim_question(question_id: str, worker_id: str) -> bool:
+        """
+        PENDINGの質問の処理権を1文のUPDATEで取得する。
+        複数のプロセス・ホストが同じ質問を投入しても、処理権を取得できるのは1つだけになる。
+        処理権の期限が切れた質問（処理中のプロセスが終了した場合など）は取得し直せる。
+
+        Args:
+            question_id (str): 質問ID。
+            worker_id (str): 処理するワーカーの識別子。
+
+        Returns:
+            bool: 処理権を取得できた場合はTrue。
+        """
+        try:
+            result = db.session.execute(
+                update(Question)
+                .where(
+                    Question.id == question_id,
+                    Question.status_id == master_data.status_id("PENDING"),
+                    or_(Question.claimed_at.is_(None), Question.claimed_at < SeijiTalkRepository.claim_cutoff())
+                )
+                .values(claimed_by=worker_id, claimed_at=datetime.now(timezone.utc).replace(tzinfo=None))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return result.rowcount == 1
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error occurred while claiming question %s: %s", question_id, e)
+            raise
+
+    @staticmethod
+    def reopen_failed_question(question: Question) -> Question:
+        """
+        FAILUREの質問をPENDINGに戻し、処理権を解放する（同じ質問を再度受け付けた場合に回答し直すため）。
+        FAILURE以外の質問はそのまま返す。同時に再度受け付けた場合も、更新は1文のUPDATEで1回だけ行われる。
+
+        Args:
+            question (Question): 対象の質問オブジェクト。
+
+        Returns:
+            Question: 更新後の質問オブジェクト。
+        """
+        failure_id = master_data.status_id("FAILURE")
+        if question.status_id != failure_id:
+            return question
+
+        try:
+            result = db.session.execute(
+                update(Question)
+                .where(Question.id == question.id, Question.status_id == failure_id)
+                .values(status_id=master_data.status_id("PENDING"), claimed_by=None, claimed_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            db.session.refresh(question)
+            if result.rowcount == 1:
+                logger.info("Question %s reopened after FAILURE.", question.id)
+            return question
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error occurred while reopening question %s: %s", question.id, e)
+            raise
+
+    @staticmethod
+    def mark_question_failed(question: Question):
+        """
+        処理中の質問のステータスをFAILUREに更新する。
+        既に回答が保存され、PENDINGでなくなっている場合は何もしない。
+
+        Args:
+            question (Question): 対象の質問オブジェクト。
+        """
+        try:
+            db.session.refresh(question)
+            if question.status_id != master_data.status_id("PENDING"):
+                return
+
+            question.status_id = master_data.status_id("FAILURE")
+            db.session.commit()
+            logger.info("Question %s marked as FAILURE.", question.id)
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error occurred while marking question as failed: %s", e)
+            raise
+
+    @staticmethod
+    def _insert_answer_if_absent(question_id: str, answer_message: str) -> int | None:
+        """
+        回答を登録する。同じ質問の回答が既にある場合（answers.question_id の一意制約の重複）は登録しない。
+        重複以外のエラー（長すぎる文字列、NULL、外部キー違反など）はそのまま送出する。
+
+        Args:
+            question_id (str): 質問ID。
+            answer_message (str): 回答内容。
+
+        Returns:
+            int | None: 登録した回答のID、既に回答がある場合はNone。
+        """
+        answers = Answer.__table__
+        if db.engine.dialect.name == "sqlite":
+            # 競合の対象を question_id の一意制約に限定するため、それ以外の制約違反はエラーになる
+            result = db.session.execute(
+                sqlite_insert(answers).values(question_id=question_id, message=answer_message)
+                .on_conflict_do_nothing(index_elements=[answers.c.question_id])
+            )
+            return result.lastrowid if result.rowcount else None
+
+        # MySQLの INSERT IGNORE は重複以外のエラーも警告にして登録を省略するため使わず、
+        # セーブポイント内で登録して一意制約の重複のみを既存の回答ありとして扱う
+        try:
+            with db.session.begin_nested():
+                result = db.session.execute(insert(answers).values(question_id=question_id, message=answer_message))
+        except IntegrityError:
+            if Answer.query.filter_by(question_id=question_id).first() is None:
+                raise
+            return None
+        return result.inserted_primary_key[0]
+
+    @staticmethod
+    def _save_answer(question: Question, answer_message: str, child_model, children: list[dict]) -> Answer:
+        """
+        回答・子要素（参考記事または関連語）の登録と、質問のステータスのSUCCESSへの更新を
+        1つのトランザクションで行う。子要素の件数によらず、回答の登録・子要素の一括登録・
+        ステータスの更新の一定数の文で済む（MySQLでは回答の登録をセーブポイントで囲む）。
+
+        Args:
+            question (Question): 回答対象の質問オブジェクト。
+            answer_message (str): 回答内容。
+            child_model: Reference または RelatedWord。
+            children (list[dict]): 子要素の列の値（answer_id を除く）のリスト。
+
+        Returns:
+            Answer: 登録された回答オブジェクト。既に回答がある場合はその回答。
+        """
+        answer_id = SeijiTalkRepository._insert_answer_if_absent(question.id, answer_message)
+        if answer_id is None:
+            existing_answer = Answer.query.filter_by(question_id=question.id).first()
+            if existing_answer is None:
+                raise ValueError(f"Answer for Question {question.id} could not be inserted.")
+            logger.debug("Answer for Question %s already exists.", question.id)
+            return existing_answer  # 既存の回答を返す
+
+        if children:
+            db.session.execute(
+                insert(child_model.__table__).values([{**child, "answer_id": answer_id} for child in children])
+            )
+
+        # 質問のステータスをSUCCESSに更新（セッション内の質問オブジェクトにも反映される）
+        db.session.execute(
+            update(Question).where(Question.id == question.id).values(status_id=master_data.status_id("SUCCESS"))
+        )
+
+        # 登録した回答をクエリを発行せずにセッションへ結び付ける（作成日時などは参照時に読み込む）
+        new_answer = Answer(id=answer_id, question_id=question.id, message=answer_message)
+        make_transient_to_detached(new_answer)
+        new_answer = db.session.merge(new_answer, load=False)
+
+        # コミットして保存
+        db.session.commit()
+        return new_answer
+
     @staticmethod
     def save_latest_answer(question: Question, result_data: dict):
         """
@@ -138,46 +519,19 @@ class SeijiTalkRepository:
 
             if not answer_message:
                 raise ValueError("Answer message is missing in result_data.")
-            
-
-
-            existing_answer = Answer.query.filter_by(question_id=question.id).first()
 
-            if existing_answer:
-                print(f"Answer for Question {question.id} already exists.")
-                return existing_answer  # 既存の回答を返す
-            
-            # 新しい回答を登録
-            new_answer = Answer(
-                question_id=question.id,
-                message=answer_message
-            )
-            db.session.add(new_answer)
-
-            # 参考記事を登録
-            for reference in references:
-                new_reference = Reference(
-                    answer=new_answer,
-                    title=reference.get("title"),
-                    url=reference.get("url")
-                )
-                db.session.add(new_reference)
-
-            # 質問のステータスをSUCCESSに更新
-            success_status = Status.query.filter_by(name="SUCCESS").first()
-            if not success_status:
-                raise ValueError("Default status 'SUCCESS' not found.")
-            question.status_id = success_status.id
-
-            # コミットして保存
-            db.session.commit()
-            print(f"Answer for Question {question.id} saved successfully.")
-            return new_answer
+            # 回答・参考記事・ステータスをまとめて保存
+            answer = SeijiTalkRepository._save_answer(question, answer_message, Reference, [
+                {"title": reference.get("title"), "url": reference.get("url")}
+                for reference in references
+            ])
+            logger.debug("Answer for Question %s saved successfully.", question.id)
+            return answer
 
         except Exception as e:
             # エラー発生時にロールバック
             db.session.rollback()
-            print(f"Error occurred while saving answer and references: {e}")
+            logger.error("Error occurred while saving answer and references: %s", e)
             raise
 
     @staticmethod
@@ -206,41 +560,15 @@ class SeijiTalkRepository:
             if not isinstance(related_words, list):
                 raise ValueError("Related words must be a list.")
 
-
-            existing_answer = Answer.query.filter_by(question_id=question.id).first()
-
-            if existing_answer:
-                print(f"Answer for Question {question.id} already exists.")
-                return existing_answer  # 既存の回答を返す
-            
-            # 新しい回答を登録
-            new_answer = Answer(
-                question_id=question.id,
-                message=answer_message
-            )
-            db.session.add(new_answer)
-
-            # 関連語を登録
-            for word in related_words:
-                new_related_word = RelatedWord(
-                    answer=new_answer,
-                    related_word=word
-                )
-                db.session.add(new_related_word)
-
-            # 質問のステータスをSUCCESSに更新
-            success_status = Status.query.filter_by(name="SUCCESS").first()
-            if not success_status:
-                raise ValueError("Default status 'SUCCESS' not found.")
-            question.status_id = success_status.id
-
-            # コミットして保存
-            db.session.commit()
-            print(f"Answer and related words for Question {question.id} saved successfully.")
-            return new_answer
+            # 回答・関連語・ステータスをまとめて保存
+            answer = SeijiTalkRepository._save_answer(question, answer_message, RelatedWord, [
+                {"related_word": word} for word in related_words
+            ])
+            logger.debug("Answer and related words for Question %s saved successfully.", question.id)
+            return answer
 
         except Exception as e:
             # エラー発生時にロールバック
             db.session.rollback()
-            print(f"Error occurred while saving answer and related words: {e}")
-            raise
\ No newline at end of file
+            logger.error("Error occurred while saving answer and related words: %s", e)
+            raise
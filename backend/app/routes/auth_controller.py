@@ -2,7 +2,7 @@ from flask import Blueprint,redirect, make_response, session, request, jsonify,
 import uuid
 import http
 from app.services.google_auth_service import (
-	validate_state,fetch_google_token,fetch_user_info,generate_auth_url
+	validate_state,fetch_google_token,fetch_user_info,generate_auth_url,cache_user_info
 )
 
 auth_bp = Blueprint('api/auth', __name__)
@@ -54,6 +54,9 @@ def auth_callback() -> Response:
     if not user_info:
         return jsonify({"error": "Failed to fetch user info", "details": user_info_error}), http.HTTPStatus.BAD_REQUEST.value
 
+    # トークンの有効期限までユーザー情報をキャッシュし、以降のAPI呼び出しでGoogleへの問い合わせを省く
+    cache_user_info(access_token, user_info, token_data.get("expires_in"))
+
     return jsonify({
         "access_token": access_token,
         "expires_in": token_data.get("expires_in"),
@@ -0,0 +1,78 @@
+import hmac
+
+from flask import Blueprint, jsonify, request, current_app, Response
+from app.services.answer_cache import answer_cache
+from app.services.search_cache import search_cache
+from app.services.question_worker import question_worker
+from app.services.tracing import tracer
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def _metric(lines: list[str], name: str, metric_type: str, help_text: str, values: dict[str, float]):
+    """
+    1つのメトリクスをPrometheusのテキスト形式で lines に追加する。
+    values のキーはラベル（'key="value"' 形式、空文字の場合はラベルなし）。
+    """
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    for labels, value in values.items():
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+
+@metrics_bp.route('', methods=['GET'])
+def get_metrics() -> Response:
+    """
+    処理段階・外部呼び出しの所要時間のヒストグラムと、キャッシュ・ワーカーの状態を
+    Prometheusのテキスト形式で返すエンドポイントです。
+
+    Returns:
+        Response: text/plain; version=0.0.4 のメトリクス。
+    """
+    lines = tracer.render_prometheus()
+
+    answer_stats = answer_cache.stats()
+    _metric(lines, "seiji_talk_answer_cache_requests_total", "counter", "Answer cache lookups.",
+            {'result="hit"': answer_stats["hits"], 'result="miss"': answer_stats["misses"]})
+    _metric(lines, "seiji_talk_answer_cache_entries", "gauge", "Answers held in the cache.",
+            {"": answer_stats["size"]})
+
+    search_stats = search_cache.stats()
+    _metric(lines, "seiji_talk_search_cache_requests_total", "counter", "Search cache lookups.",
+            {'result="hit"': search_stats["hits"], 'result="stale_hit"': search_stats["stale_hits"],
+             'result="miss"': search_stats["misses"]})
+
+    worker_stats = question_worker.stats()
+    _metric(lines, "seiji_talk_question_worker", "gauge", "Question worker pool state.",
+            {f'state="{state}"': int(value) for state, value in worker_stats.items()})
+
+    _metric(lines, "seiji_talk_startup_seconds", "gauge", "Time taken by create_app.",
+            {"": current_app.config.get('STARTUP_SECONDS', 0)})
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+@metrics_bp.route('/spans', methods=['GET'])
+def get_spans() -> Response:
+    """
+    直近に記録したスパンを新しい順に返すエンドポイントです。
+    question_id を指定した場合は、その質問の処理のスパンのみを返します。
+
+    スパンには全ユーザーの質問IDが含まれるため、運用者向けに METRICS_SPANS_TOKEN を
+    設定した場合のみ有効にし、Authorization: Bearer <METRICS_SPANS_TOKEN> を必須とします。
+
+    Returns:
+        Response: スパンのリスト（JSON）。未設定の場合は404、トークンが一致しない場合は401。
+    """
+    token = current_app.config['METRICS_SPANS_TOKEN']
+    if not token:
+        return jsonify({"error": "Not found."}), 404
+    authorization = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+        return jsonify({"error": "Unauthorized."}), 401
+
+    question_id = request.args.get('question_id')
+    limit = request.args.get('limit', default=100, type=int)
+    limit = min(max(limit, 1), current_app.config['METRICS_SPANS_MAX_LIMIT'])
+    return jsonify(tracer.recent(question_id, limit)), 200
@@ -1,10 +1,14 @@
-from flask import Blueprint, jsonify, request, make_response, current_app
+from flask import Blueprint, jsonify, request, make_response, current_app, Response, stream_with_context
 from app.repositories.repository import SeijiTalkRepository
-from app.services.google_auth_service import fetch_user_info
-from app.services.question_service import process_question
-from app.models.model import Question, Status, Answer, RelatedWord, Reference
+from app.repositories.master_data import master_data
+from app.services.google_auth_service import fetch_user_info_cached
+from app.services.question_worker import question_worker, QueueFullError
+from app.services.word_batch import uses_word_batch
+from app.services.question_events import question_events
+from app.models.model import Question, Answer
 import asyncio
-import threading
+import json
+import time
 
 
 
@@ -32,7 +36,7 @@ def get_user_info_from_request():
 
     # アクセストークンを検証してユーザー情報を取得
     try:
-        user_info, error = fetch_user_info(access_token)
+        user_info, error = fetch_user_info_cached(access_token)
         if error:
             return {"error": "Invalid token", "details": error}, 403
     except Exception as e:
@@ -74,6 +78,109 @@ def validate_user_and_get(user_info_function):
         return None, jsonify({"error": "An unexpected error occurred.", "details": str(e)}), 500
 
 
+def format_answer(mode: str, answer: Answer) -> dict:
+    """
+    回答オブジェクトをレスポンス用の辞書に整形する。
+    参考記事・関連語は事前に読み込まれていることを前提とする。
+
+    Args:
+        mode (str): モード名。
+        answer (Answer): 回答オブジェクト（存在しない場合はNone）。
+
+    Returns:
+        dict: モードに応じた回答の辞書。
+    """
+    if mode == "word":
+        return {
+            "message": answer.message if answer else None,
+            "related_words": [rw.related_word for rw in answer.related_words] if answer else []
+        }
+    return {
+        "message": answer.message if answer else None,
+        "references": [{"title": ref.title, "url": ref.url} for ref in answer.references] if answer else []
+    }
+
+
+def build_question_response(question: Question) -> tuple[dict, int]:
+    """
+    質問の状態に応じたレスポンスの内容とHTTPステータスコードを組み立てる。
+
+    Args:
+        question (Question): 回答・参考記事・関連語を読み込み済みの質問オブジェクト。
+
+    Returns:
+        tuple:
+            - dict: レスポンスの内容。
+            - int: HTTPステータスコード（PENDING: 202、SUCCESS: 200、FAILURE: 500）。
+    """
+    # 質問のモードを取得
+    mode = master_data.mode_name(question.mode_id)
+    state = master_data.status_name(question.status_id)
+
+    # PENDING 状態の場合
+    if state == "PENDING":
+        return {
+            "question_id": question.id,
+            "mode": mode,
+            "state": state,
+        }, 202
+
+    # FAILURE 状態の場合
+    if state == "FAILURE":
+        return {
+            "question_id": question.id,
+            "mode": mode,
+            "state": state,
+        }, 500
+
+    # SUCCESS 状態の場合
+    answer = question.answers[0] if question.answers else None
+    if not answer:
+        return {"error": "Answer not found for SUCCESS state."}, 500
+
+    # 用語モード・最新情報モードの場合
+    if mode in ("word", "latest"):
+        return {
+            "question_id": question.id,
+            "mode": mode,
+            "state": state,
+            "answer": format_answer(mode, answer)
+        }, 200
+
+    # モードが未知の場合
+    return {"error": f"Unknown mode '{mode}'."}, 400
+
+
+def wait_for_question(question: Question, timeout: float) -> Question:
+    """
+    質問がPENDINGの間、処理完了の通知を待ってから取得し直す。
+    完了の通知（question_events）は同じプロセス内の処理のみが対象のため、
+    QUESTION_WAIT_POLL_INTERVAL 秒ごとにデータベースのステータスも確認し、
+    別のプロセスで完了した質問（flask word-batch poll で保存した回答など）も検知する。
+
+    Args:
+        question (Question): 質問オブジェクト。
+        timeout (float): 最大待機秒数。
+
+    Returns:
+        Question: 取得し直した質問オブジェクト（PENDINGでなければそのまま）。
+    """
+    if master_data.status_name(question.status_id) != "PENDING":
+        return question
+    # 待機中はデータベース接続を保持しない
+    SeijiTalkRepository.release_connection()
+    poll_interval = current_app.config['QUESTION_WAIT_POLL_INTERVAL']
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if question_events.wait(question.id, max(0, min(poll_interval, remaining))) or remaining <= poll_interval:
+            break
+        status_id = SeijiTalkRepository.find_question_status_id(question.id)
+        if status_id is None or master_data.status_name(status_id) != "PENDING":
+            break
+    return SeijiTalkRepository.reload_question_with_answer(question.id)
+
+
 @question_bp.route('', methods=['POST'])
 def create_question():
     """
@@ -97,17 +204,28 @@ def create_question():
             message=data["message"],
             mode_name=data["mode"]
         )
-       
-        # 新しいスレッドでタスクを実行
-        app = current_app._get_current_object()  # アプリケーションインスタンスを取得
-        task_thread = threading.Thread(target=process_question, args=(app, new_question.id))
-        task_thread.start()
+
+        # ワーカープールのキューに投入（回答済みの質問は再処理しない）
+        # バッチで回答する用語モードの質問はPENDINGのまま残し、flask word-batch submit で投入する
+        if master_data.status_name(new_question.status_id) != "SUCCESS" and not uses_word_batch(new_question):
+            try:
+                question_worker.submit(new_question.id)
+            except QueueFullError:
+                # 質問はPENDINGのまま保存されており、キューが空き次第処理される
+                response = jsonify({
+                    "error": "Too many questions are being processed. Please retry later.",
+                    "question_id": new_question.id,
+                    "mode": master_data.mode_name(new_question.mode_id),
+                    "state": master_data.status_name(new_question.status_id)
+                })
+                response.headers["Retry-After"] = "5"
+                return response, 429
 
         # 質問IDを返却（非同期ステータス）
         return jsonify({
             "question_id": new_question.id,
-            "mode": new_question.mode.name,
-            "state": new_question.status.name
+            "mode": master_data.mode_name(new_question.mode_id),
+            "state": master_data.status_name(new_question.status_id)
         }), 202
 
 
@@ -134,72 +252,51 @@ def get_question_answer(question_id):
         if error_response:
             return error_response, status_code
 
-        # 質問を取得
-        question = Question.query.filter_by(id=question_id).first()
+        # 質問を回答・参考記事・関連語とまとめて取得
+        question = SeijiTalkRepository.find_question_with_answer(question_id)
         if not question:
             return make_response(jsonify({"error": f"Question with ID '{question_id}' not found."}), 404)
 
-        # 質問のモードを取得
-        mode = question.mode.name
-        state = question.status.name
-
-        # PENDING 状態の場合
-        if state == "PENDING":
-            return make_response(
-                jsonify({
-                    "question_id": question.id,
-                    "mode": mode,
-                    "state": state,
-                }), 202
-            )
+        body, status_code = build_question_response(question)
+        return make_response(jsonify(body), status_code)
 
-        # FAILURE 状態の場合
-        if state == "FAILURE":
-            return make_response(
-                jsonify({
-                    "question_id": question.id,
-                    "mode": mode,
-                    "state": state,
-                }), 500
-            )
+    except Exception as e:
+        return make_response(
+            jsonify({
+                "error": "An error occurred while processing the request.",
+                "details": str(e)
+            }), 500
+        )
 
-        # SUCCESS 状態の場合
-        answer = Answer.query.filter_by(question_id=question.id).first()
-        if not answer:
-            return make_response(jsonify({"error": "Answer not found for SUCCESS state."}), 500)
-
-        # 用語モードの場合
-        if mode == "word":
-            related_words = [rw.related_word for rw in RelatedWord.query.filter_by(answer_id=answer.id).all()]
-            return make_response(
-                jsonify({
-                    "question_id": question.id,
-                    "mode": mode,
-                    "state": state,
-                    "answer": {
-                        "message": answer.message,
-                        "related_words": related_words
-                    }
-                }), 200
-            )
+@question_bp.route('/<string:question_id>/wait', methods=['GET'])
+def wait_question_answer(question_id):
+    """
+    質問の回答をロングポーリングで取得するエンドポイント。
+    PENDINGの場合は処理が完了するか timeout 秒が経過するまで応答を保留する。
+    レスポンスの形式は get_question_answer と同じ。
 
-        # 最新情報モードの場合
-        if mode == "latest":
-            references = [{"title": ref.title, "url": ref.url} for ref in Reference.query.filter_by(answer_id=answer.id).all()]
-            return make_response(
-                jsonify({
-                    "question_id": question.id,
-                    "mode": mode,
-                    "state": state,
-                    "answer": {
-                        "message": answer.message,
-                        "references": references
-                    }
-                }), 200
-            )
+    Args:
+        question_id (str): 質問ID。
 
-        # モードが未知の場合
-        return make_response(jsonify({"error": f"Unknown mode '{mode}'."}), 400)
+    Returns:
+        JSON: 質問の回答に応じたレスポンス。
+    """
+    try:
+        # ユーザー情報の検証と取得
+        user, error_response, status_code = validate_user_and_get(get_user_info_from_request)
+        if error_response:
+            return error_response, status_code
+
+        timeout = request.args.get('timeout', default=30, type=float)
+        timeout = min(max(timeout, 0), current_app.config['QUESTION_WAIT_TIMEOUT'])
+
+        question = SeijiTalkRepository.find_question_with_answer(question_id)
+        if not question:
+            return make_response(jsonify({"error": f"Question with ID '{question_id}' not found."}), 404)
+
+        question = wait_for_question(question, timeout)
+        body, status_code = build_question_response(question)
+        return make_response(jsonify(body), status_code)
 
     except Exception as e:
         return make_response(
@@ -209,6 +306,111 @@ def get_question_answer(question_id):
             }), 500
         )
 
+
+@question_bp.route('/<string:question_id>/events', methods=['GET'])
+def stream_question_events(question_id):
+    """
+    質問の完了をServer-Sent Eventsで通知するエンドポイント。
+    PENDINGの間はキープアライブのコメントを送り、完了すると get_question_answer と
+    同じ内容を "result" イベントとして送信して終了する。
+
+    Args:
+        question_id (str): 質問ID。
+
+    Returns:
+        text/event-stream: 完了時に1件の "result" イベントを含むストリーム。
+    """
+    # ユーザー情報の検証と取得
+    user, error_response, status_code = validate_user_and_get(get_user_info_from_request)
+    if error_response:
+        return error_response, status_code
+
+    question = SeijiTalkRepository.find_question_with_answer(question_id)
+    if not question:
+        return make_response(jsonify({"error": f"Question with ID '{question_id}' not found."}), 404)
+
+    keepalive = current_app.config['QUESTION_SSE_KEEPALIVE']
+    deadline = time.monotonic() + current_app.config['QUESTION_WAIT_TIMEOUT']
+
+    def generate(question):
+        while master_data.status_name(question.status_id) == "PENDING" and time.monotonic() < deadline:
+            question = wait_for_question(question, min(keepalive, deadline - time.monotonic()))
+            if master_data.status_name(question.status_id) == "PENDING":
+                yield ": keepalive\n\n"
+
+        body, status_code = build_question_response(question)
+        body["status_code"] = status_code
+        yield f"event: result\ndata: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(generate(question)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@question_bp.route('/<string:question_id>/stream', methods=['GET'])
+def stream_question_answer(question_id):
+    """
+    生成途中の回答をServer-Sent Eventsで中継するエンドポイント。
+    ANSWER_STREAMING が有効な場合、回答のテキスト片を "delta" イベントとして順に送り、
+    保存が完了すると get_question_answer と同じ内容を "result" イベントとして送信して終了する。
+
+    Args:
+        question_id (str): 質問ID。
+
+    Returns:
+        text/event-stream: "delta" イベントの列と、最後に1件の "result" イベントを含むストリーム。
+    """
+    # ユーザー情報の検証と取得
+    user, error_response, status_code = validate_user_and_get(get_user_info_from_request)
+    if error_response:
+        return error_response, status_code
+
+    question = SeijiTalkRepository.find_question_with_answer(question_id)
+    if not question:
+        return make_response(jsonify({"error": f"Question with ID '{question_id}' not found."}), 404)
+
+    keepalive = current_app.config['QUESTION_SSE_KEEPALIVE']
+    deadline = time.monotonic() + current_app.config['QUESTION_WAIT_TIMEOUT']
+
+    def generate(question):
+        if master_data.status_name(question.status_id) == "PENDING":
+            # 待機中はデータベース接続を保持しない
+            SeijiTalkRepository.release_connection()
+            poll_interval = current_app.config['QUESTION_WAIT_POLL_INTERVAL']
+            received = 0
+            completed = False
+            sent_at = time.monotonic()
+            while not completed and time.monotonic() < deadline:
+                chunks, completed = question_events.wait_for_chunks(
+                    question.id, received, min(keepalive, poll_interval, deadline - time.monotonic())
+                )
+                received += len(chunks)
+                for text in chunks:
+                    yield f"event: delta\ndata: {json.dumps({'text': text}, ensure_ascii=False)}\n\n"
+                if chunks or completed:
+                    sent_at = time.monotonic()
+                    continue
+                # テキスト片の中継はプロセス内のみのため、別のプロセスでの完了はデータベースで確認する
+                status_id = SeijiTalkRepository.find_question_status_id(question.id)
+                completed = status_id is None or master_data.status_name(status_id) != "PENDING"
+                if not completed and time.monotonic() - sent_at >= keepalive:
+                    sent_at = time.monotonic()
+                    yield ": keepalive\n\n"
+            question = SeijiTalkRepository.reload_question_with_answer(question.id)
+
+        body, status_code = build_question_response(question)
+        body["status_code"] = status_code
+        yield f"event: result\ndata: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(generate(question)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @question_bp.route('/history', methods=['GET'])
 def get_question_history():
     """
@@ -223,52 +425,42 @@ def get_question_history():
         if error_response:
             return error_response, status_code
 
-        # クエリパラメータの取得
+        # クエリパラメータの取得（cursor指定時はキーセットページング、未指定時はoffset）
+        cursor = request.args.get('cursor')
         offset = request.args.get('offset', default=0, type=int)
         limit = request.args.get('limit', default=10, type=int)
-
-        # 質問履歴を取得
-        questions = Question.query.filter_by(user_id=user.id)\
-            .order_by(Question.created_at.desc())\
-            .offset(offset)\
-            .limit(limit)\
-            .all()
+        max_limit = current_app.config['QUESTION_HISTORY_MAX_LIMIT']
+        if not 1 <= limit <= max_limit:
+            return jsonify({"error": f"limit must be between 1 and {max_limit}."}), 400
+        if offset < 0:
+            return jsonify({"error": "offset must not be negative."}), 400
+
+        # 質問履歴を回答・参考記事・関連語とまとめて取得
+        try:
+            questions, next_cursor = SeijiTalkRepository.get_question_history(
+                user_id=user.id,
+                limit=limit,
+                cursor=cursor,
+                offset=offset
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         # 質問と回答情報を整形
         question_history = []
         for question in questions:
-            answer = Answer.query.filter_by(question_id=question.id).first()
-
-            if question.mode.name == "word":
-                related_words = [
-                    rw.related_word
-                    for rw in RelatedWord.query.filter_by(answer_id=answer.id).all()
-                ] if answer else []
-                question_history.append({
-                    "question_id": question.id,
-                    "message": question.message,
-                    "answer": {
-                        "message": answer.message if answer else None,
-                        "related_words": related_words
-                    }
-                })
-
-            elif question.mode.name == "latest":
-                references = [
-                    {"title": ref.title, "url": ref.url}
-                    for ref in Reference.query.filter_by(answer_id=answer.id).all()
-                ] if answer else []
-                question_history.append({
-                    "question_id": question.id,
-                    "message": question.message,
-                    "answer": {
-                        "message": answer.message if answer else None,
-                        "references": references
-                    }
-                })
+            mode = master_data.mode_name(question.mode_id)
+            if mode not in ("word", "latest"):
+                continue
+            answer = question.answers[0] if question.answers else None
+            question_history.append({
+                "question_id": question.id,
+                "message": question.message,
+                "answer": format_answer(mode, answer)
+            })
 
         # レスポンスの生成
-        return jsonify({"questions": question_history}), 200
+        return jsonify({"questions": question_history, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"error": "An error occurred while retrieving question history.", "details": str(e)}), 500
@@ -1,5 +1,12 @@
+from flask.cli import with_appcontext
 from app.models.model import Status, Mode
+from app.repositories.master_data import master_data
 from app import db  # db = SQLAlchemy()のインスタンス
+import click
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 def register_master_data():
     """
@@ -14,9 +21,9 @@ def register_master_data():
         ]
         db.session.add_all(statuses)
         db.session.commit()
-        print("The initial Status registration process for the DB has been done.")
+        logger.info("The initial Status registration process for the DB has been done.")
     else:
-        print("Statuses have already been registered in the DB.")
+        logger.info("Statuses have already been registered in the DB.")
 
     # モードマスタの初期化
     if Mode.query.count() == 0:
@@ -26,6 +33,19 @@ def register_master_data():
         ]
         db.session.add_all(modes)
         db.session.commit()
-        print("The initial Modes registration process for the DB has been done.")
+        logger.info("The initial Modes registration process for the DB has been done.")
     else:
-        print("Modes have already been registered in the DB.")
\ No newline at end of file
+        logger.info("Modes have already been registered in the DB.")
+
+    # 登録内容をレジストリに反映させるため、次回参照時に読み込み直す
+    master_data.invalidate()
+
+
+@click.command("seed")
+@with_appcontext
+def seed_command():
+    """
+    マスタデータを登録するCLIコマンドです（flask seed）。
+    flask db upgrade でも登録されるため、db.create_all() で作成したDB向けです。
+    """
+    register_master_data()
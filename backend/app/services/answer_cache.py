@@ -0,0 +1,127 @@
+import copy
+import re
+import threading
+import unicodedata
+
+from app.config import Config
+from app.extention import TTLCache
+
+
+def normalize_question(message: str) -> str:
+    """
+    キャッシュのキーにするため、質問文を正規化する。
+    全角・半角の揺れ、大文字・小文字、空白、末尾の句読点や疑問符の違いを吸収する。
+
+    Args:
+        message (str): 質問内容。
+
+    Returns:
+        str: 正規化された質問内容。
+    """
+    text = unicodedata.normalize("NFKC", message).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?？!！。.、, ")
+
+
+class AnswerCache:
+    """
+    ユーザー間で共有する回答キャッシュ
+
+    正規化した質問文とモード名をキーに、save_latest_answer / save_word_answer に
+    渡す形式の回答データを保持する。有効期限はモードごとに設定する。
+    """
+
+    def __init__(self, maxsize: int, ttl_by_mode: dict[str, float]):
+        """
+        Args:
+            maxsize (int): 保持する最大件数。
+            ttl_by_mode (dict[str, float]): モード名ごとの有効期限（秒）。0以下のモードはキャッシュしない。
+        """
+        self._cache = TTLCache(maxsize)
+        self._ttl_by_mode = ttl_by_mode
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, message: str, mode_name: str) -> dict | None:
+        """
+        キャッシュ済みの回答を取得する。
+
+        Args:
+            message (str): 質問内容。
+            mode_name (str): モード名。
+
+        Returns:
+            dict | None: 回答データのコピー、キャッシュにない場合はNone。
+        """
+        if self._ttl_by_mode.get(mode_name, 0) <= 0:
+            return None
+
+        result_data = self._cache.get((mode_name, normalize_question(message)))
+        with self._lock:
+            if result_data is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return copy.deepcopy(result_data)
+
+    def contains(self, message: str, mode_name: str) -> bool:
+        """
+        回答がキャッシュにあるかどうかを返す。ヒット数・ミス数には数えない。
+
+        Args:
+            message (str): 質問内容。
+            mode_name (str): モード名。
+
+        Returns:
+            bool: キャッシュにある場合はTrue。
+        """
+        if self._ttl_by_mode.get(mode_name, 0) <= 0:
+            return False
+        return self._cache.get((mode_name, normalize_question(message))) is not None
+
+    def put(self, message: str, mode_name: str, result_data: dict):
+        """
+        回答をキャッシュに登録する。
+
+        Args:
+            message (str): 質問内容。
+            mode_name (str): モード名。
+            result_data (dict): 保存に使用した回答データ。
+        """
+        ttl = self._ttl_by_mode.get(mode_name, 0)
+        if ttl <= 0 or not result_data:
+            return
+        self._cache.set((mode_name, normalize_question(message)), copy.deepcopy(result_data), ttl)
+
+    def clear(self):
+        """
+        キャッシュと統計情報を消去する。
+        """
+        self._cache.clear()
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> dict:
+        """
+        キャッシュの統計情報を返す。
+
+        Returns:
+            dict: ヒット数、ミス数、保持件数。
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "size": len(self._cache)
+            }
+
+
+answer_cache = AnswerCache(
+    Config.ANSWER_CACHE_MAXSIZE,
+    {
+        "latest": Config.ANSWER_CACHE_TTL_LATEST,
+        "word": Config.ANSWER_CACHE_TTL_WORD
+    }
+)
@@ -1,17 +1,25 @@
 import uuid
 import http
 import json
+import hashlib
+import time
 from flask import session
-from app.extention import create_repeat_session
+from app.config import Config
+from app.extention import get_http_session, TTLCache
 
-rep_session = create_repeat_session()
+rep_session = get_http_session("google_auth")
 
-with open('app/google_config.json') as config_file:
+user_info_cache = TTLCache(Config.USER_INFO_CACHE_MAXSIZE)
+"""アクセストークンのハッシュをキーにしたユーザー情報のキャッシュ"""
+token_expiry_cache = TTLCache(Config.USER_INFO_CACHE_MAXSIZE)
+"""アクセストークンのハッシュをキーにしたトークンの失効時刻（ログイン時の expires_in から求める）"""
+
+with open(Config.GOOGLE_CONFIG_PATH) as config_file:
     config = json.load(config_file)
 
 GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
 GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
-GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+GOOGLE_USERINFO_URL = Config.GOOGLE_USERINFO_URL
 CLIENT_ID = config['web']['client_id']
 CLIENT_SECRET = config['web']['client_secret']
 REDIRECT_URI = config['web']['redirect_uris'][0]
@@ -80,6 +88,61 @@ def fetch_user_info(access_token: str) -> tuple:
         return None, response.json()
     return response.json(), None
 
+def _token_cache_key(access_token: str) -> str:
+    """
+    アクセストークンそのものを保持しないよう、キャッシュのキーにはハッシュ値を使います。
+    """
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+def cache_user_info(access_token: str, user_info: dict, expires_in: int | None = None):
+    """
+    アクセストークンに対応するユーザー情報をキャッシュします。
+
+    有効期限はトークンの expires_in と USER_INFO_CACHE_TTL の短い方です。
+    expires_in が不明な場合は USER_INFO_CACHE_UNKNOWN_EXPIRY_TTL です。
+    トークンが失効・取り消しされても、最大でこの期間はキャッシュが使われます。
+
+    Parameters:
+        access_token (str): Google OAuth 2.0で取得したアクセストークン。
+        user_info (dict): ユーザー情報。
+        expires_in (int | None): トークンの残り有効期間（秒）。不明な場合はNone。
+    """
+    key = _token_cache_key(access_token)
+    if expires_in is None:
+        expires_at = token_expiry_cache.get(key)
+        if expires_at is not None:
+            expires_in = expires_at - time.time()
+    elif float(expires_in) > 0:
+        # 以降にキャッシュし直す際も（fetch_user_info_cached）、トークンの失効時刻までに制限する
+        token_expiry_cache.set(key, time.time() + float(expires_in), float(expires_in))
+
+    if expires_in is None:
+        ttl = Config.USER_INFO_CACHE_UNKNOWN_EXPIRY_TTL
+    else:
+        ttl = min(Config.USER_INFO_CACHE_TTL, float(expires_in))
+    if ttl > 0:
+        user_info_cache.set(key, user_info, ttl)
+
+def fetch_user_info_cached(access_token: str) -> tuple:
+    """
+    fetch_user_info の結果をキャッシュして返します。
+    キャッシュにある間はGoogleへの通信を行いません。
+
+    Parameters:
+        access_token (str): Google OAuth 2.0で取得したアクセストークン。
+
+    Returns:
+        tuple: fetch_user_info と同じ形式。
+    """
+    user_info = user_info_cache.get(_token_cache_key(access_token))
+    if user_info is not None:
+        return user_info, None
+
+    user_info, error = fetch_user_info(access_token)
+    if user_info:
+        cache_user_info(access_token, user_info)
+    return user_info, error
+
 def generate_auth_url() -> str:
     """
     Google認証用のURLを生成
@@ -0,0 +1,292 @@
+import codecs
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Iterable
+
+from bs4 import BeautifulSoup
+from requests.compat import chardet
+
+from app.config import Config
+
+try:
+    import lxml.html
+except ImportError:  # lxml はオプション。未インストールの場合は標準ライブラリのパーサーを使う
+    lxml = None
+
+
+logger = logging.getLogger(__name__)
+
+BOILERPLATE_TAGS = {"script", "style", "noscript", "template", "svg"}
+"""テキストを持たないとみなして除去するタグ"""
+
+LAYOUT_TAGS = {"nav", "footer", "aside"}
+"""ナビゲーションなどの定型部分を囲むとみなすタグ（本文が十分にある場合のみ除く）"""
+
+MAIN_CONTENT_TAGS = {"main", "article"}
+"""本文を囲むとみなすタグ"""
+
+MIN_MAIN_CONTENT_CHARS = 200
+"""main・article内（または定型部分以外）のテキストがこの文字数未満の場合は、より広い範囲のテキストを使う"""
+
+ENCODING_SNIFF_BYTES = 4096
+"""文字コードの判定に使う先頭部分のバイト数"""
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_\-]+)""", re.IGNORECASE)
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>", re.IGNORECASE)
+"""XML宣言（lxmlは encoding を含むXML宣言付きの文字列を解析できない）"""
+
+
+class StreamingTextExtractor(HTMLParser):
+    """
+    HTMLを少しずつ受け取りながらテキストを抽出するパーサー
+
+    DOMを構築せずに、BOILERPLATE_TAGS の内側を読み飛ばしつつテキストを集める。
+    main・article内のテキストと、定型部分（LAYOUT_TAGS）以外のテキストは別に集め、
+    十分な量があればその順に本文として採用する。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skip_stack: list[str] = []
+        self._layout_stack: list[str] = []
+        self._main_depth = 0
+        self._parts: list[str] = []
+        self._content_parts: list[str] = []
+        self._content_chars = 0
+        self._main_parts: list[str] = []
+        self._main_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BOILERPLATE_TAGS:
+            self._skip_stack.append(tag)
+        elif tag in LAYOUT_TAGS:
+            self._layout_stack.append(tag)
+        elif tag in MAIN_CONTENT_TAGS:
+            self._main_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in BOILERPLATE_TAGS:
+            _pop_until(self._skip_stack, tag)
+        elif tag in LAYOUT_TAGS:
+            _pop_until(self._layout_stack, tag)
+        elif tag in MAIN_CONTENT_TAGS and self._main_depth:
+            self._main_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_stack:
+            return
+        text = data.strip()
+        if not text:
+            return
+        self._parts.append(text)
+        if self._layout_stack:
+            return
+        self._content_parts.append(text)
+        self._content_chars += len(text)
+        if self._main_depth:
+            self._main_parts.append(text)
+            self._main_chars += len(text)
+
+    def text(self) -> str:
+        """
+        抽出したテキストを返す。close の後に呼び出す。
+        """
+        if self._main_chars >= MIN_MAIN_CONTENT_CHARS:
+            return "\n".join(self._main_parts)
+        if self._content_chars >= MIN_MAIN_CONTENT_CHARS:
+            return "\n".join(self._content_parts)
+        return "\n".join(self._parts)
+
+
+def _pop_until(stack: list[str], tag: str):
+    # 閉じタグが省略された要素があっても、対応する開始タグまで戻す
+    if tag in stack:
+        while stack.pop() != tag:
+            pass
+
+
+def extract_text_bs4(html_content: str) -> str:
+    """
+    BeautifulSoup（html.parser）でページ全体のテキストを抽出する（従来の実装）。
+    """
+    soup = BeautifulSoup(html_content, "html.parser")
+    return soup.get_text(separator="\n", strip=True)
+
+
+def extract_text_stream(chunks: Iterable[str]) -> str:
+    """
+    標準ライブラリのHTMLParserで、テキストの断片を順に解析して本文を抽出する。
+    """
+    parser = StreamingTextExtractor()
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return parser.text()
+
+
+def extract_text_lxml(html_content: str) -> str:
+    """
+    lxmlでテキストを持たない要素を除去して本文を抽出する（StreamingTextExtractor と同じ基準）。
+    lxmlで解析できない場合は extract_text_stream で抽出する。
+    """
+    try:
+        document = lxml.html.document_fromstring(_XML_DECLARATION.sub("", html_content, count=1))
+    except Exception as e:
+        logger.debug("lxml could not parse the page; falling back to the streaming extractor: %s", e)
+        return extract_text_stream([html_content])
+    for element in document.xpath("//comment()|//" + "|//".join(sorted(BOILERPLATE_TAGS))):
+        element.drop_tree()
+
+    outside_layout = "not(" + " or ".join(f"ancestor::{tag}" for tag in sorted(LAYOUT_TAGS)) + ")"
+    in_main = "(" + " or ".join(f"ancestor::{tag}" for tag in sorted(MAIN_CONTENT_TAGS)) + ")"
+
+    def collect(xpath: str) -> list[str]:
+        return [text.strip() for text in document.xpath(xpath) if text.strip()]
+
+    for parts in (collect(f"//text()[{in_main} and {outside_layout}]"), collect(f"//body//text()[{outside_layout}]")):
+        if sum(len(text) for text in parts) >= MIN_MAIN_CONTENT_CHARS:
+            return "\n".join(parts)
+    body = document.find("body")
+    return "\n".join(collect("//body//text()" if body is not None else "//text()"))
+
+
+def resolve_engine(engine: str | None = None) -> str:
+    """
+    使用する抽出エンジン名を決める。auto の場合は lxml があれば lxml、なければ stream。
+
+    Args:
+        engine (str | None): "auto"・"lxml"・"stream"・"bs4"。省略時は HTML_EXTRACT_ENGINE。
+
+    Returns:
+        str: 使用するエンジン名。
+    """
+    engine = engine or Config.HTML_EXTRACT_ENGINE
+    if engine == "lxml" and lxml is None:
+        engine = "auto"
+    if engine == "auto":
+        return "lxml" if lxml is not None else "stream"
+    return engine
+
+
+def detect_encoding(declared: str | None, head: bytes) -> str:
+    """
+    HTMLの文字コードを決める。Content-Typeの指定、metaタグの指定の順に採用し、どちらもない場合は
+    先頭部分から推定する（UTF-8として読める場合はUTF-8、それ以外は requests の apparent_encoding と
+    同じ charset_normalizer / chardet による推定。Shift_JIS・EUC-JPのページなど）。
+
+    Args:
+        declared (str | None): Content-Typeヘッダーで指定された文字コード。
+        head (bytes): HTMLの先頭部分。
+
+    Returns:
+        str: 文字コード名。
+    """
+    candidates = [declared]
+    match = _META_CHARSET.search(head[:ENCODING_SNIFF_BYTES])
+    if match:
+        candidates.append(match.group(1).decode("ascii"))
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            continue
+    return guess_encoding(head[:ENCODING_SNIFF_BYTES])
+
+
+def guess_encoding(head: bytes) -> str:
+    """
+    文字コードの指定がないHTMLの先頭部分から文字コードを推定する。推定できない場合はUTF-8。
+    """
+    try:
+        # 先頭部分の末尾で途切れたマルチバイト文字は許容する
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if chardet is not None:
+        guessed = chardet.detect(head).get("encoding")
+        try:
+            if guessed:
+                return codecs.lookup(guessed).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def charset_from_content_type(content_type: str | None) -> str | None:
+    """
+    Content-Typeヘッダーから文字コードの指定を取り出す。指定がない場合はNone。
+    """
+    match = re.search(r"charset\s*=\s*[\"']?([A-Za-z0-9_\-]+)", content_type or "", re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def extract_text_from_chunks(chunks: Iterable[bytes], declared_encoding: str | None = None,
+                             max_bytes: int | None = None, engine: str | None = None) -> str:
+    """
+    HTMLのバイト列の断片から、最大 max_bytes までを読み込んでテキストを抽出する。
+    stream エンジンでは受け取った断片から順に解析するため、ページ全体を保持しない。
+
+    Args:
+        chunks (Iterable[bytes]): HTMLのバイト列の断片（レスポンスの iter_content など）。
+        declared_encoding (str | None): Content-Typeヘッダーで指定された文字コード。
+        max_bytes (int | None): 読み込む最大バイト数。省略時は SCRAPE_MAX_BYTES。
+        engine (str | None): 抽出エンジン名（resolve_engine を参照）。
+
+    Returns:
+        str: ページのテキスト内容
+    """
+    max_bytes = max_bytes or Config.SCRAPE_MAX_BYTES
+    engine = resolve_engine(engine)
+
+    def limited_text():
+        decoder = None
+        head = b""
+        received = 0
+        for chunk in chunks:
+            chunk = chunk[:max_bytes - received]
+            received += len(chunk)
+            if decoder is None:
+                # metaタグの文字コード指定を探すため、先頭部分が揃うまで溜める
+                head += chunk
+                if len(head) < ENCODING_SNIFF_BYTES and received < max_bytes:
+                    continue
+                decoder = codecs.getincrementaldecoder(detect_encoding(declared_encoding, head))(errors="replace")
+                chunk = head
+            yield decoder.decode(chunk)
+            if received >= max_bytes:
+                break
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(detect_encoding(declared_encoding, head))(errors="replace")
+            yield decoder.decode(head)
+        yield decoder.decode(b"", final=True)
+
+    if engine == "stream":
+        return extract_text_stream(limited_text())
+
+    html_content = "".join(limited_text())
+    if engine == "lxml":
+        return extract_text_lxml(html_content) if html_content.strip() else ""
+    return extract_text_bs4(html_content)
+
+
+def extract_text(html_content: str, engine: str | None = None) -> str:
+    """
+    HTMLの文字列からテキストを抽出する。
+
+    Args:
+        html_content (str): ページのHTML
+        engine (str | None): 抽出エンジン名（resolve_engine を参照）。
+
+    Returns:
+        str: ページのテキスト内容
+    """
+    engine = resolve_engine(engine)
+    if engine == "stream":
+        return extract_text_stream([html_content])
+    if engine == "lxml":
+        return extract_text_lxml(html_content) if html_content.strip() else ""
+    return extract_text_bs4(html_content)
@@ -0,0 +1,188 @@
+from typing import Callable
+import asyncio
+import logging
+import threading
+import aiohttp
+
+from app.config import Config
+from app.services.openai_service import (
+    get_async_client, generate_search_query_async, generate_summary_async,
+    generate_summary_snippet_async, generate_compact_answer_async, build_latest_response
+)
+from app.services.ranking import rank_results_async
+from app.services.scraping import scrape_page_content_async
+from app.services.search_service import search
+from app.services.tracing import tracer
+
+
+logger = logging.getLogger(__name__)
+
+_thread_state = threading.local()
+
+
+async def _run_stage(name: str, awaitable, timeout: float):
+    """
+    パイプラインの1段階をタイムアウト付きで実行する。
+
+    Args:
+        name (str): 段階名（エラーメッセージ・スパン名）。
+        awaitable: 実行するコルーチン。
+        timeout (float): タイムアウト秒数。
+
+    Returns:
+        コルーチンの戻り値。
+
+    Raises:
+        TimeoutError: 指定時間内に完了しなかった場合。
+    """
+    try:
+        with tracer.span("stage", name):
+            return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Stage '{name}' timed out after {timeout} seconds.")
+
+
+async def _scrape_with_limit(semaphore: asyncio.Semaphore, session: aiohttp.ClientSession, url: str) -> str:
+    """
+    同時実行数の上限内でページをスクレイピングする。タイムアウト時は空文字を返す。
+    """
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(
+                scrape_page_content_async(session, url), Config.LATEST_SCRAPE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Scraping timed out: %s", url)
+            return ""
+
+
+async def _summarize_page(async_client, semaphore: asyncio.Semaphore, scrape_task: asyncio.Task,
+                          result: dict, question: str) -> dict | None:
+    """
+    先行して開始したスクレイピングの完了を待ち、そのページを要約する。
+
+    Returns:
+        dict | None: {"title": str, "url": str, "summary": str}、失敗時はNone。
+    """
+    content = await scrape_task
+    if not content:
+        return None
+
+    async with semaphore:
+        try:
+            summary = await asyncio.wait_for(
+                generate_summary_async(async_client, content, question), Config.LATEST_OPENAI_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning("Error summarizing %s: %s", result["url"], e)
+            return None
+
+    if not summary:
+        return None
+    return {"title": result["title"], "url": result["url"], "summary": summary}
+
+
+async def run_latest_pipeline(question: str, on_delta: Callable[[str], None] | None = None) -> dict:
+    """
+    'latest' モードの回答生成を非同期で実行する。
+
+    検索クエリ生成 → 検索 → 並べ替え → 回答生成 の順に処理する。
+    LATEST_ANSWER_SOURCE=compact の場合は、並べ替えと回答生成を1回のチャット補完で行う。
+    スクレイピングで回答する場合（LATEST_ANSWER_SOURCE=scrape）は、検索結果が
+    得られた時点で全URLのスクレイピングを並べ替えと並行して開始し、上位の
+    ページの要約も同時実行数の上限内で並行に行う。
+
+    Args:
+        question (str): ユーザーが入力した質問内容。
+        on_delta (Callable[[str], None] | None): 指定した場合、スニペットからの回答生成を
+            ストリーミングで行い、生成途中のテキスト片を渡す。
+
+    Returns:
+        dict: save_latest_answer に渡す形式の回答。
+    """
+    async_client = get_async_client()
+    search_query = await _run_stage(
+        "generate_search_query",
+        generate_search_query_async(async_client, question),
+        Config.LATEST_OPENAI_TIMEOUT
+    )
+
+    # 検索は同期APIのため別スレッドで実行する
+    search_results = await _run_stage(
+        "search",
+        asyncio.to_thread(search, search_query),
+        Config.LATEST_SEARCH_TIMEOUT
+    )
+
+    if Config.LATEST_ANSWER_SOURCE == "compact":
+        # 並べ替えと要約を1回のチャット補完で行う
+        return await _run_stage(
+            "generate_compact_answer",
+            generate_compact_answer_async(async_client, question, search_results, on_delta),
+            Config.LATEST_OPENAI_TIMEOUT
+        )
+
+    if Config.LATEST_ANSWER_SOURCE != "scrape":
+        ranked_results = await _run_stage(
+            "rank_search_results",
+            rank_results_async(async_client, search_query, search_results),
+            Config.LATEST_OPENAI_TIMEOUT
+        )
+        return await _run_stage(
+            "generate_summary_snippet",
+            generate_summary_snippet_async(async_client, question, ranked_results, on_delta),
+            Config.LATEST_OPENAI_TIMEOUT
+        )
+
+    semaphore = asyncio.Semaphore(Config.LATEST_PIPELINE_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=Config.LATEST_SCRAPE_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        # 並べ替えを待たずに全URLのスクレイピングを開始する
+        scrape_tasks = {
+            result["url"]: asyncio.create_task(_scrape_with_limit(semaphore, session, result["url"]))
+            for result in search_results
+        }
+        try:
+            ranked_results = await _run_stage(
+                "rank_search_results",
+                rank_results_async(async_client, search_query, search_results),
+                Config.LATEST_OPENAI_TIMEOUT
+            )
+
+            summary_jobs = []
+            for result in ranked_results:
+                scrape_task = scrape_tasks.get(result["url"])
+                if scrape_task is None:
+                    # 並べ替えでURLが変わった場合はここで取得する
+                    scrape_task = asyncio.create_task(_scrape_with_limit(semaphore, session, result["url"]))
+                    scrape_tasks[result["url"]] = scrape_task
+                summary_jobs.append(_summarize_page(async_client, semaphore, scrape_task, result, question))
+
+            summaries = [entry for entry in await asyncio.gather(*summary_jobs) if entry]
+        finally:
+            # 上位に残らなかったページの取得は打ち切る
+            for task in scrape_tasks.values():
+                task.cancel()
+
+    # 各ページの要約を結合して統合要約を生成
+    combined_summaries = "\n".join(entry["summary"] for entry in summaries)
+    final_summary = await _run_stage(
+        "generate_summary",
+        generate_summary_async(async_client, combined_summaries, question, Config.SUMMARY_COMBINED_TOKEN_BUDGET),
+        Config.LATEST_OPENAI_TIMEOUT
+    )
+    return build_latest_response(final_summary, summaries)
+
+
+def run_latest_pipeline_blocking(question: str, on_delta: Callable[[str], None] | None = None) -> dict:
+    """
+    run_latest_pipeline を呼び出し元のスレッドで完了まで実行する。
+
+    asyncio.run と異なり、イベントループをスレッドごとに保持して使い続けるため、
+    ループに紐づくOpenAIクライアント（get_async_client）の接続プールを質問間で共有できる。
+    タスクは呼び出し元のコンテキストを引き継ぐ（スパンに質問IDとモードが付く）。
+    """
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _thread_state.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(run_latest_pipeline(question, on_delta))
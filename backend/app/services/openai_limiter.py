@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import openai
+from openai import OpenAI, AsyncOpenAI
+
+from app.config import Config
+from app.services.text_budget import estimate_tokens
+from app.services.tracing import tracer
+
+
+logger = logging.getLogger(__name__)
+
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+"""再試行するOpenAI APIのエラー（429、タイムアウト、接続エラー、5xx）"""
+
+
+class TokenBucket:
+    """
+    1分あたりの上限を連続的に補充するトークンバケット
+
+    acquire は残量が足りなくても先に消費し（残量は負になり得る）、残量が0に戻るまでの
+    待ち時間を返す。呼び出し側はその時間だけ待ってから処理を行う。
+    同期・非同期のどちらからでも使えるよう、待機自体は呼び出し側が行う。
+    """
+
+    def __init__(self, per_minute: float):
+        """
+        Args:
+            per_minute (float): 1分あたりの上限（バケットの容量）。
+        """
+        self._capacity = per_minute
+        self._rate = per_minute / 60
+        self._tokens = per_minute
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def acquire(self, amount: float) -> float:
+        """
+        amount を消費し、実行してよい時刻までの待ち秒数を返す。
+
+        Args:
+            amount (float): 消費量（容量を超える場合は容量分とする）。
+
+        Returns:
+            float: 待ち秒数（すぐに実行できる場合は0）。
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self._capacity)
+            return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+    def refund(self, amount: float):
+        """
+        見積もりより実際の消費が少なかった分や、失敗したリクエストの分を戻す。
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._capacity, self._tokens + amount)
+
+
+class ModelLimiter:
+    """
+    1つのモデルに対するリクエスト数・トークン数・同時実行数の制限
+    """
+
+    def __init__(self, rpm: float, tpm: float, concurrency: int):
+        """
+        Args:
+            rpm (float): 1分あたりのリクエスト数の上限。
+            tpm (float): 1分あたりのトークン数（入力と出力の合計）の上限。
+            concurrency (int): 同時実行数の上限。
+        """
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # 同期クライアントと非同期クライアント（ワーカースレッドごとのイベントループ）で共有するため、
+        # asyncio.Semaphore ではなくスレッド用のセマフォを使う
+        self.slots = threading.BoundedSemaphore(concurrency)
+
+    def reserve(self, estimated_tokens: int) -> float:
+        """
+        1リクエスト分と見積もりトークン数を予約し、待ち秒数を返す。
+        """
+        return max(self.requests.acquire(1), self.tokens.acquire(estimated_tokens))
+
+
+_limiters: dict[str, ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model: str) -> ModelLimiter:
+    """
+    モデルごとの制限を取得する。初回に OPENAI_MODEL_LIMITS（なければ default）の設定で作成する。
+
+    Args:
+        model (str): モデル名。
+
+    Returns:
+        ModelLimiter: モデルの制限。
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limits = {**Config.OPENAI_MODEL_LIMITS["default"], **Config.OPENAI_MODEL_LIMITS.get(model, {})}
+            limiter = ModelLimiter(limits["rpm"], limits["tpm"], limits["concurrency"])
+            _limiters[model] = limiter
+        return limiter
+
+
+def estimate_request_tokens(kwargs: dict) -> int:
+    """
+    リクエストで消費するトークン数（入力の見積もり＋出力の上限）を見積もる。
+    """
+    prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in kwargs.get("messages", []))
+    return prompt_tokens + (kwargs.get("max_tokens") or 0)
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    再試行までの待ち秒数を決める。
+    Retry-After（retry-after-ms）ヘッダーがあればそれに従い、なければ指数バックオフに
+    ジッターを加えた時間（0〜min(上限, 基準×2^attempt) の一様乱数）とする。
+
+    Args:
+        error (Exception): 発生したエラー。
+        attempt (int): 何回目の再試行か（0始まり）。
+
+    Returns:
+        float: 待ち秒数。
+    """
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000 + random.uniform(0, 0.1)
+        if headers.get("retry-after"):
+            return float(headers["retry-after"]) + random.uniform(0, 0.1)
+    except ValueError:
+        pass
+    return random.uniform(0, min(Config.OPENAI_BACKOFF_MAX, Config.OPENAI_BACKOFF_BASE * 2 ** attempt))
+
+
+def _settle_tokens(limiter: ModelLimiter, estimated_tokens: int, response):
+    """
+    応答の usage が得られた場合、見積もりとの差分をトークンバケットに戻す。
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None and usage.total_tokens < estimated_tokens:
+        limiter.tokens.refund(estimated_tokens - usage.total_tokens)
+
+
+class _GuardedStream:
+    """
+    ストリーミング応答を読み終える（または破棄される）まで同時実行枠を保持するラッパー
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def _release_once(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        finally:
+            self._release_once()
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            self._release_once()
+
+    def __del__(self):
+        self._release_once()
+
+
+def create_chat_completion(client: OpenAI, **kwargs):
+    """
+    制限と再試行を適用して client.chat.completions.create を呼び出す。
+
+    モデルごとのリクエスト数・トークン数の上限に達している場合は待ってから送信し、
+    同時実行数の上限内で実行する。429・5xx・タイムアウト・接続エラーの場合は
+    OPENAI_MAX_RETRIES 回まで再試行し、それでも失敗した場合は例外を送出する。
+    失敗した試行で予約したトークン数はトークンバケットに戻す（リクエスト数の予約は戻さない）。
+    待ち時間・再試行を含む所要時間をスパン（kind=openai、name=モデル名）として記録する
+    （stream=True の場合は応答の受信開始まで）。
+
+    Args:
+        client (OpenAI): OpenAIクライアント。
+        **kwargs: chat.completions.create の引数。
+
+    Returns:
+        chat.completions.create の戻り値（stream=True の場合はチャンクのイテレータ）。
+    """
+    with tracer.span("openai", kwargs["model"]):
+        limiter = get_limiter(kwargs["model"])
+        estimated_tokens = estimate_request_tokens(kwargs)
+
+        for attempt in range(Config.OPENAI_MAX_RETRIES + 1):
+            time.sleep(limiter.reserve(estimated_tokens))
+            limiter.slots.acquire()
+            try:
+                response = client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                limiter.slots.release()
+                # 失敗したリクエストはトークンを消費しないため、次の試行で予約し直す分を戻す
+                limiter.tokens.refund(estimated_tokens)
+                if attempt == Config.OPENAI_MAX_RETRIES:
+                    raise
+                delay = retry_delay(e, attempt)
+                logger.warning("OpenAI API error (%s), retrying in %.1fs: %s", type(e).__name__, delay, e)
+                time.sleep(delay)
+                continue
+            except BaseException:
+                limiter.slots.release()
+                limiter.tokens.refund(estimated_tokens)
+                raise
+
+            if kwargs.get("stream"):
+                return _GuardedStream(response, limiter.slots.release)
+            limiter.slots.release()
+            _settle_tokens(limiter, estimated_tokens, response)
+            return response
+
+
+async def _acquire_slot(limiter: ModelLimiter):
+    """
+    イベントループを止めないよう、同時実行枠が空くまでポーリングで待つ。
+    """
+    while not limiter.slots.acquire(blocking=False):
+        await asyncio.sleep(0.05)
+
+
+async def create_chat_completion_async(async_client: AsyncOpenAI, **kwargs):
+    """
+    create_chat_completion の非同期版。制限は同期版と共有する。
+
+    Args:
+        async_client (AsyncOpenAI): 非同期OpenAIクライアント。
+        **kwargs: chat.completions.create の引数。
+
+    Returns:
+        chat.completions.create の戻り値（stream=True の場合はチャンクの非同期イテレータ）。
+    """
+    with tracer.span("openai", kwargs["model"]):
+        limiter = get_limiter(kwargs["model"])
+        estimated_tokens = estimate_request_tokens(kwargs)
+
+        for attempt in range(Config.OPENAI_MAX_RETRIES + 1):
+            await asyncio.sleep(limiter.reserve(estimated_tokens))
+            await _acquire_slot(limiter)
+            try:
+                response = await async_client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                limiter.slots.release()
+                # 失敗したリクエストはトークンを消費しないため、次の試行で予約し直す分を戻す
+                limiter.tokens.refund(estimated_tokens)
+                if attempt == Config.OPENAI_MAX_RETRIES:
+                    raise
+                delay = retry_delay(e, attempt)
+                logger.warning("OpenAI API error (%s), retrying in %.1fs: %s", type(e).__name__, delay, e)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                limiter.slots.release()
+                limiter.tokens.refund(estimated_tokens)
+                raise
+
+            if kwargs.get("stream"):
+                return _GuardedStream(response, limiter.slots.release)
+            limiter.slots.release()
+            _settle_tokens(limiter, estimated_tokens, response)
+            return response
@@ -1,16 +1,584 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from typing import Callable
+import asyncio
 import json
+import logging
 import os
-from dotenv import load_dotenv 
+import re
+import threading
+from dotenv import load_dotenv
 
+from app.config import Config
 from app.services.scraping import scrape_page_content
+from app.services.text_budget import select_passages
+from app.services.openai_limiter import create_chat_completion, create_chat_completion_async
 from app.services.search_service import search_with_fallback
 
+logger = logging.getLogger(__name__)
+
 # OpenAI APIキーの設定（環境変数や設定ファイルから取得するのが推奨）
 #os.environ.get("OPENAI_API_KEY")
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+# 再試行は openai_limiter で制限と合わせて行うため、クライアント側の再試行は無効にする
+client = OpenAI(api_key=api_key, max_retries=0)
+
+
+_async_client_state = threading.local()
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    実行中のイベントループで共有する非同期版のOpenAIクライアントを返す。
+    AsyncOpenAI（httpxの接続プール）はイベントループに紐づくため、スレッドごとに
+    ループと組にして保持し、同じループで実行する間は使い回す
+    （質問処理ワーカーは latest_pipeline.run_latest_pipeline_blocking でスレッドごとのループを使い続ける）。
+
+    Returns:
+        AsyncOpenAI: 非同期OpenAIクライアント。
+    """
+    loop = asyncio.get_running_loop()
+    if getattr(_async_client_state, "loop", None) is not loop:
+        _async_client_state.loop = loop
+        _async_client_state.client = AsyncOpenAI(api_key=api_key, max_retries=0)
+    return _async_client_state.client
+
+
+def build_search_query_messages(question: str) -> list[dict]:
+    """
+    検索クエリ生成用のメッセージを組み立てる。
+
+    Args:
+        question (str): ユーザーが入力した質問内容。
+
+    Returns:
+        list[dict]: チャット補完に渡すメッセージのリスト。
+    """
+    return [
+        {
+            "role": "system",
+            "content": (
+                "あなたは検索クエリの作成に特化した専門家です。"
+                "ユーザーが提供した情報を基に、検索エンジンで効果的かつ関連性の高い検索クエリを生成してください。"
+                "生成するクエリはシンプルで、ユーザーが求める情報を的確に引き出せるように工夫してください。"
+                "鍵かっこや余計な記号を含めず、簡潔で明確な検索クエリを生成してください。"
+            )
+        },
+        {
+            "role": "user",
+            "content": question
+        }
+    ]
+
+
+def build_word_answer_messages(question: str) -> list[dict]:
+    """
+    用語回答生成用のメッセージを組み立てる。
+
+    Args:
+        question (str): ユーザーが入力した質問内容。
+
+    Returns:
+        list[dict]: チャット補完に渡すメッセージのリスト。
+    """
+    return [
+        {
+            "role": "system",
+            "content": (
+                "あなたは政治や社会に関する質問に厳格に対応する専門家です。"
+                "ユーザーの質問に対して、簡潔で正確な回答を提供してください。"
+                "さらに、回答に関連するキーワードや用語を4つ生成し、厳密にJSON形式で出力してください。"
+                "JSON形式のルールに厳密に従い、それ以外の形式で応答を返さないでください。"
+                "JSON形式は次のようにしてください："
+                '{"message": "回答内容", "related_words": ["関連用語1", "関連用語2", "関連用語3", "関連用語4"]}'
+                "注意: JSON内のすべてのキーと文字列はダブルクォーテーションで囲む必要があります。"
+                "その他のコメントや説明文は出力に含めないでください。"
+            )
+        },
+        {
+            "role": "user",
+            "content": question
+        }
+    ]
+
+
+def build_rank_messages(query: str, results: list[dict]) -> list[dict]:
+    """
+    検索結果並べ替え用のメッセージを組み立てる。
+
+    Args:
+        query (str): 検索クエリ
+        results (list[dict]): 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
+
+    Returns:
+        list[dict]: チャット補完に渡すメッセージのリスト。
+    """
+    # システムプロンプト
+    system_prompt = (
+        "あなたは検索結果を評価し、クエリに基づいて最も関連性の高い順に並べ替える専門家です。\n"
+        "以下の要素を考慮して評価を行い、結果を厳密に指定されたJSON形式で返してください。\n"
+        "考慮すべき要素:\n"
+        "- クエリとの関連性: 検索クエリ内のキーワードが結果のタイトルやスニペットにどの程度一致しているか。\n"
+        "- スニペットの内容: スニペットが具体的で役に立つ情報を含んでいるか。\n"
+        "- URLの信頼性: 信頼性のあるドメイン（例: .edu, .gov, .jp など）か。\n"
+        "- 情報の鮮度: 最新の情報を優先。\n"
+        "- 情報の具体性: 内容が曖昧でなく具体的か。\n\n"
+        "JSON形式のルール:\n"
+        "1. 出力形式は以下のようにしてください:\n"
+        '[{"title": "タイトル1", "url": "URL1", "snippet": "スニペット1"}, {"title": "タイトル2", "url": "URL2", "snippet": "スニペット2"}]\n'
+        "2. すべてのキーと値はダブルクォーテーションで囲む必要があります。\n"
+        "3. JSON以外の形式や追加のコメントを含めないでください。"
+    )
+
+    # ユーザープロンプト
+    user_prompt = (
+        f"以下は検索クエリ「{query}」に対する検索結果のリストです。\n"
+        "検索結果を並べ替えてください。\n\n"
+        f"検索クエリ: {query}\n"
+        "検索結果:\n"
+        f"{json.dumps(results, ensure_ascii=False, indent=2)}\n\n"
+    )
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+RANK_INDEX_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ranking",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "order": {"type": "array", "items": {"type": "integer"}}
+            },
+            "required": ["order"],
+            "additionalProperties": False
+        }
+    }
+}
+"""番号のみで並べ替え結果を返させるための構造化出力の形式"""
+
+
+def format_numbered_results(results: list[dict]) -> str:
+    """
+    検索結果を番号付きのテキストに整形する。
+
+    Args:
+        results (list[dict]): 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
+
+    Returns:
+        str: "[0] タイトル\nURL\nスニペット" を空行区切りで並べたテキスト。
+    """
+    return "\n\n".join(
+        f"[{index}] {result.get('title', '')}\n{result.get('url', '')}\n{result.get('snippet', '')}"
+        for index, result in enumerate(results)
+    )
+
+
+def build_rank_index_messages(query: str, results: list[dict]) -> list[dict]:
+    """
+    検索結果を番号のみで並べ替えさせるためのメッセージを組み立てる。
+    build_rank_messages と評価の観点は同じだが、結果の内容を出力させないため応答が短い。
+
+    Args:
+        query (str): 検索クエリ
+        results (list[dict]): 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
+
+    Returns:
+        list[dict]: チャット補完に渡すメッセージのリスト。
+    """
+    system_prompt = (
+        "あなたは検索結果を評価し、クエリに基づいて最も関連性の高い順に並べ替える専門家です。\n"
+        "以下の要素を考慮して評価を行ってください。\n"
+        "- クエリとの関連性: 検索クエリ内のキーワードが結果のタイトルやスニペットにどの程度一致しているか。\n"
+        "- スニペットの内容: スニペットが具体的で役に立つ情報を含んでいるか。\n"
+        "- URLの信頼性: 信頼性のあるドメイン（例: .edu, .gov, .jp など）か。\n"
+        "- 情報の鮮度: 最新の情報を優先。\n"
+        "- 情報の具体性: 内容が曖昧でなく具体的か。\n\n"
+        "各検索結果には [番号] が付いています。関連性の高い順に並べた番号のリストを "
+        '{"order": [番号, ...]} の形式で返してください。'
+    )
+    user_prompt = (
+        f"検索クエリ: {query}\n"
+        "検索結果:\n"
+        f"{format_numbered_results(results)}"
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def build_summary_messages(scraped_content: str, question: str) -> list[dict]:
+    """
+    ページ要約用のメッセージを組み立てる。
+
+    Args:
+        scraped_content (str): スクレイピングして取得したウェブページのテキスト内容。
+        question (str): ユーザーが入力した質問内容。
+
+    Returns:
+        list[dict]: チャット補完に渡すメッセージのリスト。
+    """
+    return [
+        {
+            "role": "system",
+            "content": (
+                "あなたはウェブページの要約に特化したAIアシスタントです。"
+                "以下のスクレイピング内容を、ユーザーの質問に適した内容になるように要約してください。"
+                "文字数としては200文字程度としてください"
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                f"スクレイピング内容:\n{scraped_content}\n\n"
+                f"質問: {question}\n\n"
+                "この質問に答えるための要約を生成してください。"
+            )
+        }
+    ]
+
+
+def build_summary_snippet_messages(question: str, ranked_results: list[dict]) -> list[dict]:
+    """
+    検索結果のスニペットから回答を生成するためのメッセージを組み立てる。
+
+    Args:
+        question (str): ユーザーが入力した質問内容。
+        ranked_results (list[dict]): 並べ替え済みの検索結果のリスト。
+
+    Returns:
+        list[dict]: チャット補完に渡すメッセージのリスト。
+    """
+    # スニペット部分だけを抽出して連結
+    snippets = [result["snippet"] for result in ranked_results if "snippet" in result]
+    concatenated_snippets = " ".join(snippets)
+
+    return [
+        {
+            "role": "system",
+            "content": (
+                "あなたはウェブページの要約に特化したAIアシスタントです。"
+                "加えて政治や社会に関する質問に的確に対応する専門家でもあります。"
+                "検索の要約内容を入力するので、ユーザーの質問に適した内容になるように要約してください。"
+
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                f"サイトの要約内容:\n{concatenated_snippets}\n\n"
+                f"質問: {question}\n\n"
+                "この質問に答えるための要約を生成してください。"
+            )
+        }
+    ]
+
+
+COMPACT_ANSWER_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "compact_answer",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                # ストリーミングで回答本文を先に受け取れるよう message を先頭にする
+                "message": {"type": "string"},
+                "references": {"type": "array", "items": {"type": "integer"}}
+            },
+            "required": ["message", "references"],
+            "additionalProperties": False
+        }
+    }
+}
+"""並べ替えと回答生成を1回で行うための構造化出力の形式"""
+
+
+def build_compact_answer_messages(question: str, results: list[dict]) -> list[dict]:
+    """
+    番号付きの検索結果から、回答と参考にした検索結果の番号を1回で生成させるメッセージを組み立てる。
+
+    Args:
+        question (str): ユーザーが入力した質問内容。
+        results (list[dict]): 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
+
+    Returns:
+        list[dict]: チャット補完に渡すメッセージのリスト。
+    """
+    return [
+        {
+            "role": "system",
+            "content": (
+                "あなたはウェブページの要約に特化したAIアシスタントです。"
+                "加えて政治や社会に関する質問に的確に対応する専門家でもあります。"
+                "番号付きの検索結果を入力するので、質問との関連性、URLの信頼性（.go.jp, .lg.jp など）、"
+                "情報の鮮度、具体性を考慮して信頼できる結果を選び、それらを基に質問に答える要約を生成してください。"
+                '出力は {"message": "要約", "references": [参考にした検索結果の番号（重要な順に最大3件）]} の形式にしてください。'
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                f"検索結果:\n{format_numbered_results(results)}\n\n"
+                f"質問: {question}\n\n"
+                "この質問に答えるための要約を生成してください。"
+            )
+        }
+    ]
+
+
+def parse_word_answer(answer: str) -> dict | None:
+    """
+    用語回答のJSON文字列を検証し、辞書に変換する。
+
+    Args:
+        answer (str): OpenAIから返された回答文字列。
+
+    Returns:
+        dict | None: 正しい形式なら {"message": str, "related_words": list[str]}、不正ならNone。
+    """
+    # JSON形式の検証と変換
+    try:
+        parsed_json = json.loads(answer)  # JSON形式かどうかを検証しながら辞書に変換
+
+        # フォーマットの詳細な検証
+        if (
+            isinstance(parsed_json, dict) and
+            "message" in parsed_json and isinstance(parsed_json["message"], str) and
+            "related_words" in parsed_json and
+            isinstance(parsed_json["related_words"], list) and
+            all(isinstance(word, str) for word in parsed_json["related_words"])  # すべて文字列か確認
+        ):
+            return parsed_json  # 正しい形式なら辞書を返す
+        else:
+            logger.warning("JSON形式は正しいが、フォーマットが不適切です。")
+            return None  # フォーマットが不正の場合
+
+    except json.JSONDecodeError as e:
+        logger.warning("JSONDecodeError: %s (生成された回答: %s)", e, answer)
+        return None  # JSON形式が不正な場合
+
+
+def parse_ranked_results(content: str) -> list[dict] | None:
+    """
+    並べ替え結果のJSON文字列を検証し、上位3件のリストに変換する。
+
+    Args:
+        content (str): OpenAIから返された応答文字列。
+
+    Returns:
+        list[dict] | None: 上位3件の検索結果、フォーマットが不正な場合はNone。
+    """
+    # 応答が空の場合のチェック
+    if not content:
+        raise ValueError("OpenAIからの応答が空です。")
+
+    try:
+        # JSON形式にパース
+        parsed_json = json.loads(content)
+
+        # フォーマットの詳細な検証
+        if (
+            isinstance(parsed_json, list) and
+            all(
+                isinstance(item, dict) and
+                "title" in item and isinstance(item["title"], str) and
+                "url" in item and isinstance(item["url"], str) and
+                "snippet" in item and isinstance(item["snippet"], str)
+                for item in parsed_json
+            )
+        ):
+            return parsed_json[:3]  # 上位3件を返す
+        else:
+            logger.warning("JSON形式は正しいが、フォーマットが不適切です。")
+            return None  # フォーマットが不正の場合
+
+    except json.JSONDecodeError as e:
+        # 応答をトリムして解析の再試行
+        fixed_content = content.splitlines()
+        try:
+            parsed_json = json.loads("".join(fixed_content))
+            return parsed_json[:3]
+        except Exception as inner_e:
+            raise ValueError(f"JSON解析に失敗しました: {inner_e}\n応答内容:\n{content}")
+
+
+def parse_ranked_indices(content: str, results: list[dict], top_n: int = 3) -> list[dict]:
+    """
+    番号のみの並べ替え結果（{"order": [...]}）から、元の検索結果を並べ直す。
+    範囲外・重複した番号は無視し、top_n 件に満たない場合は残りを元の順で補う。
+
+    Args:
+        content (str): OpenAIから返された応答文字列。
+        results (list[dict]): 並べ替え前の検索結果のリスト。
+        top_n (int): 返す件数。
+
+    Returns:
+        list[dict]: 並べ替えられた検索結果リスト（上位 top_n 件）
+
+    Raises:
+        ValueError: 応答がJSONとして解析できない場合。
+    """
+    try:
+        order = json.loads(content)["order"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f"並べ替え結果の解析に失敗しました: {e}\n応答内容:\n{content}")
+
+    indices = []
+    for index in order:
+        if isinstance(index, int) and 0 <= index < len(results) and index not in indices:
+            indices.append(index)
+    indices += [index for index in range(len(results)) if index not in indices]
+    return [results[index] for index in indices[:top_n]]
+
+
+def build_latest_response(final_summary: str, references: list[dict]) -> dict:
+    """
+    最新情報モードの回答を save_latest_answer に渡す形式に整形する。
+
+    Args:
+        final_summary (str): 全体の要約結果。
+        references (list[dict]): 参考記事のリスト（"title" と "url" を含む）。
+
+    Returns:
+        dict: {"answer": {"message": str, "references": [{"title": str, "url": str}, ...]}}
+    """
+    return {
+        "answer": {
+            "message": final_summary,
+            "references": [{"title": entry["title"], "url": entry["url"]} for entry in references]
+        }
+    }
+
+
+def parse_compact_answer(content: str, results: list[dict], max_references: int = 3) -> dict:
+    """
+    build_compact_answer_messages への応答を save_latest_answer に渡す形式に変換する。
+    範囲外・重複した番号は無視し、有効な番号がない場合は検索結果の上位を参考記事とする。
+
+    Args:
+        content (str): OpenAIから返された応答文字列。
+        results (list[dict]): 応答の番号が指す検索結果のリスト。
+        max_references (int): 参考記事の最大件数。
+
+    Returns:
+        dict: {"answer": {"message": str, "references": [{"title": str, "url": str}, ...]}}
+
+    Raises:
+        ValueError: 応答の形式が不正な場合。
+    """
+    try:
+        parsed = json.loads(content)
+        message = parsed["message"]
+        order = parsed["references"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f"回答の解析に失敗しました: {e}\n応答内容:\n{content}")
+    if not isinstance(message, str) or not isinstance(order, list):
+        raise ValueError(f"回答の形式が不正です。\n応答内容:\n{content}")
+
+    indices = []
+    for index in order:
+        if isinstance(index, int) and 0 <= index < len(results) and index not in indices:
+            indices.append(index)
+    if not indices:
+        indices = list(range(len(results)))
+    return build_latest_response(message.strip(), [results[index] for index in indices[:max_references]])
+
+
+class MessageFieldStream:
+    """
+    用語回答などのJSON応答（{"message": "...", "related_words": [...]}）を逐次受け取り、
+    "message" の値のうち新たに確定した部分だけを取り出す。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._emitted = 0
+
+    def feed(self, text: str) -> str:
+        """
+        応答のテキスト片を追加する。
+
+        Args:
+            text (str): 新たに受信したテキスト片。
+
+        Returns:
+            str: "message" の値のうち、新たに確定した部分。
+        """
+        self._buffer += text
+        match = re.search(r'"message"\s*:\s*"', self._buffer)
+        if not match:
+            return ""
+
+        raw = self._buffer[match.end():]
+        # 閉じ引用符、または途中までしか届いていないエスケープの手前までを確定とする
+        end = 0
+        while end < len(raw):
+            char = raw[end]
+            if char == '"':
+                break
+            if char == "\\":
+                step = 6 if raw[end + 1:end + 2] == "u" else 2
+                if end + step > len(raw):
+                    break
+                end += step
+                continue
+            end += 1
+
+        decoded = json.loads(f'"{raw[:end]}"')
+        new_text = decoded[self._emitted:]
+        self._emitted = len(decoded)
+        return new_text
+
+
+def _collect_stream(stream, on_delta: Callable[[str], None], transform=None) -> str:
+    """
+    ストリーミング応答を受信しながら on_delta に中継し、全体のテキストを返す。
+
+    Args:
+        stream: stream=True で作成したチャット補完の応答。
+        on_delta (Callable[[str], None]): テキスト片を受け取るコールバック。
+        transform: 中継する前にテキスト片を変換するオブジェクト（feed メソッドを持つ）。
+
+    Returns:
+        str: 受信したテキスト全体。
+    """
+    parts = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if not text:
+            continue
+        parts.append(text)
+        relay = transform.feed(text) if transform else text
+        if relay:
+            on_delta(relay)
+    return "".join(parts)
+
+
+async def _collect_stream_async(stream, on_delta: Callable[[str], None], transform=None) -> str:
+    """
+    _collect_stream の非同期版。
+    """
+    parts = []
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if not text:
+            continue
+        parts.append(text)
+        relay = transform.feed(text) if transform else text
+        if relay:
+            on_delta(relay)
+    return "".join(parts)
 
 
 def generate_search_query(question: str):
@@ -26,23 +594,9 @@ def generate_search_query(question: str):
     try:
 
         # チャット補完のリクエスト
-        chat_completion = client.chat.completions.create(
+        chat_completion = create_chat_completion(client,
             model="gpt-4o-mini",  # 使用するモデル
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "あなたは検索クエリの作成に特化した専門家です。"
-                        "ユーザーが提供した情報を基に、検索エンジンで効果的かつ関連性の高い検索クエリを生成してください。"
-                        "生成するクエリはシンプルで、ユーザーが求める情報を的確に引き出せるように工夫してください。"
-                        "鍵かっこや余計な記号を含めず、簡潔で明確な検索クエリを生成してください。"
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": question
-                }
-            ],
+            messages=build_search_query_messages(question),
             temperature=0.7,
             max_tokens=60,
             n=1  # 生成する選択肢の数
@@ -54,7 +608,7 @@ def generate_search_query(question: str):
         return search_query
 
     except Exception as e:
-        print(f"Error generating search query: {str(e)}")
+        logger.error("Error generating search query: %s", e)
         return None
 
 
@@ -71,27 +625,9 @@ def generate_word_answer(question: str):
     try:
 
         # チャット補完のリクエスト
-        chat_completion = client.chat.completions.create(
+        chat_completion = create_chat_completion(client,
             model="gpt-4o-mini",  # 使用するモデル
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "あなたは政治や社会に関する質問に厳格に対応する専門家です。"
-                        "ユーザーの質問に対して、簡潔で正確な回答を提供してください。"
-                        "さらに、回答に関連するキーワードや用語を4つ生成し、厳密にJSON形式で出力してください。"
-                        "JSON形式のルールに厳密に従い、それ以外の形式で応答を返さないでください。"
-                        "JSON形式は次のようにしてください："
-                        '{"message": "回答内容", "related_words": ["関連用語1", "関連用語2", "関連用語3", "関連用語4"]}'
-                        "注意: JSON内のすべてのキーと文字列はダブルクォーテーションで囲む必要があります。"
-                        "その他のコメントや説明文は出力に含めないでください。"
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": question
-                }
-            ],
+            messages=build_word_answer_messages(question),
             temperature=0.7,
             max_tokens=250,
             n=1  # 生成する選択肢の数
@@ -100,31 +636,10 @@ def generate_word_answer(question: str):
         # 結果を取り出す
         answer = chat_completion.choices[0].message.content.strip()
 
-        # JSON形式の検証と変換
-        try:
-            parsed_json = json.loads(answer)  # JSON形式かどうかを検証しながら辞書に変換
-
-            # フォーマットの詳細な検証
-            if (
-                isinstance(parsed_json, dict) and
-                "message" in parsed_json and isinstance(parsed_json["message"], str) and
-                "related_words" in parsed_json and
-                isinstance(parsed_json["related_words"], list) and
-                all(isinstance(word, str) for word in parsed_json["related_words"])  # すべて文字列か確認
-            ):
-                return parsed_json  # 正しい形式なら辞書を返す
-            else:
-                print("JSON形式は正しいが、フォーマットが不適切です。")
-                return None  # フォーマットが不正の場合
-
-        except json.JSONDecodeError as e:
-            print(f"JSONDecodeError: {e}")
-            print(f"生成された回答: {answer}")
-            return None  # JSON形式が不正な場合
-
+        return parse_word_answer(answer)
 
     except Exception as e:
-        print(f"Error generating search query: {str(e)}")
+        logger.error("Error generating search query: %s", e)
         return None
 
 
@@ -139,40 +654,11 @@ def rank_search_results(query: str, results: list[dict]) -> list[dict]:
     Returns:
         list[dict]: 並べ替えられた検索結果リスト（上位3件）
     """
-    # システムプロンプト
-    system_prompt = (
-        "あなたは検索結果を評価し、クエリに基づいて最も関連性の高い順に並べ替える専門家です。\n"
-        "以下の要素を考慮して評価を行い、結果を厳密に指定されたJSON形式で返してください。\n"
-        "考慮すべき要素:\n"
-        "- クエリとの関連性: 検索クエリ内のキーワードが結果のタイトルやスニペットにどの程度一致しているか。\n"
-        "- スニペットの内容: スニペットが具体的で役に立つ情報を含んでいるか。\n"
-        "- URLの信頼性: 信頼性のあるドメイン（例: .edu, .gov, .jp など）か。\n"
-        "- 情報の鮮度: 最新の情報を優先。\n"
-        "- 情報の具体性: 内容が曖昧でなく具体的か。\n\n"
-        "JSON形式のルール:\n"
-        "1. 出力形式は以下のようにしてください:\n"
-        '[{"title": "タイトル1", "url": "URL1", "snippet": "スニペット1"}, {"title": "タイトル2", "url": "URL2", "snippet": "スニペット2"}]\n'
-        "2. すべてのキーと値はダブルクォーテーションで囲む必要があります。\n"
-        "3. JSON以外の形式や追加のコメントを含めないでください。"
-    )
-
-    # ユーザープロンプト
-    user_prompt = (
-        f"以下は検索クエリ「{query}」に対する検索結果のリストです。\n"
-        "検索結果を並べ替えてください。\n\n"
-        f"検索クエリ: {query}\n"
-        "検索結果:\n"
-        f"{json.dumps(results, ensure_ascii=False, indent=2)}\n\n"
-    )
-
     try:
         # OpenAI APIリクエスト
-        response = client.chat.completions.create(
+        response = create_chat_completion(client,
             model="gpt-4o-mini",  # 使用するモデル
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=build_rank_messages(query, results),
             max_tokens=1000,
             temperature=0.7,
             n=1
@@ -181,77 +667,63 @@ def rank_search_results(query: str, results: list[dict]) -> list[dict]:
         # OpenAIからの応答をパース
         content = response.choices[0].message.content.strip()
 
-        # 応答が空の場合のチェック
-        if not content:
-            raise ValueError("OpenAIからの応答が空です。")
+        return parse_ranked_results(content)
+
+    except Exception as e:
+        raise ValueError(f"並べ替え中にエラーが発生しました: {e}")
 
-        try:
-            # JSON形式にパース
-            parsed_json = json.loads(content)
-
-            # フォーマットの詳細な検証
-            if (
-                isinstance(parsed_json, list) and
-                all(
-                    isinstance(item, dict) and
-                    "title" in item and isinstance(item["title"], str) and
-                    "url" in item and isinstance(item["url"], str) and
-                    "snippet" in item and isinstance(item["snippet"], str)
-                    for item in parsed_json
-                )
-            ):
-                return parsed_json[:3]  # 上位3件を返す
-            else:
-                print("JSON形式は正しいが、フォーマットが不適切です。")
-                return None  # フォーマットが不正の場合
-
-        except json.JSONDecodeError as e:
-            # 応答をトリムして解析の再試行
-            fixed_content = content.splitlines()
-            try:
-                parsed_json = json.loads("".join(fixed_content))
-                return parsed_json[:3]
-            except Exception as inner_e:
-                raise ValueError(f"JSON解析に失敗しました: {inner_e}\n応答内容:\n{content}")
+
+def rank_search_results_by_index(query: str, results: list[dict]) -> list[dict]:
+    """
+    rank_search_results と同様に並べ替えるが、OpenAIには番号の並びのみを出力させ、
+    検索結果の並べ直しはローカルで行う（出力トークンが少ないため速い）。
+
+    Args:
+        query (str): 検索クエリ
+        results (list[dict]): 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
+
+    Returns:
+        list[dict]: 並べ替えられた検索結果リスト（上位3件）
+    """
+    if not results:
+        return []
+    try:
+        response = create_chat_completion(client,
+            model="gpt-4o-mini",
+            messages=build_rank_index_messages(query, results),
+            response_format=RANK_INDEX_RESPONSE_FORMAT,
+            max_tokens=100,
+            temperature=0,
+            n=1
+        )
+        return parse_ranked_indices(response.choices[0].message.content, results)
 
     except Exception as e:
         raise ValueError(f"並べ替え中にエラーが発生しました: {e}")
 
 
-def generate_summary(scraped_content: str, question: str) -> str:
+def generate_summary(scraped_content: str, question: str, token_budget: int | None = None) -> str:
     """
     スクレイピングした内容をOpenAI APIで処理し、質問内容に合わせて要約を行う。
+    内容がトークン予算を超える場合は、質問との関連が高い部分のみを送る。
 
     Args:
         scraped_content (str): スクレイピングして取得したウェブページのテキスト内容。
         question (str): ユーザーが入力した質問内容。
+        token_budget (int | None): 送る内容のトークン予算。省略時は SUMMARY_PAGE_TOKEN_BUDGET。
 
     Returns:
         str: 質問内容に合った形式で要約されたテキスト。
     """
     try:
+        if token_budget is None:
+            token_budget = Config.SUMMARY_PAGE_TOKEN_BUDGET
+        scraped_content = select_passages(scraped_content, question, token_budget)
 
         # チャット補完のリクエスト
-        chat_completion = client.chat.completions.create(
+        chat_completion = create_chat_completion(client,
             model="gpt-4o-mini",  # 使用するモデル
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "あなたはウェブページの要約に特化したAIアシスタントです。"
-                        "以下のスクレイピング内容を、ユーザーの質問に適した内容になるように要約してください。"
-                        "文字数としては200文字程度としてください"
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        f"スクレイピング内容:\n{scraped_content}\n\n"
-                        f"質問: {question}\n\n"
-                        "この質問に答えるための要約を生成してください。"
-                    )
-                }
-            ],
+            messages=build_summary_messages(scraped_content, question),
             temperature=0.7,
             max_tokens=150,
             n=1  # 生成する選択肢の数
@@ -263,7 +735,7 @@ def generate_summary(scraped_content: str, question: str) -> str:
         return search_query
 
     except Exception as e:
-        print(f"Error generating search query: {str(e)}")
+        logger.error("Error generating search query: %s", e)
         return None
 
 def generate_summary_snippet(question: str,ranked_results: list[dict]) -> list[dict]:
@@ -277,35 +749,12 @@ def generate_summary_snippet(question: str,ranked_results: list[dict]) -> list[d
     Returns:
         str: 質問内容に合った形式で要約されたテキスト。
     """
-
-    # スニペット部分だけを抽出して連結
-    snippets = [result["snippet"] for result in ranked_results if "snippet" in result]
-    concatenated_snippets = " ".join(snippets)
-
     try:
 
         # チャット補完のリクエスト
-        chat_completion = client.chat.completions.create(
+        chat_completion = create_chat_completion(client,
             model="gpt-4o-mini",  # 使用するモデル
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "あなたはウェブページの要約に特化したAIアシスタントです。"
-                        "加えて政治や社会に関する質問に的確に対応する専門家でもあります。"
-                        "検索の要約内容を入力するので、ユーザーの質問に適した内容になるように要約してください。"
-                        
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        f"サイトの要約内容:\n{concatenated_snippets}\n\n"
-                        f"質問: {question}\n\n"
-                        "この質問に答えるための要約を生成してください。"
-                    )
-                }
-            ],
+            messages=build_summary_snippet_messages(question, ranked_results),
             temperature=0.7,
             max_tokens=500,
             n=1  # 生成する選択肢の数
@@ -314,17 +763,102 @@ def generate_summary_snippet(question: str,ranked_results: list[dict]) -> list[d
         # 結果を取り出す
         final_summary = chat_completion.choices[0].message.content.strip()
 
-        response = {
-        "answer": {
-            "message": final_summary,
-            "references": [{"title": entry["title"], "url": entry["url"]} for entry in ranked_results]
-        }
-    }
+        return build_latest_response(final_summary, ranked_results)
+
+    except Exception as e:
+        logger.error("Error generating search query: %s", e)
+        return None
+
+def generate_compact_answer(question: str, results: list[dict],
+                            on_delta: Callable[[str], None] | None = None) -> dict | None:
+    """
+    検索結果の並べ替えと要約を1回のチャット補完で行い、回答と参考記事を返す。
+    on_delta を指定した場合は応答をストリーミングで受信し、回答本文のテキスト片を逐次渡す。
+
+    Args:
+        question (str): ユーザーが入力した質問内容。
+        results (list[dict]): 検索結果のリスト（並べ替え前でよい）。
+        on_delta (Callable[[str], None] | None): 回答本文のテキスト片を受け取るコールバック。
 
-        return response
+    Returns:
+        dict | None: save_latest_answer に渡す形式の回答、失敗時はNone。
+    """
+    try:
+        chat_completion = create_chat_completion(client,
+            model="gpt-4o-mini",
+            messages=build_compact_answer_messages(question, results),
+            response_format=COMPACT_ANSWER_RESPONSE_FORMAT,
+            temperature=0.7,
+            max_tokens=600,
+            n=1,
+            stream=on_delta is not None
+        )
+        if on_delta is not None:
+            content = _collect_stream(chat_completion, on_delta, MessageFieldStream())
+        else:
+            content = chat_completion.choices[0].message.content
+        return parse_compact_answer(content, results)
 
     except Exception as e:
-        print(f"Error generating search query: {str(e)}")
+        logger.error("Error generating compact answer: %s", e)
+        return None
+
+
+def stream_word_answer(question: str, on_delta: Callable[[str], None]) -> dict | None:
+    """
+    generate_word_answer のストリーミング版。
+    生成途中の回答本文（"message" の値）を on_delta に逐次渡し、完了後に全体を検証して返す。
+
+    Args:
+        question (str): ユーザーが入力した質問内容。
+        on_delta (Callable[[str], None]): 回答本文のテキスト片を受け取るコールバック。
+
+    Returns:
+        dict | None: generate_word_answer と同じ形式の回答。
+    """
+    try:
+        stream = create_chat_completion(client,
+            model="gpt-4o-mini",
+            messages=build_word_answer_messages(question),
+            temperature=0.7,
+            max_tokens=250,
+            n=1,
+            stream=True
+        )
+        answer = _collect_stream(stream, on_delta, MessageFieldStream())
+        return parse_word_answer(answer.strip())
+
+    except Exception as e:
+        logger.error("Error streaming word answer: %s", e)
+        return None
+
+def stream_summary_snippet(question: str, ranked_results: list[dict], on_delta: Callable[[str], None]) -> dict | None:
+    """
+    generate_summary_snippet のストリーミング版。
+    生成途中の要約を on_delta に逐次渡し、完了後に save_latest_answer に渡す形式で返す。
+
+    Args:
+        question (str): ユーザーが入力した質問内容。
+        ranked_results (list[dict]): 並べ替え済みの検索結果のリスト。
+        on_delta (Callable[[str], None]): 要約のテキスト片を受け取るコールバック。
+
+    Returns:
+        dict | None: generate_summary_snippet と同じ形式の回答。
+    """
+    try:
+        stream = create_chat_completion(client,
+            model="gpt-4o-mini",
+            messages=build_summary_snippet_messages(question, ranked_results),
+            temperature=0.7,
+            max_tokens=500,
+            n=1,
+            stream=True
+        )
+        final_summary = _collect_stream(stream, on_delta)
+        return build_latest_response(final_summary.strip(), ranked_results)
+
+    except Exception as e:
+        logger.error("Error streaming summary: %s", e)
         return None
 
 def process_search_results(query: str, results: list[dict]) -> list[dict]:
@@ -364,7 +898,8 @@ def process_search_results(query: str, results: list[dict]) -> list[dict]:
         content = scrape_page_content(url)
         if content:
             summary = generate_summary(content, query)
-            summaries.append({"title": result["title"], "url": url, "summary": summary})
+            if summary:
+                summaries.append({"title": result["title"], "url": url, "summary": summary})
 
     # for item in summaries:
     #     print(item["summary"])
@@ -372,17 +907,165 @@ def process_search_results(query: str, results: list[dict]) -> list[dict]:
 
     # summariesの"summary"部分を結合して統合要約を生成
     combined_summaries = "\n".join([entry["summary"] for entry in summaries])
-    final_summary = generate_summary(combined_summaries, query)
+    final_summary = generate_summary(combined_summaries, query, Config.SUMMARY_COMBINED_TOKEN_BUDGET)
 
     # 辞書型に再構成
-    response = {
-        "answer": {
-            "message": final_summary,
-            "references": [{"title": entry["title"], "url": entry["url"]} for entry in summaries]
-        }
-    }
+    return build_latest_response(final_summary, summaries)
+
+
+async def generate_search_query_async(async_client: AsyncOpenAI, question: str) -> str:
+    """
+    generate_search_query の非同期版。
+
+    Args:
+        async_client (AsyncOpenAI): 非同期OpenAIクライアント。
+        question (str): ユーザーが入力した質問内容。
 
-    return response
+    Returns:
+        str: 検索エンジン向けに最適化されたクエリ。
+    """
+    chat_completion = await create_chat_completion_async(async_client,
+        model="gpt-4o-mini",
+        messages=build_search_query_messages(question),
+        temperature=0.7,
+        max_tokens=60,
+        n=1
+    )
+    return chat_completion.choices[0].message.content.strip()
+
+
+async def rank_search_results_async(async_client: AsyncOpenAI, query: str, results: list[dict]) -> list[dict]:
+    """
+    rank_search_results の非同期版。
+
+    Args:
+        async_client (AsyncOpenAI): 非同期OpenAIクライアント。
+        query (str): 検索クエリ
+        results (list[dict]): 検索結果のリスト
+
+    Returns:
+        list[dict]: 並べ替えられた検索結果リスト（上位3件）
+    """
+    response = await create_chat_completion_async(async_client,
+        model="gpt-4o-mini",
+        messages=build_rank_messages(query, results),
+        max_tokens=1000,
+        temperature=0.7,
+        n=1
+    )
+    return parse_ranked_results(response.choices[0].message.content.strip())
+
+
+async def rank_search_results_by_index_async(async_client: AsyncOpenAI, query: str, results: list[dict]) -> list[dict]:
+    """
+    rank_search_results_by_index の非同期版。
+
+    Args:
+        async_client (AsyncOpenAI): 非同期OpenAIクライアント。
+        query (str): 検索クエリ
+        results (list[dict]): 検索結果のリスト
+
+    Returns:
+        list[dict]: 並べ替えられた検索結果リスト（上位3件）
+    """
+    if not results:
+        return []
+    response = await create_chat_completion_async(async_client,
+        model="gpt-4o-mini",
+        messages=build_rank_index_messages(query, results),
+        response_format=RANK_INDEX_RESPONSE_FORMAT,
+        max_tokens=100,
+        temperature=0,
+        n=1
+    )
+    return parse_ranked_indices(response.choices[0].message.content, results)
+
+
+async def generate_summary_async(async_client: AsyncOpenAI, scraped_content: str, question: str,
+                                 token_budget: int | None = None) -> str:
+    """
+    generate_summary の非同期版。
+
+    Args:
+        async_client (AsyncOpenAI): 非同期OpenAIクライアント。
+        scraped_content (str): スクレイピングして取得したウェブページのテキスト内容。
+        question (str): ユーザーが入力した質問内容。
+        token_budget (int | None): 送る内容のトークン予算。省略時は SUMMARY_PAGE_TOKEN_BUDGET。
+
+    Returns:
+        str: 質問内容に合った形式で要約されたテキスト。
+    """
+    if token_budget is None:
+        token_budget = Config.SUMMARY_PAGE_TOKEN_BUDGET
+    scraped_content = select_passages(scraped_content, question, token_budget)
+    chat_completion = await create_chat_completion_async(async_client,
+        model="gpt-4o-mini",
+        messages=build_summary_messages(scraped_content, question),
+        temperature=0.7,
+        max_tokens=150,
+        n=1
+    )
+    return chat_completion.choices[0].message.content.strip()
+
+
+async def generate_summary_snippet_async(async_client: AsyncOpenAI, question: str, ranked_results: list[dict],
+                                         on_delta: Callable[[str], None] | None = None) -> dict:
+    """
+    generate_summary_snippet の非同期版。
+    on_delta を指定した場合は応答をストリーミングで受信し、テキスト片を逐次渡す。
+
+    Args:
+        async_client (AsyncOpenAI): 非同期OpenAIクライアント。
+        question (str): ユーザーが入力した質問内容。
+        ranked_results (list[dict]): 並べ替え済みの検索結果のリスト。
+        on_delta (Callable[[str], None] | None): 要約のテキスト片を受け取るコールバック。
+
+    Returns:
+        dict: save_latest_answer に渡す形式の回答。
+    """
+    chat_completion = await create_chat_completion_async(async_client,
+        model="gpt-4o-mini",
+        messages=build_summary_snippet_messages(question, ranked_results),
+        temperature=0.7,
+        max_tokens=500,
+        n=1,
+        stream=on_delta is not None
+    )
+    if on_delta is not None:
+        final_summary = (await _collect_stream_async(chat_completion, on_delta)).strip()
+    else:
+        final_summary = chat_completion.choices[0].message.content.strip()
+    return build_latest_response(final_summary, ranked_results)
+
+
+async def generate_compact_answer_async(async_client: AsyncOpenAI, question: str, results: list[dict],
+                                        on_delta: Callable[[str], None] | None = None) -> dict:
+    """
+    generate_compact_answer の非同期版。
+
+    Args:
+        async_client (AsyncOpenAI): 非同期OpenAIクライアント。
+        question (str): ユーザーが入力した質問内容。
+        results (list[dict]): 検索結果のリスト（並べ替え前でよい）。
+        on_delta (Callable[[str], None] | None): 回答本文のテキスト片を受け取るコールバック。
+
+    Returns:
+        dict: save_latest_answer に渡す形式の回答。
+    """
+    chat_completion = await create_chat_completion_async(async_client,
+        model="gpt-4o-mini",
+        messages=build_compact_answer_messages(question, results),
+        response_format=COMPACT_ANSWER_RESPONSE_FORMAT,
+        temperature=0.7,
+        max_tokens=600,
+        n=1,
+        stream=on_delta is not None
+    )
+    if on_delta is not None:
+        content = await _collect_stream_async(chat_completion, on_delta, MessageFieldStream())
+    else:
+        content = chat_completion.choices[0].message.content
+    return parse_compact_answer(content, results)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from app.config import Config
+
+
+logger = logging.getLogger(__name__)
+
+
+class PageContentCache:
+    """
+    スクレイピングしたページのテキストをディスクに保持するキャッシュ
+
+    URLのハッシュをファイル名として、抽出済みのテキストとレスポンスの
+    ETag・Last-Modifiedを保存する。取得から ttl 秒以内であればそのまま使い、
+    それ以降は条件付きGETで再検証する（304の場合はHTMLの取得・解析を省く）。
+    合計サイズが max_bytes を超えた場合は、最後に使われたのが古いものから削除する。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float):
+        """
+        Args:
+            directory (str): 保存先のディレクトリ。
+            max_bytes (int): 保存するファイルの合計サイズの上限。
+            ttl (float): 再検証せずに使う秒数。
+        """
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._sizes: dict[str, int] | None = None
+        """ファイル名ごとのサイズ（初回参照時にディレクトリから読み込む）"""
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self._directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _ensure_index(self):
+        """
+        保存済みのファイルとサイズを読み込む。ロックを取得した状態で呼び出す。
+        """
+        if self._sizes is not None:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        self._sizes = {}
+        for entry in os.scandir(self._directory):
+            if entry.is_file() and entry.name.endswith(".json"):
+                self._sizes[entry.name] = entry.stat().st_size
+
+    def get(self, url: str) -> dict | None:
+        """
+        保存されたページを取得する。
+
+        Args:
+            url (str): ページのURL。
+
+        Returns:
+            dict | None: {"url", "text", "etag", "last_modified", "fetched_at"}、ない場合はNone。
+        """
+        path = self._path(url)
+        try:
+            with open(path, encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+            # 最後に使われた時刻として更新時刻を更新する
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def is_fresh(self, entry: dict) -> bool:
+        """
+        再検証せずに使えるかどうかを返す。
+        """
+        return time.time() - entry["fetched_at"] < self._ttl
+
+    @staticmethod
+    def conditional_headers(entry: dict | None) -> dict:
+        """
+        条件付きGETのリクエストヘッダーを作成する。
+
+        Args:
+            entry (dict | None): 保存されたページ。
+
+        Returns:
+            dict: If-None-Match・If-Modified-Since ヘッダー。
+        """
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, text: str, etag: str | None = None, last_modified: str | None = None):
+        """
+        ページのテキストを保存する。
+
+        Args:
+            url (str): ページのURL。
+            text (str): 抽出したテキスト。
+            etag (str | None): レスポンスのETagヘッダー。
+            last_modified (str | None): レスポンスのLast-Modifiedヘッダー。
+        """
+        entry = {
+            "url": url,
+            "text": text,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time()
+        }
+        self._write(url, entry)
+
+    def mark_revalidated(self, url: str, entry: dict):
+        """
+        304で再検証できたページの取得時刻を更新する。
+        """
+        self._write(url, dict(entry, fetched_at=time.time()))
+
+    def _write(self, url: str, entry: dict):
+        path = self._path(url)
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        if len(data) > self._max_bytes:
+            return
+
+        with self._lock:
+            try:
+                self._ensure_index()
+                # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+                temp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(temp_path, "wb") as cache_file:
+                    cache_file.write(data)
+                os.replace(temp_path, path)
+                self._sizes[os.path.basename(path)] = len(data)
+                self._evict()
+            except OSError as e:
+                logger.warning("Error writing page cache for %s: %s", url, e)
+
+    def _evict(self):
+        """
+        合計サイズが上限を超えている場合、最後に使われたのが古いファイルから削除する。
+        ロックを取得した状態で呼び出す。
+        """
+        total = sum(self._sizes.values())
+        if total <= self._max_bytes:
+            return
+
+        def last_used(name: str) -> float:
+            try:
+                return os.path.getmtime(os.path.join(self._directory, name))
+            except OSError:
+                return 0
+
+        for name in sorted(self._sizes, key=last_used):
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
+            total -= self._sizes.pop(name)
+
+
+page_cache = PageContentCache(Config.PAGE_CACHE_DIR, Config.PAGE_CACHE_MAX_BYTES, Config.PAGE_CACHE_TTL) \
+    if Config.PAGE_CACHE_DIR else None
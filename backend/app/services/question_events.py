@@ -0,0 +1,138 @@
+import threading
+
+from app.extention import TTLCache
+
+
+class QuestionEvents:
+    """
+    質問の処理完了をプロセス内で通知する仕組み
+
+    process_question が処理を終えると notify し、完了を待っている
+    リクエストスレッド（ロングポーリング・SSE）を起こす。
+    データベースをポーリングせずに完了を検知するための高速経路で、通知が届くのは
+    同じプロセス内で処理された質問のみ。別のプロセス（複数のワーカープロセス、
+    flask word-batch poll）で完了した質問は、待機側が QUESTION_WAIT_POLL_INTERVAL 秒ごとに
+    データベースのステータスを確認して検知する。
+    回答をストリーミング生成する場合は、生成途中のテキストも publish で中継する。
+
+    待機中のスレッドは質問IDごとの Condition で待つため、通知で起きるのは
+    その質問を待っているスレッドだけになる（Condition はすべて同じロックを共有する）。
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        """
+        Args:
+            maxsize (int): 完了済みとして覚えておく質問の最大件数。
+            ttl (float): 完了済みとして覚えておく秒数。
+        """
+        self._lock = threading.Lock()
+        self._conditions: dict[str, threading.Condition] = {}
+        """待機中のスレッドがいる質問IDごとの Condition"""
+        self._waiter_counts: dict[str, int] = {}
+        """質問IDごとの待機中のスレッド数（0になったら Condition を破棄する）"""
+        self._completed = TTLCache(maxsize, ttl)
+        self._chunks = TTLCache(maxsize, ttl)
+        """質問IDごとの生成途中のテキスト片のリスト"""
+
+    def reset(self, question_id: str):
+        """
+        質問の処理を開始する前に、前回の処理の完了通知とテキスト片を消去する。
+
+        Args:
+            question_id (str): 質問のID。
+        """
+        with self._lock:
+            self._completed.delete(question_id)
+            self._chunks.delete(question_id)
+
+    def publish(self, question_id: str, text: str):
+        """
+        生成途中の回答のテキスト片を通知する。
+
+        Args:
+            question_id (str): 質問のID。
+            text (str): 新たに生成されたテキスト片。
+        """
+        with self._lock:
+            chunks = self._chunks.get(question_id)
+            if chunks is None:
+                chunks = []
+                self._chunks.set(question_id, chunks)
+            chunks.append(text)
+            self._notify_waiters(question_id)
+
+    def wait_for_chunks(self, question_id: str, offset: int, timeout: float) -> tuple[list[str], bool]:
+        """
+        offset 番目以降のテキスト片が届くか、処理が完了するまで待つ。
+
+        Args:
+            question_id (str): 質問のID。
+            offset (int): 受信済みのテキスト片の数。
+            timeout (float): 最大待機秒数。
+
+        Returns:
+            tuple:
+                - list[str]: 新たに届いたテキスト片。
+                - bool: 処理が完了しているかどうか。
+        """
+        def ready() -> bool:
+            chunks = self._chunks.get(question_id) or []
+            return len(chunks) > offset or self._completed.get(question_id) is not None
+
+        with self._lock:
+            self._wait_for(question_id, ready, timeout)
+            chunks = self._chunks.get(question_id) or []
+            return chunks[offset:], self._completed.get(question_id) is not None
+
+    def notify(self, question_id: str):
+        """
+        質問の処理が完了したことを通知する。
+
+        Args:
+            question_id (str): 質問のID。
+        """
+        with self._lock:
+            self._completed.set(question_id, True)
+            self._notify_waiters(question_id)
+
+    def wait(self, question_id: str, timeout: float) -> bool:
+        """
+        質問の処理が完了するまで待つ。
+
+        Args:
+            question_id (str): 質問のID。
+            timeout (float): 最大待機秒数。
+
+        Returns:
+            bool: 完了した場合はTrue、タイムアウトした場合はFalse。
+        """
+        with self._lock:
+            return self._wait_for(question_id, lambda: self._completed.get(question_id) is not None, timeout)
+
+    def _wait_for(self, question_id: str, predicate, timeout: float) -> bool:
+        """
+        質問IDの Condition で predicate が真になるまで待つ。self._lock を保持した状態で呼ぶ。
+        """
+        condition = self._conditions.get(question_id)
+        if condition is None:
+            condition = self._conditions[question_id] = threading.Condition(self._lock)
+            self._waiter_counts[question_id] = 0
+        self._waiter_counts[question_id] += 1
+        try:
+            return condition.wait_for(predicate, timeout)
+        finally:
+            self._waiter_counts[question_id] -= 1
+            if self._waiter_counts[question_id] == 0:
+                del self._waiter_counts[question_id]
+                del self._conditions[question_id]
+
+    def _notify_waiters(self, question_id: str):
+        """
+        質問IDを待っているスレッドだけを起こす。self._lock を保持した状態で呼ぶ。
+        """
+        condition = self._conditions.get(question_id)
+        if condition is not None:
+            condition.notify_all()
+
+
+question_events = QuestionEvents()
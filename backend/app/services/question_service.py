@@ -1,57 +1,100 @@
 from app.models.model import Question
 from app.repositories.repository import SeijiTalkRepository
+from app.repositories.master_data import master_data
 from app.services.openai_service import generate_search_query,generate_word_answer,generate_summary_snippet,rank_search_results, process_search_results
-from app.services.search_service import search_with_fallback
+from app.services.openai_service import stream_word_answer, stream_summary_snippet, generate_compact_answer
+from app.services.search_service import search
+from app.services.latest_pipeline import run_latest_pipeline_blocking
+from app.services.ranking import rank_results
+from app.services.answer_cache import answer_cache
+from app.services.question_events import question_events
+from app.services.tracing import tracer
+from app.config import Config
+from functools import partial
 import json
-import traceback
+import logging
+
+logger = logging.getLogger(__name__)
 
 # from openai_service import generate_search_query,generate_word_answer,rank_search_results
 # from search_service import search_with_fallback
 
 
 
-def handle_latest_mode(question :Question):
+def run_latest_pipeline_sync(question :Question) -> dict:
     """
-    'latest' モードの場合の処理。
-    外部API（例: Google APIやDuckDuckGo API）を使って検索し、結果を要約する。
+    'latest' モードの回答を逐次処理で生成する。
 
     Args:
         question (Question): 質問オブジェクト。
 
     Returns:
-        None    (データベースにとうろくしたら終わり)
-
+        dict: save_latest_answer に渡す形式の回答。
     """
-    try:
-        # 質問から検索クエリを生成
+    # 質問から検索クエリを生成
+    with tracer.span("stage", "generate_search_query"):
         search_query = generate_search_query(question.message)
 
-        print("クエリの生成結果")
-        print(search_query)
-        
-        # 検索結果を取得（Google API または DuckDuckGo API）
-        search_results = search_with_fallback(search_query)
+    logger.debug("クエリの生成結果: %s", search_query)
+
+    # 検索結果を取得（Google API または DuckDuckGo API）
+    with tracer.span("stage", "search"):
+        search_results = search(search_query)
+
+    # 検索結果を出力（DEBUGが無効な場合はJSONへの変換も行わない）
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("検索結果: %s", json.dumps(search_results, ensure_ascii=False))
+
+
+    if Config.LATEST_ANSWER_SOURCE == "compact":
+        # 並べ替えと要約を1回のチャット補完で行う
+        on_delta = partial(question_events.publish, question.id) if Config.ANSWER_STREAMING else None
+        with tracer.span("stage", "generate_compact_answer"):
+            return generate_compact_answer(question.message, search_results, on_delta)
+
+    with tracer.span("stage", "rank_search_results"):
+        ranked_results = rank_results(search_query,search_results)
 
-        # 検索結果を出力
-        print("検索結果:")
-        for result in search_results:
-            print(json.dumps(result, indent=2, ensure_ascii=False))
 
+    if Config.LATEST_ANSWER_SOURCE == "scrape":
+        with tracer.span("stage", "process_search_results"):
+            return process_search_results(question.message,ranked_results)
+    with tracer.span("stage", "generate_summary_snippet"):
+        if Config.ANSWER_STREAMING:
+            # 生成途中の要約をストリーミングエンドポイントに中継
+            return stream_summary_snippet(question.message, ranked_results, partial(question_events.publish, question.id))
+        return generate_summary_snippet(question.message,ranked_results)
 
-        ranked_results = rank_search_results(search_query,search_results)
 
+def handle_latest_mode(question :Question):
+    """
+    'latest' モードの場合の処理。
+    外部API（例: Google APIやDuckDuckGo API）を使って検索し、結果を要約する。
+
+    Args:
+        question (Question): 質問オブジェクト。
 
-        final_results = generate_summary_snippet(question.message,ranked_results)
+    Returns:
+        None    (データベースにとうろくしたら終わり)
 
-        # final_results = process_search_results(question.message,ranked_results)
+    """
+    try:
+        if Config.LATEST_PIPELINE == "async":
+            # 非同期パイプラインで検索・スクレイピング・要約を並行に実行
+            on_delta = partial(question_events.publish, question.id) if Config.ANSWER_STREAMING else None
+            with tracer.span("stage", "run_latest_pipeline"):
+                final_results = run_latest_pipeline_blocking(question.message, on_delta)
+        else:
+            final_results = run_latest_pipeline_sync(question)
 
-        print("最終結果")
-        print(final_results)
+        logger.debug("最終結果: %s", final_results)
 
-        data = SeijiTalkRepository.save_latest_answer(question,final_results)
+        with tracer.span("stage", "save_latest_answer"):
+            data = SeijiTalkRepository.save_latest_answer(question,final_results)
+        answer_cache.put(question.message, "latest", final_results)
 
     except Exception as e:
-        print(f"Error in handle_latest_mode for question {question.id}: {str(e)}")
+        logger.error("Error in handle_latest_mode for question %s: %s", question.id, e)
 
 
 def handle_word_mode(question :Question):
@@ -67,12 +110,47 @@ def handle_word_mode(question :Question):
     """
     try:
         # 質問からキーワードを抽出 OpenAiで抽出
-        answer = generate_word_answer(question.message)
+        with tracer.span("stage", "generate_word_answer"):
+            if Config.ANSWER_STREAMING:
+                # 生成途中の回答本文をストリーミングエンドポイントに中継
+                answer = stream_word_answer(question.message, partial(question_events.publish, question.id))
+            else:
+                answer = generate_word_answer(question.message)
         
-        data = SeijiTalkRepository.save_word_answer(question, answer)
+        with tracer.span("stage", "save_word_answer"):
+            data = SeijiTalkRepository.save_word_answer(question, answer)
+        answer_cache.put(question.message, "word", answer)
     except Exception as e:
-        print(f"Error in handle_latest_mode for question {question.id}: {str(e)}")
+        logger.error("Error in handle_word_mode for question %s: %s", question.id, e)
+
+
 
+def answer_from_cache(question :Question, mode_name: str) -> bool:
+    """
+    他のユーザーの同じ質問に対する回答がキャッシュにあれば、それを回答として保存する。
+
+    Args:
+        question (Question): 質問オブジェクト。
+        mode_name (str): モード名。
+
+    Returns:
+        bool: キャッシュから回答を保存できた場合はTrue。
+    """
+    cached = answer_cache.get(question.message, mode_name)
+    if cached is None:
+        return False
+
+    try:
+        if mode_name == "latest":
+            SeijiTalkRepository.save_latest_answer(question, cached)
+        else:
+            SeijiTalkRepository.save_word_answer(question, cached)
+    except Exception as e:
+        logger.error("Error in answer_from_cache for question %s: %s", question.id, e)
+        return False
+
+    logger.info("Answer for Question %s served from cache.", question.id)
+    return True
 
 
 def process_question(app, question_id: str) -> None:
@@ -87,24 +165,36 @@ def process_question(app, question_id: str) -> None:
         None
     """
 
+    question_events.reset(question_id)
+
     try:
-        # アプリケーションコンテキストの中で処理を実行
-        with app.app_context():
+        # アプリケーションコンテキストの中で処理を実行（スパンには質問IDとモードを付ける）
+        with app.app_context(), tracer.bind(question_id), tracer.span("stage", "process_question"):
             # 質問をデータベースから取得
             question = Question.query.filter_by(id=question_id).first()
             if not question:
                 raise ValueError(f"Question with ID '{question_id}' not found.")
 
-            if question.mode.name == "latest":
+            mode_name = master_data.mode_name(question.mode_id)
+            tracer.set_mode(mode_name)
+            if answer_from_cache(question, mode_name):
+                # キャッシュから回答済み（外部APIは呼び出さない）
+                pass
+            elif mode_name == "latest":
                 # "latest" モードに対する処理
                 handle_latest_mode(question)  # 外部API呼び出しや検索の処理
-            elif question.mode.name == "word":
+            elif mode_name == "word":
                 # "word" モードに対する処理
                 handle_word_mode(question)  # 関連語の抽出や検出の処理
 
+            # 回答が保存されなかった質問はFAILUREにする（PENDINGのまま再処理され続けないように）
+            SeijiTalkRepository.mark_question_failed(question)
+
     except Exception as e:
-        print(f"Error in process_question for question {question_id}: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in process_question for question %s: %s", question_id, e)
+    finally:
+        # 完了を待っているリクエスト（ロングポーリング・SSE）に通知
+        question_events.notify(question_id)
 
 
 if __name__ == "__main__":
@@ -123,7 +213,7 @@ if __name__ == "__main__":
             return
 
         # 検索結果を取得（Google API または DuckDuckGo API）
-        search_results = search_with_fallback(search_query)
+        search_results = search(search_query)
 
         # 検索結果を出力
         print("検索結果:")
@@ -0,0 +1,253 @@
+import logging
+import os
+import queue
+import socket
+import threading
+
+import click
+from sqlalchemy import or_
+
+from app.models.model import Question
+from app.repositories.master_data import master_data
+from app.repositories.repository import SeijiTalkRepository
+from app.services.question_service import process_question
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """
+    質問処理キューが満杯で、新しい質問を受け付けられないことを表す例外
+    """
+
+
+class QuestionWorkerPool:
+    """
+    固定数のワーカースレッドで質問を処理するワーカープール
+
+    キューには質問IDのみを積み、処理状態の正はデータベースの
+    Question.status_id（PENDING）とする。キューが溢れた質問や再起動前に
+    処理されなかった質問は、PENDINGのまま残り、キューが空いた時点で
+    データベースから再投入される。
+
+    処理の前に質問の処理権（claimed_by / claimed_at）をデータベース上で取得するため、
+    複数のプロセス・ホストが同じ質問を投入しても処理されるのは1回だけになる。
+    処理中に終了したプロセスの質問は、処理権の期限が切れた後の定期的な再投入
+    （QUESTION_RECOVERY_INTERVAL）で処理し直される。
+    """
+
+    def __init__(self):
+        self._app = None
+        self._queue: queue.Queue | None = None
+        self._threads: list[threading.Thread] = []
+        self._recovery_thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._pending_ids: set[str] = set()
+        """キュー内または処理中の質問ID"""
+        self._backlog = False
+        """データベース上に未投入のPENDING質問が残っているかどうか"""
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"[-64:]
+        """処理権を取得する際のこのプロセスの識別子"""
+
+    def init_app(self, app):
+        """
+        Flaskアプリケーションにワーカープールを登録する。
+        QUESTION_WORKER_AUTOSTART が有効でも、flask run 以外の flask コマンド
+        （flask db upgrade、flask seed、flask word-batch など）ではワーカーを起動しない。
+
+        Args:
+            app (Flask): Flaskアプリケーションインスタンス。
+        """
+        self._app = app
+        self._queue = queue.Queue(maxsize=app.config['QUESTION_QUEUE_MAXSIZE'])
+        app.extensions['question_worker'] = self
+
+        if app.config['QUESTION_WORKER_AUTOSTART'] and not _in_cli_command():
+            self.start()
+            self.recover_pending()
+
+    def start(self):
+        """
+        設定された数のワーカースレッドと、PENDINGの質問を定期的に再投入するスレッドを起動する。
+        既に起動済みの場合は何もしない。
+        """
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            interval = self._app.config['QUESTION_RECOVERY_INTERVAL']
+            if interval > 0:
+                self._recovery_thread = threading.Thread(
+                    target=self._recover_periodically,
+                    args=(interval,),
+                    name="question-recovery",
+                    daemon=True
+                )
+                self._recovery_thread.start()
+            for index in range(self._app.config['QUESTION_WORKER_COUNT']):
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"question-worker-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float | None = None):
+        """
+        キューに積まれた質問を処理し終えた後、ワーカースレッドを停止する。
+
+        Args:
+            timeout (float | None): 各スレッドの終了を待つ秒数。
+        """
+        with self._lock:
+            threads = self._threads
+            self._threads = []
+            recovery_thread = self._recovery_thread
+            self._recovery_thread = None
+        self._stopping.set()
+        if recovery_thread is not None:
+            recovery_thread.join(timeout)
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, question_id: str) -> bool:
+        """
+        質問IDを処理キューに投入する。
+
+        Args:
+            question_id (str): 質問のID。
+
+        Returns:
+            bool: 新たに投入した場合はTrue、既にキュー内または処理中の場合はFalse。
+
+        Raises:
+            QueueFullError: キューが満杯の場合。
+        """
+        with self._lock:
+            if question_id in self._pending_ids:
+                return False
+            try:
+                self._queue.put_nowait(question_id)
+            except queue.Full:
+                # 質問はPENDINGのままデータベースに残るため、キューが空いたら再投入する
+                self._backlog = True
+                raise QueueFullError("Question queue is full.")
+            self._pending_ids.add(question_id)
+            return True
+
+    def recover_pending(self) -> int:
+        """
+        データベース上でPENDINGのままの質問を古い順にキューへ再投入する。
+
+        Returns:
+            int: 新たに投入した質問の件数。
+        """
+        with self._lock:
+            self._backlog = False
+
+        try:
+            with self._app.app_context():
+                # 他のプロセスが処理中（処理権の期限内）の質問は除く
+                query = Question.query.with_entities(Question.id)\
+                    .filter(Question.status_id == master_data.status_id("PENDING"))\
+                    .filter(or_(
+                        Question.claimed_at.is_(None),
+                        Question.claimed_at < SeijiTalkRepository.claim_cutoff()
+                    ))
+                if self._app.config['WORD_ANSWER_MODE'] == "batch":
+                    # バッチで回答する用語モードの質問は flask word-batch で処理する
+                    query = query.filter(Question.mode_id != master_data.mode_id("word"))
+                rows = query.order_by(Question.created_at.asc()).all()
+        except Exception as e:
+            logger.error("Error occurred while recovering pending questions: %s", e)
+            return 0
+
+        submitted = 0
+        for (question_id,) in rows:
+            try:
+                if self.submit(question_id):
+                    submitted += 1
+            except QueueFullError:
+                break
+
+        if submitted:
+            logger.info("%d pending questions have been queued.", submitted)
+        return submitted
+
+    def stats(self) -> dict:
+        """
+        ワーカープールの状態を返す。
+
+        Returns:
+            dict: ワーカー数、キュー長、処理中を含む未完了件数。
+        """
+        with self._lock:
+            return {
+                "workers": len(self._threads),
+                "queued": self._queue.qsize() if self._queue else 0,
+                "pending": len(self._pending_ids),
+                "backlog": self._backlog
+            }
+
+    def _run(self):
+        """
+        ワーカースレッドの本体。キューから質問IDを取り出して処理する。
+        """
+        while True:
+            question_id = self._queue.get()
+            if question_id is None:
+                self._queue.task_done()
+                return
+
+            try:
+                if self._claim(question_id):
+                    process_question(self._app, question_id)
+            finally:
+                with self._lock:
+                    self._pending_ids.discard(question_id)
+                    refill = self._backlog and self._queue.empty()
+                self._queue.task_done()
+
+            if refill:
+                self.recover_pending()
+
+    def _recover_periodically(self, interval: float):
+        """
+        停止するまで interval 秒ごとにPENDINGの質問を再投入する。
+        """
+        while not self._stopping.wait(interval):
+            self.recover_pending()
+
+    def _claim(self, question_id: str) -> bool:
+        """
+        質問の処理権を取得する。他のプロセスが処理中・処理済みの場合はFalse。
+        データベースのエラーで取得できなかった場合は、PENDINGのまま残る質問を後で再投入する。
+        """
+        try:
+            with self._app.app_context():
+                claimed = SeijiTalkRepository.claim_question(question_id, self.worker_id)
+        except Exception as e:
+            logger.error("Failed to claim question %s; it will be requeued: %s", question_id, e)
+            with self._lock:
+                self._backlog = True
+            return False
+        if not claimed:
+            logger.debug("Question %s is already claimed or answered; skipped.", question_id)
+        return claimed
+
+
+def _in_cli_command() -> bool:
+    """
+    flask run 以外の flask コマンドの実行中かどうかを返す。
+    flask コマンドはクリックのコンテキスト内でアプリケーションを作成する。
+    """
+    context = click.get_current_context(silent=True)
+    return context is not None and context.info_name != "run"
+
+
+question_worker = QuestionWorkerPool()
@@ -0,0 +1,216 @@
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from datetime import date
+from urllib.parse import urlparse
+
+from openai import AsyncOpenAI
+
+from app.config import Config
+from app.services.openai_service import (
+    rank_search_results, rank_search_results_async,
+    rank_search_results_by_index, rank_search_results_by_index_async
+)
+
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+RELEVANCE_WEIGHT = 1.0
+TRUST_WEIGHT = 0.3
+FRESHNESS_WEIGHT = 0.2
+SPECIFICITY_WEIGHT = 0.1
+
+DOMAIN_TRUST = [
+    ((".go.jp", ".lg.jp", ".gov"), 1.0),
+    ((".ac.jp", ".edu", ".or.jp"), 0.7),
+    ((".jp",), 0.4),
+]
+"""ドメインの末尾と信頼度（先に一致したものを使う）"""
+
+_TOKEN = re.compile(r"[a-z0-9]+|[^\sa-z0-9]+")
+_YEAR = re.compile(r"(20\d{2})年?")
+_REIWA = re.compile(r"令和\s*(\d{1,2}|元)\s*年")
+_RECENT = re.compile(r"\d+\s*(分|時間|日)前")
+_DIGIT = re.compile(r"\d")
+_PUNCTUATION = set("、。・「」『』（）()【】[]！？!?：:；;，,．.")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    日本語を含むテキストをBM25用のトークンに分割する。
+    英数字は単語単位、それ以外（日本語）は単語の区切りがないため文字bigram単位とする。
+
+    Args:
+        text (str): テキスト。
+
+    Returns:
+        list[str]: トークンのリスト。
+    """
+    tokens = []
+    for run in _TOKEN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if run.isascii():
+            tokens.append(run)
+            continue
+        run = "".join(char for char in run if char not in _PUNCTUATION)
+        if len(run) == 1:
+            tokens.append(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def bm25_scores(query: str, documents: list[str]) -> list[float]:
+    """
+    検索結果の集合を文書集合としてBM25のスコアを計算する。
+
+    Args:
+        query (str): 検索クエリ。
+        documents (list[str]): 文書のリスト。
+
+    Returns:
+        list[float]: 文書ごとのスコア。
+    """
+    tokenized = [tokenize(document) for document in documents]
+    if not tokenized:
+        return []
+    average_length = sum(len(tokens) for tokens in tokenized) / len(tokenized) or 1
+    document_frequency = Counter(token for tokens in tokenized for token in set(tokens))
+    query_tokens = set(tokenize(query))
+
+    scores = []
+    for tokens in tokenized:
+        term_frequency = Counter(tokens)
+        score = 0.0
+        for token in query_tokens:
+            frequency = term_frequency.get(token)
+            if not frequency:
+                continue
+            df = document_frequency[token]
+            idf = math.log(1 + (len(tokenized) - df + 0.5) / (df + 0.5))
+            score += idf * frequency * (BM25_K1 + 1) / (
+                frequency + BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average_length)
+            )
+        scores.append(score)
+    return scores
+
+
+def domain_trust(url: str) -> float:
+    """
+    URLのドメインの信頼度（0〜1）を返す。公的機関・教育機関のドメインを高くする。
+    """
+    host = (urlparse(url).hostname or "").lower()
+    for suffixes, trust in DOMAIN_TRUST:
+        if host.endswith(suffixes):
+            return trust
+    return 0.0
+
+
+def freshness(text: str, today: date | None = None) -> float:
+    """
+    タイトル・スニペットに含まれる日付から情報の鮮度（0〜1）を見積もる。
+    「3日前」などの表記は最新とみなし、年の表記は今年を1として5年で0になる。日付がない場合は0。
+    """
+    if _RECENT.search(text):
+        return 1.0
+
+    text = unicodedata.normalize("NFKC", text)
+    years = [int(year) for year in _YEAR.findall(text)]
+    # 令和元年は2019年
+    years += [2018 + (1 if reiwa == "元" else int(reiwa)) for reiwa in _REIWA.findall(text)]
+    current_year = (today or date.today()).year
+    years = [year for year in years if year <= current_year]
+    if not years:
+        return 0.0
+    return max(0.0, 1 - (current_year - max(years)) / 5)
+
+
+def rank_search_results_local(query: str, results: list[dict], top_n: int = 3) -> list[dict]:
+    """
+    検索結果をLLMを使わずに並べ替え、上位 top_n 件を返す。
+
+    タイトルとスニペットに対するBM25（最大値で正規化）を主とし、LLMの並べ替えで
+    考慮していたURLの信頼性・情報の鮮度・具体性（数字を含むか）を加点する。
+
+    Args:
+        query (str): 検索クエリ
+        results (list[dict]): 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
+        top_n (int): 返す件数
+
+    Returns:
+        list[dict]: 並べ替えられた検索結果リスト（上位 top_n 件）
+    """
+    texts = [f"{result.get('title', '')} {result.get('snippet', '')}" for result in results]
+    relevance = bm25_scores(query, texts)
+    max_relevance = max(relevance, default=0) or 1
+
+    def score(index: int) -> tuple[float, int]:
+        total = (
+            RELEVANCE_WEIGHT * relevance[index] / max_relevance
+            + TRUST_WEIGHT * domain_trust(results[index].get("url", ""))
+            + FRESHNESS_WEIGHT * freshness(texts[index])
+            + SPECIFICITY_WEIGHT * (1.0 if _DIGIT.search(texts[index]) else 0.0)
+        )
+        # 同点の場合は検索エンジンの順位を優先する
+        return total, -index
+
+    order = sorted(range(len(results)), key=score, reverse=True)
+    return [results[index] for index in order[:top_n]]
+
+
+def rank_results(query: str, results: list[dict]) -> list[dict]:
+    """
+    SEARCH_RANKER に従って検索結果を並べ替える。
+    local: rank_search_results_local / llm: rank_search_results（OpenAI）/
+    llm_index: rank_search_results_by_index（OpenAI、番号のみを出力させる）。
+    OpenAIによる並べ替えに失敗した場合は rank_search_results_local で並べ替える。
+
+    Args:
+        query (str): 検索クエリ
+        results (list[dict]): 検索結果のリスト
+
+    Returns:
+        list[dict]: 並べ替えられた検索結果リスト（上位3件）
+    """
+    if Config.SEARCH_RANKER not in ("llm", "llm_index"):
+        return rank_search_results_local(query, results)
+    try:
+        if Config.SEARCH_RANKER == "llm":
+            ranked_results = rank_search_results(query, results)
+        else:
+            ranked_results = rank_search_results_by_index(query, results)
+    except Exception as e:
+        logger.warning("LLM ranking failed; falling back to local ranking: %s", e)
+        return rank_search_results_local(query, results)
+    return _or_local(ranked_results, query, results)
+
+
+async def rank_results_async(async_client: AsyncOpenAI, query: str, results: list[dict]) -> list[dict]:
+    """
+    rank_results の非同期版。
+    """
+    if Config.SEARCH_RANKER not in ("llm", "llm_index"):
+        return rank_search_results_local(query, results)
+    try:
+        if Config.SEARCH_RANKER == "llm":
+            ranked_results = await rank_search_results_async(async_client, query, results)
+        else:
+            ranked_results = await rank_search_results_by_index_async(async_client, query, results)
+    except Exception as e:
+        logger.warning("LLM ranking failed; falling back to local ranking: %s", e)
+        return rank_search_results_local(query, results)
+    return _or_local(ranked_results, query, results)
+
+
+def _or_local(ranked_results: list[dict] | None, query: str, results: list[dict]) -> list[dict]:
+    """
+    OpenAIによる並べ替えの結果が得られなかった場合（応答の形式が不適切でNone、または空）は
+    rank_search_results_local で並べ替える。
+    """
+    if ranked_results or not results:
+        return ranked_results or []
+    logger.warning("LLM ranking returned no results; falling back to local ranking.")
+    return rank_search_results_local(query, results)
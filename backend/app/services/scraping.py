@@ -1,29 +1,108 @@
-from bs4 import BeautifulSoup
-import requests
+import aiohttp
+import asyncio
+import logging
+from app.config import Config
+from app.extention import get_http_session
+from app.services.html_extract import extract_text_from_chunks, charset_from_content_type
+from app.services.page_cache import page_cache
+from app.services.tracing import tracer
 
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_CHUNK_SIZE = 64 * 1024
+
+
+async def read_limited(response: aiohttp.ClientResponse, max_bytes: int) -> bytes:
+    """
+    レスポンスの本文を最大 max_bytes まで読み込む。
+    """
+    chunks = []
+    received = 0
+    async for chunk in response.content.iter_chunked(SCRAPE_CHUNK_SIZE):
+        chunks.append(chunk)
+        received += len(chunk)
+        if received >= max_bytes:
+            break
+    return b"".join(chunks)[:max_bytes]
+
+
+@tracer.traced("scrape", "fetch")
 def scrape_page_content(url: str) -> str:
     """
     指定したURLのページ内容を非同期でスクレイピングして、テキストを返す。
+    取得したテキストは page_cache に保存し、次回以降は条件付きGETで再検証する。
+
+    Args:
+        url (str): ページのURL
+
+    Returns:
+        str: ページのテキスト内容
+    """
+    try:
+        cached = page_cache.get(url) if page_cache else None
+        if cached and page_cache.is_fresh(cached):
+            return cached["text"]
+
+        headers = page_cache.conditional_headers(cached) if page_cache else None
+        # 本文は SCRAPE_MAX_BYTES まで読み込みながら解析する
+        with get_http_session("scrape").get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304 and cached:
+                # 変更がないため、HTMLの解析を省いて保存済みのテキストを使う
+                page_cache.mark_revalidated(url, cached)
+                return cached["text"]
+            response.raise_for_status()  # HTTPエラーを確認
+            text = extract_text_from_chunks(
+                response.iter_content(SCRAPE_CHUNK_SIZE),
+                charset_from_content_type(response.headers.get("Content-Type"))
+            )
+        if page_cache and text:
+            # テキストを抽出できなかったページ（JavaScriptで描画するページなど）は保存しない
+            page_cache.put(url, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return text
+    except Exception as e:
+        logger.warning("ページ内容の取得に失敗しました: %s: %s", url, e)
+        return ""
+
+
+@tracer.traced("scrape", "fetch")
+async def scrape_page_content_async(session: aiohttp.ClientSession, url: str) -> str:
+    """
+    scrape_page_content の非同期版。
+    HTMLの解析とキャッシュの読み書きは、イベントループを止めないよう別スレッドで行う。
 
     Args:
+        session (aiohttp.ClientSession): 共有するHTTPセッション
         url (str): ページのURL
 
     Returns:
         str: ページのテキスト内容
     """
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # HTTPエラーを確認
-        html_content = response.text  # ページ内容を取得
-        soup = BeautifulSoup(html_content, "html.parser")
+        cached = await asyncio.to_thread(page_cache.get, url) if page_cache else None
+        if cached and page_cache.is_fresh(cached):
+            return cached["text"]
 
-        # 主に本文に含まれるテキストを抽出
-        text = soup.get_text(separator="\n", strip=True)
+        headers = page_cache.conditional_headers(cached) if page_cache else None
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304 and cached:
+                # 変更がないため、HTMLの解析を省いて保存済みのテキストを使う
+                await asyncio.to_thread(page_cache.mark_revalidated, url, cached)
+                return cached["text"]
+            response.raise_for_status()  # HTTPエラーを確認
+            html_content = await read_limited(response, Config.SCRAPE_MAX_BYTES)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            charset = response.charset
+        text = await asyncio.to_thread(extract_text_from_chunks, [html_content], charset)
+        if page_cache and text:
+            # テキストを抽出できなかったページ（JavaScriptで描画するページなど）は保存しない
+            await asyncio.to_thread(page_cache.put, url, text, etag, last_modified)
         return text
     except Exception as e:
-        print(f"ページ内容の取得に失敗しました: {e}")
+        logger.warning("ページ内容の取得に失敗しました: %s: %s", url, e)
         return ""
-    
+
 
 if __name__ == "__main__":
     # サンプルURLを指定
@@ -38,4 +117,4 @@ if __name__ == "__main__":
         print(content)  # 最初の1000文字を表示
         print(len(content))
     else:
-        print("スクレイピングに失敗しました。")
\ No newline at end of file
+        print("スクレイピングに失敗しました。")
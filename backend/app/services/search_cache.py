@@ -0,0 +1,231 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextvars import copy_context
+from typing import Callable
+
+from app.config import Config
+from app.extention import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """
+    キャッシュのキーにするため、検索クエリを正規化する。
+    全角・半角の揺れ、大文字・小文字、空白の違いを吸収する。
+
+    Args:
+        query (str): 検索クエリ。
+
+    Returns:
+        str: 正規化された検索クエリ。
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+class MemorySearchStore:
+    """
+    検索結果をプロセス内に保持するLRUストア
+    """
+
+    def __init__(self, maxsize: int, max_age: float):
+        """
+        Args:
+            maxsize (int): 保持する最大件数。
+            max_age (float): 保持する秒数（古い結果として返す期間を含む）。
+        """
+        self._cache = TTLCache(maxsize, max_age)
+
+    def get(self, key: str) -> tuple[list[dict], float] | None:
+        return self._cache.get(key)
+
+    def set(self, key: str, results: list[dict], stored_at: float):
+        self._cache.set(key, (results, stored_at))
+
+
+class SqliteSearchStore:
+    """
+    検索結果をSQLiteファイルに保持するストア。再起動後も結果を再利用できる。
+    """
+
+    def __init__(self, path: str, max_age: float):
+        """
+        Args:
+            path (str): SQLiteファイルのパス。
+            max_age (float): 保持する秒数（古い結果として返す期間を含む）。
+        """
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, results TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> tuple[list[dict], float] | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT results, stored_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] + self._max_age <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, results: list[dict], stored_at: float):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO search_cache (key, results, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(results, ensure_ascii=False), stored_at)
+            )
+            # 書き込み100回ごとに期限切れの行を削除する
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._connection.execute(
+                    "DELETE FROM search_cache WHERE stored_at < ?", (time.time() - self._max_age,)
+                )
+            self._connection.commit()
+
+
+class SearchCache:
+    """
+    検索結果のキャッシュ
+
+    正規化した検索クエリ・検索プロバイダ・取得件数をキーに、検索結果を複数の
+    ストア（メモリ、SQLiteなど）に保持する。前のストアほど速い前提で順に参照し、
+    見つかった結果は前のストアにも書き戻す。
+
+    保存から ttl 秒以内の結果はそのまま返す。ttl を過ぎても stale_ttl 秒以内であれば、
+    古い結果をすぐに返しつつバックグラウンドで検索し直す（stale-while-revalidate）。
+    """
+
+    def __init__(self, stores: list, ttl: float, stale_ttl: float):
+        """
+        Args:
+            stores (list): 参照順に並べたストアのリスト。
+            ttl (float): 結果を新しいとみなす秒数。
+            stale_ttl (float): ttl を過ぎた後、古い結果として返す秒数。
+        """
+        self._stores = stores
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(provider: str, query: str, num_results: int) -> str:
+        """
+        キャッシュのキーを作成する。
+        """
+        return f"{provider}:{num_results}:{normalize_query(query)}"
+
+    def _lookup(self, key: str) -> tuple[list[dict], float] | None:
+        for index, store in enumerate(self._stores):
+            entry = store.get(key)
+            if entry is not None:
+                # 前のストアに書き戻す
+                for faster_store in self._stores[:index]:
+                    faster_store.set(key, *entry)
+                return entry
+        return None
+
+    def _store(self, key: str, results: list[dict]):
+        stored_at = time.time()
+        for store in self._stores:
+            store.set(key, results, stored_at)
+
+    def _refresh(self, key: str, fetch: Callable[[], list[dict]]):
+        """
+        バックグラウンドで検索し直してキャッシュを更新する。
+        """
+        try:
+            results = fetch()
+            if results:
+                self._store(key, results)
+        except Exception as e:
+            logger.warning("Error refreshing search cache for '%s': %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def cached_search(self, provider: str, query: str, num_results: int,
+                      fetch: Callable[[], list[dict]]) -> list[dict]:
+        """
+        キャッシュを参照し、必要な場合のみ fetch を呼び出して検索する。
+
+        Args:
+            provider (str): 検索プロバイダ名（例: "google", "duckduckgo"）。
+            query (str): 検索クエリ。
+            num_results (int): 取得件数。
+            fetch (Callable[[], list[dict]]): 実際に検索を行う関数。
+
+        Returns:
+            list[dict]: 検索結果のリスト。
+        """
+        key = self.make_key(provider, query, num_results)
+        entry = self._lookup(key)
+
+        if entry is not None:
+            results, stored_at = entry
+            age = time.time() - stored_at
+            if age < self._ttl:
+                with self._lock:
+                    self._hits += 1
+                return results
+            if age < self._ttl + self._stale_ttl:
+                with self._lock:
+                    self._stale_hits += 1
+                    start_refresh = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start_refresh:
+                    # 再検索のスパンにも質問IDとモードが付くよう、呼び出し元のコンテキストで実行する
+                    threading.Thread(
+                        target=copy_context().run, args=(self._refresh, key, fetch), daemon=True
+                    ).start()
+                return results
+
+        with self._lock:
+            self._misses += 1
+        results = fetch()
+        # 一時的な失敗の可能性があるため、空の結果はキャッシュしない
+        if results:
+            self._store(key, results)
+        return results
+
+    def stats(self) -> dict:
+        """
+        キャッシュの統計情報を返す。
+
+        Returns:
+            dict: ヒット数、古い結果を返した回数、ミス数。
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses
+            }
+
+
+def create_search_cache() -> SearchCache:
+    """
+    設定に従って検索結果キャッシュを作成する。
+    SEARCH_CACHE_DB_PATH が指定されている場合はSQLiteのストアを2段目に追加する。
+    """
+    max_age = Config.SEARCH_CACHE_TTL + Config.SEARCH_CACHE_STALE_TTL
+    stores = [MemorySearchStore(Config.SEARCH_CACHE_MAXSIZE, max_age)]
+    if Config.SEARCH_CACHE_DB_PATH:
+        stores.append(SqliteSearchStore(Config.SEARCH_CACHE_DB_PATH, max_age))
+    return SearchCache(stores, Config.SEARCH_CACHE_TTL, Config.SEARCH_CACHE_STALE_TTL)
+
+
+search_cache = create_search_cache()
@@ -1,16 +1,30 @@
 
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from duckduckgo_search import DDGS
+from app.config import Config
+from app.extention import get_http_session
+from app.services.search_cache import search_cache
+from app.services.tracing import tracer
+from contextvars import copy_context
 import json
+import logging
+import time
 
 
-with open('app/google_config.json') as config_file:
+logger = logging.getLogger(__name__)
+
+
+with open(Config.GOOGLE_CONFIG_PATH) as config_file:
     config = json.load(config_file)
 
 API_KEY = config['search']['api_key']
 SEARCH_ENGINE_ID = config['search']['search_engine_id']
-GOOGLE_API_URL = "https://www.googleapis.com/customsearch/v1"
+GOOGLE_API_URL = Config.GOOGLE_SEARCH_API_URL
+
+# ヘッジ検索で各プロバイダを並行に呼び出すためのスレッドプール
+search_executor = ThreadPoolExecutor(max_workers=Config.SEARCH_EXECUTOR_WORKERS, thread_name_prefix="search")
 
+@tracer.traced("search", "google")
 def search_google(query, num_results=6) -> list[dict]:
     """
     Google Custom Search APIを非同期で使って指定したクエリで検索し、結果を整形する。
@@ -33,7 +47,7 @@ def search_google(query, num_results=6) -> list[dict]:
     }
 
     try:
-        response = requests.get(GOOGLE_API_URL, params=params, timeout=10)
+        response = get_http_session("google_search").get(GOOGLE_API_URL, params=params)
         response.raise_for_status()  # HTTPエラーを確認
         data = response.json()
         # 検索結果を整形してリストにする
@@ -50,6 +64,7 @@ def search_google(query, num_results=6) -> list[dict]:
         raise Exception(f"Google APIエラー: {e}")
     
 
+@tracer.traced("search", "duckduckgo")
 def search_duckduckgo(search_query: str,num_results=6) -> list[dict]:
     """
     DuckDuckGo検索を行い、結果をタイトルとURLのリスト形式で返す。
@@ -62,30 +77,53 @@ def search_duckduckgo(search_query: str,num_results=6) -> list[dict]:
     """
     results_list = []
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(
-                keywords=search_query,
-                region='jp-jp',
-                safesearch='off',
-                timelimit=None,
-                max_results=num_results
-            ))
-
-            for result in results:
-                results_list.append({
-                    "title": result.get("title", ""),
-                    "url": result.get("href", ""),
-                    "snippet": result.get("body", "")  # スニペットを追加
-                })
+        if Config.DUCKDUCKGO_SHIM_URL:
+            # ベンチマーク用の代替サーバーから同じ形式の結果を取得
+            response = get_http_session("duckduckgo_shim").get(
+                Config.DUCKDUCKGO_SHIM_URL, params={"q": search_query, "max_results": num_results}
+            )
+            response.raise_for_status()
+            results = response.json()
+        else:
+            with DDGS() as ddgs:
+                results = list(ddgs.text(
+                    keywords=search_query,
+                    region='jp-jp',
+                    safesearch='off',
+                    timelimit=None,
+                    max_results=num_results
+                ))
+
+        for result in results:
+            results_list.append({
+                "title": result.get("title", ""),
+                "url": result.get("href", ""),
+                "snippet": result.get("body", "")  # スニペットを追加
+            })
     except Exception as e:
         raise Exception(f"DuckDuckGo検索エラー: {e}")
 
     return results_list
 
 
+def search_google_cached(query: str) -> list[dict]:
+    """
+    キャッシュを参照してGoogle Custom Search APIで検索する。
+    """
+    return search_cache.cached_search("google", query, 6, lambda: search_google(query))
+
+
+def search_duckduckgo_cached(query: str) -> list[dict]:
+    """
+    キャッシュを参照してDuckDuckGoで検索する。
+    """
+    return search_cache.cached_search("duckduckgo", query, 6, lambda: search_duckduckgo(query))
+
+
 def search_with_fallback(query: str) -> list[dict]:
     """
     Google Custom Search APIで検索し、エラー時にはDuckDuckGoに切り替える。
+    検索結果はプロバイダごとに search_cache にキャッシュされる。
 
     Args:
         query (str): 検索クエリ
@@ -95,18 +133,118 @@ def search_with_fallback(query: str) -> list[dict]:
         list[dict]: 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
     """
     try:
-        # Google APIで検索
-        print("Google Custom Search APIを使用しています...")
-        results = search_google(query)
+        # Google APIで検索（キャッシュにあればAPIを呼ばない）
+        logger.debug("Google Custom Search APIを使用しています...")
+        results = search_google_cached(query)
         return results
     except Exception as e:
-        print(f"Google APIでエラーが発生: {e}")
-        print("DuckDuckGoに切り替えます...")
+        logger.warning("Google APIでエラーが発生、DuckDuckGoに切り替えます: %s", e)
 
         # DuckDuckGoで検索
-        results = search_duckduckgo(query)
+        results = search_duckduckgo_cached(query)
         return results
 
+
+def merge_search_results(*result_lists: list[dict]) -> list[dict]:
+    """
+    複数の検索結果を先頭のリストを優先して結合し、URLの重複を除く。
+
+    Returns:
+        list[dict]: 結合された検索結果のリスト。
+    """
+    merged = []
+    seen_urls = set()
+    for results in result_lists:
+        for result in results:
+            url = result.get("url")
+            if not url or url in seen_urls:
+                continue
+            seen_urls.add(url)
+            merged.append(result)
+    return merged
+
+
+def search_hedged(query: str) -> list[dict]:
+    """
+    Googleで検索を開始し、SEARCH_HEDGE_DELAY 秒以内に結果が得られなければ
+    DuckDuckGoでの検索も並行して開始する（0の場合は最初から並行）。
+    先に得られた空でない結果を返し、もう一方の結果は待たない。
+
+    SEARCH_MERGE が有効な場合は、最初の結果が得られた後も最大 SEARCH_MERGE_WAIT 秒
+    もう一方を待ち、両方の結果をURLで重複を除いて結合する（Googleの結果を優先）。
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        list[dict]: 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
+    """
+    # スパンに質問IDとモードが付くよう、呼び出し元のコンテキストでプロバイダを呼び出す
+    google_future = search_executor.submit(copy_context().run, search_google_cached, query)
+    futures = {google_future: "google"}
+
+    done, _ = wait([google_future], timeout=Config.SEARCH_HEDGE_DELAY)
+    if not done or google_future.exception() or not google_future.result():
+        logger.info("DuckDuckGoでの検索を並行して開始します...")
+        futures[search_executor.submit(copy_context().run, search_duckduckgo_cached, query)] = "duckduckgo"
+
+    results_by_provider: dict[str, list[dict]] = {}
+    last_error = None
+    error_count = 0
+    pending = set(futures)
+    deadline = None
+    while pending:
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            provider = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.warning("%sでの検索でエラーが発生: %s", provider, e)
+                last_error = e
+                error_count += 1
+                continue
+            if results:
+                results_by_provider[provider] = results
+
+        if results_by_provider:
+            if not Config.SEARCH_MERGE:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + Config.SEARCH_MERGE_WAIT
+
+    # 実行前のものは取り消す（実行中の検索はキャッシュに結果を残して終了する）
+    for future in pending:
+        future.cancel()
+
+    if results_by_provider:
+        return merge_search_results(
+            *(results_by_provider[provider] for provider in ("google", "duckduckgo") if provider in results_by_provider)
+        )
+    if error_count == len(futures):
+        raise Exception(f"すべての検索プロバイダでエラーが発生: {last_error}")
+    return []
+
+
+def search(query: str) -> list[dict]:
+    """
+    SEARCH_STRATEGY に従って検索する。
+    fallback: Googleでエラーが発生した場合のみDuckDuckGoで検索する。
+    hedged: GoogleとDuckDuckGoを並行して検索する（search_hedged を参照）。
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        list[dict]: 検索結果のリスト [{'title': '...', 'url': '...', 'snippet': '...'}, ...]
+    """
+    if Config.SEARCH_STRATEGY == "hedged":
+        return search_hedged(query)
+    return search_with_fallback(query)
+
 def main():
     try:
         query = "徳島県 県知事 現在"
@@ -0,0 +1,143 @@
+import logging
+import re
+import unicodedata
+
+from app.config import Config
+
+
+logger = logging.getLogger(__name__)
+
+
+PASSAGE_TOKENS = 120
+"""1つのパッセージにまとめる目安のトークン数"""
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?])")
+
+_encoding = None
+
+
+def _tiktoken_encoding():
+    """
+    TOKEN_COUNTER=tiktoken の場合に tiktoken のエンコーディングを読み込む。
+    読み込めない場合（未インストール、エンコーディングファイルが取得できない等）はNone。
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning("tiktoken is not available, falling back to approximate token counts: %s", e)
+            _encoding = False
+    return _encoding or None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を見積もる。
+
+    通常はネットワークを使わない近似（ASCIIは4文字で1トークン、それ以外は1文字1トークン）で数える。
+    日本語はgpt-4o系のトークナイザで1文字1トークン以下になるため、多めの見積もりになる。
+    TOKEN_COUNTER=tiktoken の場合は tiktoken で数える。
+
+    Args:
+        text (str): テキスト。
+
+    Returns:
+        int: トークン数の見積もり。
+    """
+    if Config.TOKEN_COUNTER == "tiktoken":
+        encoding = _tiktoken_encoding()
+        if encoding:
+            return len(encoding.encode(text))
+
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def split_passages(text: str, passage_tokens: int = PASSAGE_TOKENS) -> list[str]:
+    """
+    テキストを行単位で、目安のトークン数ごとのパッセージに分割する。
+    目安を超える長い行は文単位、それでも長い場合は文字数で分割する。
+
+    Args:
+        text (str): テキスト。
+        passage_tokens (int): 1つのパッセージの目安のトークン数。
+
+    Returns:
+        list[str]: パッセージのリスト。
+    """
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if estimate_tokens(line) <= passage_tokens:
+            units.append(line)
+            continue
+        for sentence in _SENTENCE_END.split(line):
+            while estimate_tokens(sentence) > passage_tokens:
+                units.append(sentence[:passage_tokens])
+                sentence = sentence[passage_tokens:]
+            if sentence:
+                units.append(sentence)
+
+    passages = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > passage_tokens:
+            passages.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def _bigrams(text: str) -> set[str]:
+    normalized = "".join(unicodedata.normalize("NFKC", text).lower().split())
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+def select_passages(text: str, query: str, token_budget: int) -> str:
+    """
+    質問との関連が高いパッセージを、合計がトークン予算に収まるだけ選ぶ。
+
+    関連度は質問の文字bigramがパッセージに含まれる割合で測る（日本語は単語の区切りが
+    ないため文字単位とする）。選んだパッセージは元の順序で結合する。
+    テキスト全体が予算内の場合はそのまま返す。
+
+    Args:
+        text (str): スクレイピングしたページなどのテキスト。
+        query (str): ユーザーの質問。
+        token_budget (int): トークン予算（0以下の場合は制限しない）。
+
+    Returns:
+        str: 予算内に収めたテキスト。
+    """
+    if token_budget <= 0 or estimate_tokens(text) <= token_budget:
+        return text
+
+    passages = split_passages(text)
+    query_bigrams = _bigrams(query)
+
+    def score(index: int) -> tuple[float, int]:
+        passage_bigrams = _bigrams(passages[index])
+        overlap = len(query_bigrams & passage_bigrams) / len(query_bigrams) if query_bigrams else 0
+        # 同点の場合はページの前方を優先する
+        return overlap, -index
+
+    selected = []
+    used_tokens = 0
+    for index in sorted(range(len(passages)), key=score, reverse=True):
+        passage_tokens = estimate_tokens(passages[index])
+        if used_tokens + passage_tokens > token_budget:
+            continue
+        selected.append(index)
+        used_tokens += passage_tokens
+
+    return "\n".join(passages[index] for index in sorted(selected))
@@ -0,0 +1,239 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import Config
+
+
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+"""スパンの所要時間のヒストグラムのバケット境界（秒）"""
+
+_question_id: ContextVar[str | None] = ContextVar("trace_question_id", default=None)
+_mode: ContextVar[str | None] = ContextVar("trace_mode", default=None)
+
+
+def current_tags() -> tuple[str | None, str | None]:
+    """
+    現在のコンテキストの質問IDとモードを返す（ログへの付与用）。
+    """
+    return _question_id.get(), _mode.get()
+
+
+class _Histogram:
+    """
+    バケットごとの件数・合計・件数を保持するヒストグラム（Prometheusのhistogram型）
+    """
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(SPAN_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, duration: float, error: bool):
+        index = bisect.bisect_left(SPAN_BUCKETS, duration)
+        if index < len(SPAN_BUCKETS):
+            self.bucket_counts[index] += 1
+        self.total += duration
+        self.count += 1
+        if error:
+            self.errors += 1
+
+
+class Tracer:
+    """
+    処理段階・外部呼び出しの所要時間（スパン）を記録するクラス
+
+    直近のスパンはリングバッファに、種類・名前・モードごとの集計はヒストグラムに保持する。
+    スパンには bind で設定した質問IDとモードが付く（contextvars で管理するため、
+    asyncio のタスクや asyncio.to_thread の呼び出し先にも引き継がれる）。
+    """
+
+    def __init__(self, buffer_size: int):
+        """
+        Args:
+            buffer_size (int): リングバッファに保持するスパンの件数。
+        """
+        self._spans = deque(maxlen=buffer_size)
+        self._histograms: dict[tuple[str, str, str], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def bind(self, question_id: str | None = None, mode: str | None = None):
+        """
+        ブロック内で記録するスパンに質問IDとモードを付ける。
+        """
+        question_token = _question_id.set(question_id if question_id is not None else _question_id.get())
+        mode_token = _mode.set(mode if mode is not None else _mode.get())
+        try:
+            yield
+        finally:
+            _mode.reset(mode_token)
+            _question_id.reset(question_token)
+
+    def set_mode(self, mode: str):
+        """
+        bind のブロック内で、後から判明したモードを設定する。
+        """
+        _mode.set(mode)
+
+    def record(self, kind: str, name: str, started_at: float, duration: float, error: str | None = None):
+        """
+        スパンを1件記録する。
+
+        Args:
+            kind (str): 種類（stage / openai / google / duckduckgo / scrape / db など）。
+            name (str): 名前（段階名、モデル名など）。
+            started_at (float): 開始時刻（UNIX時間）。
+            duration (float): 所要時間（秒）。
+            error (str | None): 例外で終了した場合はその型名。
+        """
+        mode = _mode.get()
+        entry = {
+            "kind": kind,
+            "name": name,
+            "question_id": _question_id.get(),
+            "mode": mode,
+            "started_at": started_at,
+            "duration": duration,
+            "error": error
+        }
+        key = (kind, name, mode or "")
+        with self._lock:
+            self._spans.append(entry)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(duration, error is not None)
+
+    @contextmanager
+    def span(self, kind: str, name: str):
+        """
+        ブロックの実行時間をスパンとして記録する。例外は記録したうえでそのまま送出する。
+
+        Args:
+            kind (str): 種類。
+            name (str): 名前。
+        """
+        started_at = time.time()
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(kind, name, started_at, time.perf_counter() - started, error)
+
+    def traced(self, kind: str, name: str | None = None):
+        """
+        関数（コルーチン関数を含む）の実行時間をスパンとして記録するデコレータ。
+        name を省略した場合は関数名を使う。
+        """
+        def decorator(func):
+            span_name = name or func.__name__
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(kind, span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(kind, span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def recent(self, question_id: str | None = None, limit: int = 100) -> list[dict]:
+        """
+        直近のスパンを新しい順に返す。
+
+        Args:
+            question_id (str | None): 指定した場合はその質問のスパンのみ。
+            limit (int): 最大件数。
+
+        Returns:
+            list[dict]: スパンのリスト。
+        """
+        with self._lock:
+            spans = list(self._spans)
+        spans.reverse()
+        if question_id is not None:
+            spans = [span for span in spans if span["question_id"] == question_id]
+        return spans[:limit]
+
+    def render_prometheus(self) -> list[str]:
+        """
+        ヒストグラムをPrometheusのテキスト形式の行として返す。
+        """
+        with self._lock:
+            snapshot = [
+                (key, list(histogram.bucket_counts), histogram.total, histogram.count, histogram.errors)
+                for key, histogram in sorted(self._histograms.items())
+            ]
+
+        lines = [
+            "# HELP seiji_talk_span_seconds Duration of pipeline stages and outbound calls.",
+            "# TYPE seiji_talk_span_seconds histogram"
+        ]
+        for (kind, name, mode), bucket_counts, total, count, _ in snapshot:
+            labels = f'kind="{_escape(kind)}",name="{_escape(name)}",mode="{_escape(mode)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(SPAN_BUCKETS, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'seiji_talk_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'seiji_talk_span_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"seiji_talk_span_seconds_sum{{{labels}}} {total}")
+            lines.append(f"seiji_talk_span_seconds_count{{{labels}}} {count}")
+
+        lines.append("# HELP seiji_talk_span_errors_total Spans that ended with an exception.")
+        lines.append("# TYPE seiji_talk_span_errors_total counter")
+        for (kind, name, mode), _, _, _, errors in snapshot:
+            labels = f'kind="{_escape(kind)}",name="{_escape(name)}",mode="{_escape(mode)}"'
+            lines.append(f"seiji_talk_span_errors_total{{{labels}}} {errors}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+tracer = Tracer(Config.TRACE_BUFFER_SIZE)
+
+
+def instrument_db_commits():
+    """
+    SQLAlchemyのセッションのコミット（フラッシュを含む）をスパン（kind=db, name=commit）として記録する。
+    """
+    if event.contains(Session, "before_commit", _before_commit):
+        return
+    event.listen(Session, "before_commit", _before_commit)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+
+
+def _before_commit(session):
+    session.info["trace_commit_started"] = (time.time(), time.perf_counter())
+
+
+def _after_commit(session):
+    started = session.info.pop("trace_commit_started", None)
+    if started is not None:
+        tracer.record("db", "commit", started[0], time.perf_counter() - started[1])
+
+
+def _after_rollback(session):
+    started = session.info.pop("trace_commit_started", None)
+    if started is not None:
+        tracer.record("db", "commit", started[0], time.perf_counter() - started[1], "Rollback")
@@ -0,0 +1,255 @@
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import click
+from flask.cli import AppGroup
+
+from app.config import Config
+from app.models.model import Question
+from app.repositories.master_data import master_data
+from app.repositories.repository import SeijiTalkRepository
+from app.services.answer_cache import answer_cache
+from app.services.openai_service import client, build_word_answer_messages, parse_word_answer
+
+
+WORD_BATCH_ENDPOINT = "/v1/chat/completions"
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+"""これ以上状態が変わらないバッチのステータス"""
+
+_state_lock = threading.Lock()
+
+
+logger = logging.getLogger(__name__)
+
+
+def uses_word_batch(question: Question) -> bool:
+    """
+    質問をワーカープールで処理せず、バッチで回答するかどうかを返す。
+    WORD_ANSWER_MODE=batch の用語モードの質問のうち、回答キャッシュにないものが対象。
+
+    Args:
+        question (Question): 質問オブジェクト。
+
+    Returns:
+        bool: バッチで回答する場合はTrue。
+    """
+    return (
+        Config.WORD_ANSWER_MODE == "batch"
+        and master_data.mode_name(question.mode_id) == "word"
+        and not answer_cache.contains(question.message, "word")
+    )
+
+
+def load_state() -> dict:
+    """
+    投入済みのバッチと質問IDの対応（{バッチID: [質問ID, ...]}）を読み込む。
+    """
+    try:
+        with open(Config.WORD_BATCH_STATE_PATH, encoding="utf-8") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state: dict):
+    """
+    投入済みのバッチと質問IDの対応を保存する。
+    """
+    temp_path = f"{Config.WORD_BATCH_STATE_PATH}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, Config.WORD_BATCH_STATE_PATH)
+
+
+def build_batch_request(question: Question) -> dict:
+    """
+    質問1件分のバッチ入力（JSONLの1行）を作成する。custom_id には質問IDを使う。
+    """
+    return {
+        "custom_id": question.id,
+        "method": "POST",
+        "url": WORD_BATCH_ENDPOINT,
+        "body": {
+            "model": "gpt-4o-mini",
+            "messages": build_word_answer_messages(question.message),
+            "temperature": 0.7,
+            "max_tokens": 250
+        }
+    }
+
+
+def submit_word_batch(limit: int | None = None) -> tuple[str | None, int]:
+    """
+    PENDINGの用語モードの質問のうち、まだバッチに投入していないものを1つのバッチとして投入する。
+    アプリケーションコンテキスト内で呼び出す。
+
+    Args:
+        limit (int | None): 投入する最大件数。省略時は WORD_BATCH_MAX_QUESTIONS。
+
+    Returns:
+        tuple[str | None, int]: バッチID（投入する質問がない場合はNone）と投入した件数。
+    """
+    with _state_lock:
+        state = load_state()
+        submitted_ids = {question_id for question_ids in state.values() for question_id in question_ids}
+
+        questions = Question.query\
+            .filter(Question.mode_id == master_data.mode_id("word"))\
+            .filter(Question.status_id == master_data.status_id("PENDING"))\
+            .order_by(Question.created_at.asc())\
+            .all()
+        questions = [question for question in questions if question.id not in submitted_ids]
+        questions = questions[:limit or Config.WORD_BATCH_MAX_QUESTIONS]
+        if not questions:
+            return None, 0
+
+        lines = "\n".join(json.dumps(build_batch_request(question), ensure_ascii=False) for question in questions)
+        input_file = client.files.create(
+            file=("word_batch.jsonl", io.BytesIO(lines.encode("utf-8"))),
+            purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=WORD_BATCH_ENDPOINT,
+            completion_window=Config.WORD_BATCH_COMPLETION_WINDOW,
+            metadata={"mode": "word"}
+        )
+
+        state[batch.id] = [question.id for question in questions]
+        save_state(state)
+        logger.info("Submitted batch %s with %d word questions.", batch.id, len(questions))
+        return batch.id, len(questions)
+
+
+def _read_batch_file(file_id: str | None) -> list[dict]:
+    if not file_id:
+        return []
+    content = client.files.content(file_id).text
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def _apply_batch_results(question_ids: list[str], output: list[dict], errors: list[dict]) -> dict:
+    """
+    バッチの結果を各質問の回答として保存する。
+    回答が得られなかった質問、形式が不正な回答の質問はFAILUREにする。
+
+    Returns:
+        dict: 保存した件数（saved）とFAILUREにした件数（failed）。
+    """
+    answers = {}
+    for line in output:
+        response = line.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        try:
+            content = response["body"]["choices"][0]["message"]["content"].strip()
+        except (KeyError, IndexError, TypeError, AttributeError):
+            continue
+        answers[line.get("custom_id")] = parse_word_answer(content)
+
+    for line in errors:
+        logger.warning("Batch request for question %s failed: %s", line.get("custom_id"), line.get("error") or line.get("response"))
+
+    counts = {"saved": 0, "failed": 0}
+    for question_id in question_ids:
+        question = Question.query.filter_by(id=question_id).first()
+        if question is None or question.status_id != master_data.status_id("PENDING"):
+            continue
+        answer = answers.get(question_id)
+        try:
+            if not answer:
+                raise ValueError("No valid answer in batch output.")
+            SeijiTalkRepository.save_word_answer(question, answer)
+            answer_cache.put(question.message, "word", answer)
+            counts["saved"] += 1
+        except Exception as e:
+            logger.error("Error saving batch answer for question %s: %s", question_id, e)
+            SeijiTalkRepository.mark_question_failed(question)
+            counts["failed"] += 1
+    return counts
+
+
+def poll_word_batches() -> dict:
+    """
+    投入済みのバッチの状態を確認し、終了したバッチの結果を保存する。
+    アプリケーションコンテキスト内で呼び出す。
+
+    失敗・期限切れ・取り消しとなったバッチでも、出力があれば保存する。結果の
+    得られなかった質問はFAILUREにする。
+
+    Returns:
+        dict: 未終了のバッチ数（in_progress）、保存した件数（saved）、FAILUREにした件数（failed）、
+            状態を確認できなかったバッチ数（errors）。
+    """
+    with _state_lock:
+        state = load_state()
+        totals = {"in_progress": 0, "saved": 0, "failed": 0, "errors": 0}
+
+        for batch_id, question_ids in list(state.items()):
+            try:
+                batch = client.batches.retrieve(batch_id)
+                if batch.status not in TERMINAL_STATUSES:
+                    totals["in_progress"] += 1
+                    continue
+
+                logger.info("Batch %s finished with status '%s'.", batch_id, batch.status)
+                output_lines = _read_batch_file(batch.output_file_id)
+                error_lines = _read_batch_file(batch.error_file_id)
+            except Exception as e:
+                # 確認できなかったバッチは状態に残し、次回の poll で確認し直す（他のバッチの処理は続ける）
+                logger.error("Error polling batch %s: %s", batch_id, e)
+                totals["errors"] += 1
+                continue
+
+            counts = _apply_batch_results(question_ids, output_lines, error_lines)
+            totals["saved"] += counts["saved"]
+            totals["failed"] += counts["failed"]
+
+            del state[batch_id]
+            save_state(state)
+
+        return totals
+
+
+word_batch_cli = AppGroup("word-batch", help="用語モードの回答をOpenAIのBatch APIで生成します。")
+
+
+@word_batch_cli.command("submit")
+@click.option("--limit", type=int, default=None, help="投入する最大件数")
+def submit_command(limit):
+    """
+    PENDINGの用語モードの質問をバッチとして投入します（flask word-batch submit）。
+    """
+    batch_id, count = submit_word_batch(limit)
+    if batch_id is None:
+        click.echo("No pending word questions to submit.")
+    else:
+        click.echo(f"{batch_id}: {count} questions")
+
+
+@word_batch_cli.command("poll")
+@click.option("--wait", is_flag=True, help="すべてのバッチが終了するまで待つ")
+@click.option("--interval", type=float, default=None, help="--wait 時の確認間隔（秒）")
+@click.pass_context
+def poll_command(ctx, wait, interval):
+    """
+    投入済みのバッチを確認し、終了したものの回答を保存します（flask word-batch poll）。
+    確認・保存に失敗したバッチが残っている場合は終了コード1で終了します。
+    """
+    while True:
+        totals = poll_word_batches()
+        click.echo(
+            f"in_progress={totals['in_progress']} saved={totals['saved']} failed={totals['failed']} errors={totals['errors']}"
+        )
+        if not wait or totals["in_progress"] == 0:
+            break
+        time.sleep(interval or Config.WORD_BATCH_POLL_INTERVAL)
+
+    if totals["errors"]:
+        click.echo(f"{totals['errors']} batches could not be polled; they will be retried on the next poll.", err=True)
+        ctx.exit(1)
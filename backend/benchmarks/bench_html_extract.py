@@ -0,0 +1,115 @@
+"""
+HTMLからのテキスト抽出のマイクロベンチマーク
+
+保存したHTMLファイル（官公庁・ニュースサイトのページなど）を各抽出エンジンで
+処理し、スループットとピークメモリ（tracemalloc）を比較する。
+bs4 が従来の実装（BeautifulSoup + html.parser でページ全体を get_text）。
+
+使い方（backend ディレクトリで実行）:
+    python benchmarks/bench_html_extract.py --corpus path/to/html_dir
+    python benchmarks/bench_html_extract.py              # コーパスがない場合は合成ページで計測
+
+コーパスのHTMLは UTF-8 以外（Shift_JIS など）でもよい。metaタグの文字コード指定を使って読み込む。
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.services.html_extract import extract_text_from_chunks, lxml  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+
+def synthetic_page(index: int, paragraphs: int = 400) -> bytes:
+    """
+    ナビゲーション・スクリプト・フッターを含む、官公庁サイト風の合成ページを作成する。
+    """
+    nav = "".join(f'<li><a href="/menu/{i}">メニュー項目{i}</a></li>' for i in range(150))
+    body = "".join(
+        f"<p>令和6年度第{i}回の定例会において、県知事は予算案{index}について説明し、"
+        f"議員からの質疑に答弁しました。詳細は<a href='/doc/{i}'>資料{i}</a>をご覧ください。</p>"
+        for i in range(paragraphs)
+    )
+    script = "<script>" + "var x = {};".join(str(i) for i in range(3000)) + "</script>"
+    html = (
+        "<!DOCTYPE html><html lang='ja'><head><meta charset='utf-8'><title>定例会の概要</title>"
+        f"<style>{'.a{color:red}' * 2000}</style>{script}</head><body>"
+        f"<header><h1>徳島県</h1></header><nav><ul>{nav}</ul></nav>"
+        f"<main><article><h2>定例会の概要</h2>{body}</article></main>"
+        f"<aside>{nav}</aside><footer>Copyright 徳島県</footer>{script}</body></html>"
+    )
+    return html.encode("utf-8")
+
+
+def load_corpus(directory: str | None, synthetic_pages: int) -> list[tuple[str, bytes]]:
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "**", "*.htm*"), recursive=True))
+        if not paths:
+            sys.exit(f"No HTML files found in {directory}")
+        pages = []
+        for path in paths:
+            with open(path, "rb") as html_file:
+                pages.append((os.path.basename(path), html_file.read()))
+        return pages
+    return [(f"synthetic-{i}.html", synthetic_page(i)) for i in range(synthetic_pages)]
+
+
+def run(engine: str, pages: list[tuple[str, bytes]], repeat: int, max_bytes: int) -> dict:
+    def extract(content: bytes) -> str:
+        chunks = (content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE))
+        return extract_text_from_chunks(chunks, max_bytes=max_bytes, engine=engine)
+
+    # ウォームアップ兼、出力サイズの計測
+    output_chars = sum(len(extract(content)) for _, content in pages)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for _, content in pages:
+            extract(content)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for _, content in pages:
+        extract(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    input_bytes = sum(len(content) for _, content in pages) * repeat
+    return {
+        "engine": engine,
+        "pages_per_sec": len(pages) * repeat / elapsed,
+        "mb_per_sec": input_bytes / elapsed / 1024 / 1024,
+        "peak_mb": peak / 1024 / 1024,
+        "output_chars": output_chars
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="保存したHTMLファイルのディレクトリ")
+    parser.add_argument("--synthetic-pages", type=int, default=20, help="コーパスがない場合の合成ページ数")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-bytes", type=int, default=2 * 1024 * 1024)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.synthetic_pages)
+    engines = ["bs4", "stream"] + (["lxml"] if lxml is not None else [])
+    total_mb = sum(len(content) for _, content in pages) / 1024 / 1024
+    print(f"corpus: {len(pages)} pages, {total_mb:.1f} MB ({'synthetic' if not args.corpus else args.corpus})")
+    if lxml is None:
+        print("lxml is not installed; skipping the lxml engine")
+
+    print(f"{'engine':<8}{'pages/s':>10}{'MB/s':>10}{'peak MB':>10}{'chars':>12}")
+    for engine in engines:
+        result = run(engine, pages, args.repeat, args.max_bytes)
+        print(f"{result['engine']:<8}{result['pages_per_sec']:>10.1f}{result['mb_per_sec']:>10.2f}"
+              f"{result['peak_mb']:>10.1f}{result['output_chars']:>12}")
+
+
+if __name__ == "__main__":
+    main()
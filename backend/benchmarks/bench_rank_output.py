@@ -0,0 +1,97 @@
+"""
+検索結果の並べ替え（LLM）の出力形式のベンチマーク
+
+従来の形式（検索結果のJSONをすべて出力させる build_rank_messages）と、
+番号のみを出力させる形式（build_rank_index_messages + 構造化出力）で、
+出力トークン数・入力トークン数・応答時間を比較する。
+
+OpenAI APIを呼び出すため OPENAI_API_KEY が必要（OPENAI_BASE_URL で接続先を変更できる）。
+
+使い方（backend ディレクトリで実行）:
+    python benchmarks/bench_rank_output.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.services.openai_service import (  # noqa: E402
+    client, build_rank_messages, build_rank_index_messages, RANK_INDEX_RESPONSE_FORMAT,
+    parse_ranked_results, parse_ranked_indices
+)
+
+QUERY = "徳島県 知事 現在"
+RESULTS = [
+    {"title": "徳島県の観光情報 | 阿波ナビ", "url": "https://www.awanavi.jp/",
+     "snippet": "徳島県の観光スポット、イベント、グルメ情報をご紹介します。渦潮や祖谷のかずら橋など見どころ満載。"},
+    {"title": "知事室へようこそ｜徳島県ホームページ", "url": "https://www.pref.tokushima.lg.jp/chiji/",
+     "snippet": "徳島県知事 後藤田正純のプロフィール、県政運営の基本方針、記者会見の記録を掲載しています。"},
+    {"title": "徳島県知事選挙 2023 開票結果", "url": "https://www.nhk.or.jp/senkyo/tokushima/",
+     "snippet": "2023年4月9日投開票の徳島県知事選挙で、新人の後藤田正純氏が初当選しました。"},
+    {"title": "飯泉嘉門 - Wikipedia", "url": "https://ja.wikipedia.org/wiki/飯泉嘉門",
+     "snippet": "飯泉嘉門は日本の政治家、総務官僚。2003年から2023年まで徳島県知事を5期務めた。"},
+    {"title": "徳島県議会", "url": "https://www.pref.tokushima.lg.jp/gikai/",
+     "snippet": "徳島県議会の会議日程、議員名簿、本会議の中継・録画配信のご案内です。"},
+    {"title": "後藤田知事 定例記者会見（令和6年12月）", "url": "https://www.pref.tokushima.lg.jp/kaiken/",
+     "snippet": "令和6年12月の知事定例記者会見の動画と発言要旨を掲載しています。"},
+]
+
+FORMATS = {
+    "full_json": dict(
+        messages=build_rank_messages(QUERY, RESULTS),
+        max_tokens=1000,
+        temperature=0.7,
+        parse=parse_ranked_results
+    ),
+    "index_only": dict(
+        messages=build_rank_index_messages(QUERY, RESULTS),
+        max_tokens=100,
+        temperature=0,
+        response_format=RANK_INDEX_RESPONSE_FORMAT,
+        parse=lambda content: parse_ranked_indices(content, RESULTS)
+    ),
+}
+
+
+def run(name: str, runs: int) -> dict:
+    options = dict(FORMATS[name])
+    parse = options.pop("parse")
+    durations, output_tokens, input_tokens, failures = [], [], [], 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = client.chat.completions.create(model="gpt-4o-mini", n=1, **options)
+        durations.append(time.perf_counter() - started)
+        output_tokens.append(response.usage.completion_tokens)
+        input_tokens.append(response.usage.prompt_tokens)
+        try:
+            if not parse(response.choices[0].message.content.strip()):
+                failures += 1
+        except ValueError:
+            failures += 1
+    return {
+        "format": name,
+        "wall_p50": statistics.median(durations),
+        "wall_max": max(durations),
+        "output_tokens": statistics.mean(output_tokens),
+        "input_tokens": statistics.mean(input_tokens),
+        "parse_failures": failures
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'format':<12}{'p50 s':>8}{'max s':>8}{'out tok':>9}{'in tok':>9}{'fail':>6}")
+    for name in FORMATS:
+        result = run(name, args.runs)
+        print(f"{result['format']:<12}{result['wall_p50']:>8.2f}{result['wall_max']:>8.2f}"
+              f"{result['output_tokens']:>9.0f}{result['input_tokens']:>9.0f}{result['parse_failures']:>6}")
+
+
+if __name__ == "__main__":
+    main()
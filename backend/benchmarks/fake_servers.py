@@ -0,0 +1,340 @@
+"""
+外部APIのローカル代替サーバー（動作確認・ベンチマーク用）
+
+次のAPIと同じ形式で固定の応答を返す。接続先の設定をこのサーバーに向けると、
+APIキーやネットワークなしでアプリケーションを動かせる。
+
+    /v1/...                 OpenAI API（チャット補完、ファイル、バッチ）   OPENAI_BASE_URL
+    /customsearch/v1        Google Custom Search API                      GOOGLE_SEARCH_API_URL
+    /oauth2/v2/userinfo     Googleのユーザー情報（トークンをユーザーIDとする） GOOGLE_USERINFO_URL
+    /duckduckgo             DuckDuckGo（DDGSの結果と同じ形式）             DUCKDUCKGO_SHIM_URL
+    /pages/<番号>           検索結果のリンク先のページ（スクレイピング用）
+
+サービス（openai / google / userinfo / duckduckgo / pages）ごとに、応答までの遅延と
+エラー（HTTP 500）を返す確率を指定できる。
+
+使い方（backend ディレクトリで実行）:
+    python benchmarks/fake_servers.py --port 18999 --latency openai=0.3,google=0.1 --error-rate google=0.2
+    OPENAI_BASE_URL=http://127.0.0.1:18999/v1 OPENAI_API_KEY=dummy flask word-batch submit
+"""
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+SERVICES = ("openai", "google", "userinfo", "duckduckgo", "pages")
+
+PAGE_COUNT = 6
+PAGE_PARAGRAPHS = 40
+
+
+def chat_content(request: dict) -> str:
+    """
+    チャット補完のリクエストに対する固定の応答本文を作成する。
+    アプリケーションのプロンプト・構造化出力の形式に合わせた形の応答を返す。
+    """
+    messages = request.get("messages", [])
+    system = messages[0].get("content", "") if messages else ""
+    user = messages[-1].get("content", "") if messages else ""
+    schema = ((request.get("response_format") or {}).get("json_schema") or {}).get("name")
+    numbered = [int(index) for index in re.findall(r"^\[(\d+)\]", user, re.MULTILINE)]
+
+    if schema == "ranking":
+        return json.dumps({"order": list(reversed(numbered))})
+    if schema == "compact_answer":
+        return json.dumps({"message": f"「{user[-40:]}」への回答です。", "references": numbered[:3]},
+                          ensure_ascii=False)
+    if "related_words" in system:
+        return json.dumps({"message": f"{user}とは、政治に関する用語です。",
+                           "related_words": ["国会", "内閣", "与党", "野党"]}, ensure_ascii=False)
+    if "並べ替え" in system:
+        # 従来形式の並べ替え: 検索結果のJSONをそのまま返す
+        match = re.search(r"\[\s*{.*}\s*\]", user, re.DOTALL)
+        return match.group(0) if match else "[]"
+    if "検索クエリ" in system:
+        return user[:30]
+    return "これは要約です。"
+
+
+def completion(request: dict, content: str) -> dict:
+    prompt_tokens = sum(len(message.get("content") or "") for message in request.get("messages", []))
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "gpt-4o-mini"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content),
+                  "total_tokens": prompt_tokens + len(content)}
+    }
+
+
+def search_items(query: str, base_url: str, count: int) -> list[dict]:
+    """
+    検索結果（タイトル・リンク・スニペット）を作成する。リンク先は /pages/<番号>。
+    """
+    return [
+        {"title": f"{query} に関する記事 {index + 1}", "link": f"{base_url}/pages/{index}",
+         "snippet": f"{query}についての解説です。{index + 1}件目の記事では経緯と現在の状況をまとめています。"}
+        for index in range(count)
+    ]
+
+
+def page_html(index: int) -> bytes:
+    """
+    スクレイピング対象のページのHTMLを作成する。
+    """
+    paragraphs = "".join(
+        f"<p>第{index}記事の段落{number}。国会では法案の審議が続き、内閣は方針を説明した。</p>"
+        for number in range(PAGE_PARAGRAPHS)
+    )
+    return (
+        f"<html><head><meta charset='utf-8'><title>記事 {index}</title>"
+        f"<script>var tracking = {index};</script></head>"
+        f"<body><nav>メニュー</nav><article>{paragraphs}</article></body></html>"
+    ).encode("utf-8")
+
+
+class FakeServerState:
+    """
+    代替サーバーの状態（遅延・エラーの設定、アップロードされたファイルとバッチ）
+    """
+
+    def __init__(self, latency: dict[str, float] | None = None, error_rate: dict[str, float] | None = None,
+                 batch_latency: float = 0.5, seed: int | None = None):
+        """
+        Args:
+            latency (dict[str, float] | None): サービスごとの応答までの遅延（秒）。
+            error_rate (dict[str, float] | None): サービスごとのエラーを返す確率（0〜1）。
+            batch_latency (float): バッチが完了するまでの秒数。
+            seed (int | None): エラーを発生させる乱数のシード。
+        """
+        self.latency = latency or {}
+        self.error_rate = error_rate or {}
+        self.batch_latency = batch_latency
+        self.requests = {service: 0 for service in SERVICES}
+        self.errors = {service: 0 for service in SERVICES}
+        self._random = random.Random(seed)
+        self.files: dict[str, dict] = {}
+        self.batches: dict[str, dict] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def begin(self, service: str) -> bool:
+        """
+        リクエストを数えて設定された遅延だけ待ち、エラーを返すべきかどうかを返す。
+        """
+        with self._lock:
+            self.requests[service] += 1
+            failed = self._random.random() < self.error_rate.get(service, 0)
+            if failed:
+                self.errors[service] += 1
+        time.sleep(self.latency.get(service, 0))
+        return failed
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_id = f"file-{next(self._ids)}"
+        entry = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                 "filename": filename, "purpose": purpose, "status": "processed"}
+        with self._lock:
+            self.files[file_id] = {"meta": entry, "content": content}
+        return entry
+
+    def create_batch(self, request: dict) -> dict:
+        batch_id = f"batch_{next(self._ids)}"
+        batch = {"id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+                 "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                 "status": "in_progress", "created_at": int(time.time()), "metadata": request.get("metadata"),
+                 "output_file_id": None, "error_file_id": None,
+                 "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+        with self._lock:
+            self.batches[batch_id] = batch
+        threading.Timer(self.batch_latency, self._run_batch, args=(batch_id,)).start()
+        return batch
+
+    def _run_batch(self, batch_id: str):
+        batch = self.batches[batch_id]
+        lines = self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        output = []
+        for line in filter(None, lines):
+            item = json.loads(line)
+            body = completion(item["body"], chat_content(item["body"]))
+            output.append(json.dumps({"id": f"batch_req_{next(self._ids)}", "custom_id": item["custom_id"],
+                                      "response": {"status_code": 200, "body": body}, "error": None},
+                                     ensure_ascii=False))
+        output_file = self.add_file("\n".join(output).encode("utf-8"), "output.jsonl", "batch_output")
+        with self._lock:
+            batch.update(status="completed", output_file_id=output_file["id"], completed_at=int(time.time()),
+                         request_counts={"total": len(output), "completed": len(output), "failed": 0})
+
+
+def make_handler(state: FakeServerState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body, content_type: str = "application/json"):
+            data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def _stream(self, request: dict, content: str):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for start in range(0, len(content), 8):
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": request.get("model", "gpt-4o-mini"),
+                         "choices": [{"index": 0, "delta": {"content": content[start:start + 8]},
+                                      "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def _fail(self, service: str):
+            self._body()
+            self._send(500, {"error": {"message": f"Injected {service} error", "type": "server_error"}})
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            if path.endswith("/chat/completions"):
+                if state.begin("openai"):
+                    return self._fail("openai")
+                request = json.loads(self._body())
+                content = chat_content(request)
+                if request.get("stream"):
+                    return self._stream(request, content)
+                return self._send(200, completion(request, content))
+            if path.endswith("/files"):
+                raw = b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + self._body()
+                message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(raw)
+                fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+                file_part = fields["file"]
+                return self._send(200, state.add_file(
+                    file_part.get_payload(decode=True), file_part.get_filename() or "upload.jsonl",
+                    fields["purpose"].get_content().strip()
+                ))
+            if path.endswith("/batches"):
+                return self._send(200, state.create_batch(json.loads(self._body())))
+            self._send(404, {"error": {"message": f"Unknown path {path}"}})
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            path = url.path
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            base_url = f"http://{self.headers.get('Host')}"
+
+            if path == "/customsearch/v1":
+                if state.begin("google"):
+                    return self._fail("google")
+                count = min(int(params.get("num", 6)), PAGE_COUNT)
+                return self._send(200, {"items": search_items(params.get("q", ""), base_url, count)})
+            if path == "/duckduckgo":
+                if state.begin("duckduckgo"):
+                    return self._fail("duckduckgo")
+                count = min(int(params.get("max_results", 6)), PAGE_COUNT)
+                return self._send(200, [
+                    {"title": item["title"], "href": item["link"], "body": item["snippet"]}
+                    for item in search_items(params.get("q", ""), base_url, count)
+                ])
+            if path == "/oauth2/v2/userinfo":
+                if state.begin("userinfo"):
+                    return self._fail("userinfo")
+                token = self.headers.get("Authorization", "").removeprefix("Bearer ")[:32]
+                return self._send(200, {"id": token, "email": f"{token}@example.com", "name": token})
+            match = re.fullmatch(r"/pages/(\d+)", path)
+            if match:
+                if state.begin("pages"):
+                    return self._fail("pages")
+                return self._send(200, page_html(int(match.group(1))), "text/html; charset=utf-8")
+
+            match = re.search(r"/batches/([^/]+)$", path)
+            if match and match.group(1) in state.batches:
+                return self._send(200, state.batches[match.group(1)])
+            match = re.search(r"/files/([^/]+)/content$", path)
+            if match and match.group(1) in state.files:
+                return self._send(200, state.files[match.group(1)]["content"], "application/octet-stream")
+            self._send(404, {"error": {"message": f"Unknown path {path}"}})
+
+    return Handler
+
+
+def start(port: int = 0, **options) -> tuple[ThreadingHTTPServer, str]:
+    """
+    代替サーバーを別スレッドで起動する。
+
+    Args:
+        port (int): 待ち受けるポート（0の場合は空いているポート）。
+        **options: FakeServerState に渡す設定（latency, error_rate, batch_latency, seed）。
+
+    Returns:
+        tuple[ThreadingHTTPServer, str]: サーバー（state 属性で状態を参照できる）と、
+            ベースURL（http://127.0.0.1:ポート）。
+    """
+    state = FakeServerState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.state = state
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def parse_service_values(text: str) -> dict[str, float]:
+    """
+    "openai=0.3,google=0.1" 形式の指定をサービスごとの値の辞書にする。
+    """
+    values = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        service, _, value = item.partition("=")
+        if service not in SERVICES:
+            raise argparse.ArgumentTypeError(f"Unknown service '{service}' (choose from {', '.join(SERVICES)}).")
+        values[service] = float(value)
+    return values
+
+
+def add_injection_arguments(parser: argparse.ArgumentParser):
+    """
+    遅延・エラー注入の引数を追加する（run_e2e.py と共通）。
+    """
+    parser.add_argument("--latency", type=parse_service_values, default={},
+                        help="サービスごとの応答までの秒数（例: openai=0.3,google=0.1）")
+    parser.add_argument("--error-rate", type=parse_service_values, default={},
+                        help="サービスごとのエラー（HTTP 500）を返す確率（例: google=0.2）")
+    parser.add_argument("--seed", type=int, default=0, help="エラー注入の乱数のシード")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=18999)
+    parser.add_argument("--batch-latency", type=float, default=0.5, help="バッチが完了するまでの秒数")
+    add_injection_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start(args.port, latency=args.latency, error_rate=args.error_rate,
+                             batch_latency=args.batch_latency, seed=args.seed)
+    print(f"Fake servers listening on {base_url} (OPENAI_BASE_URL={base_url}/v1)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+質問APIのエンドツーエンドのベンチマーク
+
+POST /api/questions から回答の完了（/api/questions/<id>/wait）までを、SQLiteと
+外部APIのローカル代替サーバー（fake_servers.py）を使って計測する。ネットワークや
+APIキーは不要なため、CIで qa_controller・openai_service などの性能の変化を数値で確認できる。
+
+モードごとに、処理件数・成功/失敗件数・1秒あたりの処理件数・エンドツーエンドの
+所要時間（p50/p95/p99）・質問1件あたりのSQL実行回数・最大RSSを出力する。
+
+使い方（backend ディレクトリで実行）:
+    python benchmarks/run_e2e.py --questions 50 --concurrency 8
+    python benchmarks/run_e2e.py --modes latest --pipeline async --answer-source scrape \\
+        --latency openai=0.2,google=0.05 --error-rate google=0.3 --json e2e.json
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCHMARK_DIR, "..")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import fake_servers  # noqa: E402
+
+
+def configure_environment(args, base_url: str, work_dir: str):
+    """
+    アプリケーションを読み込む前に、接続先を代替サーバーとSQLiteに向ける環境変数を設定する。
+    """
+    google_config_path = os.path.join(work_dir, "google_config.json")
+    with open(google_config_path, "w") as config_file:
+        json.dump({
+            "web": {"client_id": "bench", "client_secret": "bench", "redirect_uris": [f"{base_url}/callback"]},
+            "search": {"api_key": "bench", "search_engine_id": "bench"}
+        }, config_file)
+
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'bench.db')}",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "GOOGLE_CONFIG_PATH": google_config_path,
+        "GOOGLE_USERINFO_URL": f"{base_url}/oauth2/v2/userinfo",
+        "GOOGLE_SEARCH_API_URL": f"{base_url}/customsearch/v1",
+        "DUCKDUCKGO_SHIM_URL": f"{base_url}/duckduckgo",
+        "QUESTION_WORKER_AUTOSTART": "False",
+        "QUESTION_WORKER_COUNT": str(args.workers),
+        "QUESTION_QUEUE_MAXSIZE": str(max(100, args.questions)),
+        "LATEST_PIPELINE": args.pipeline,
+        "LATEST_ANSWER_SOURCE": args.answer_source,
+        "WORD_ANSWER_MODE": "realtime",
+        "SEED_ON_STARTUP": "False",
+        "PAGE_CACHE_DIR": "",
+        "SEARCH_CACHE_DB_PATH": "",
+    })
+
+
+class QueryCounter:
+    """
+    SQLAlchemyのエンジンで実行したSQLの回数を数える。
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def reset(self) -> int:
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+
+class RssSampler:
+    """
+    一定間隔でプロセスのRSSを読み取り、最大値を記録する（/proc がない環境ではru_maxrssを使う）。
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _current(self) -> int:
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * self._page_size
+        except OSError:
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._current())
+
+    def __enter__(self):
+        self.peak = self._current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """
+    昇順に並んだ値の百分位数（最近傍法）を返す。
+    """
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def ask(client, token: str, message: str, mode: str, wait_timeout: float) -> tuple[float, int]:
+    """
+    質問を1件登録し、回答が完了するまで待つ。
+
+    Returns:
+        tuple[float, int]: 登録から完了までの秒数と、最後のレスポンスのHTTPステータスコード。
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.perf_counter()
+    response = client.post("/api/questions", json={"message": message, "mode": mode}, headers=headers)
+    # キューが満杯の場合（429）も質問は登録されているため、その質問の完了を待つ
+    if response.status_code not in (202, 429):
+        return time.perf_counter() - started, response.status_code
+
+    question_id = response.get_json()["question_id"]
+    status_code = 202
+    while status_code == 202:
+        response = client.get(f"/api/questions/{question_id}/wait?timeout={wait_timeout}", headers=headers)
+        status_code = response.status_code
+    return time.perf_counter() - started, status_code
+
+
+def run_mode(app, mode: str, args, query_counter: QueryCounter) -> dict:
+    """
+    1つのモードで args.questions 件の質問を args.concurrency 並列で処理し、結果を集計する。
+    """
+    messages = [f"{args.message[mode]} {index}" for index in range(args.questions)]
+    durations: list[float] = []
+    failures = 0
+    lock = threading.Lock()
+    next_index = iter(range(len(messages)))
+
+    def client_loop(client_number: int):
+        nonlocal failures
+        client = app.test_client()
+        token = f"bench-user-{client_number}"
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                return
+            duration, status_code = ask(client, token, messages[index], mode, args.wait_timeout)
+            with lock:
+                durations.append(duration)
+                if status_code != 200:
+                    failures += 1
+
+    query_counter.reset()
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client_loop, args=(number,)) for number in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    queries = query_counter.reset()
+
+    durations.sort()
+    return {
+        "mode": mode,
+        "questions": len(durations),
+        "succeeded": len(durations) - failures,
+        "failed": failures,
+        "qps": len(durations) / elapsed if elapsed else 0.0,
+        "p50": percentile(durations, 0.50),
+        "p95": percentile(durations, 0.95),
+        "p99": percentile(durations, 0.99),
+        "queries_per_question": queries / len(durations) if durations else 0.0,
+        "peak_rss_mb": rss.peak / 1024 / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="word,latest", help="計測するモード（カンマ区切り）")
+    parser.add_argument("--questions", type=int, default=50, help="モードごとの質問数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時に質問するクライアント数")
+    parser.add_argument("--workers", type=int, default=4, help="質問処理ワーカーのスレッド数")
+    parser.add_argument("--pipeline", choices=("sync", "async"), default="sync")
+    parser.add_argument("--answer-source", choices=("snippet", "scrape", "compact"), default="snippet")
+    parser.add_argument("--wait-timeout", type=float, default=30, help="/wait の1回あたりの待機秒数")
+    parser.add_argument("--json", dest="json_path", help="結果をJSONで書き出すファイル")
+    fake_servers.add_injection_arguments(parser)
+    args = parser.parse_args()
+    args.message = {"word": "内閣不信任決議", "latest": "徳島県知事は誰ですか"}
+
+    server, base_url = fake_servers.start(latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    work_dir = tempfile.mkdtemp(prefix="seiji_talk_e2e_")
+    configure_environment(args, base_url, work_dir)
+    os.chdir(BACKEND_DIR)
+
+    from app import create_app, db
+    from app.seeds import register_master_data
+    from app.repositories.master_data import master_data
+    from app.services.question_worker import question_worker
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        register_master_data()
+        master_data.load()
+        query_counter = QueryCounter(db.engine)
+    question_worker.start()
+
+    results = [run_mode(app, mode.strip(), args, query_counter) for mode in args.modes.split(",") if mode.strip()]
+    question_worker.stop(timeout=5)
+    server.shutdown()
+
+    print(f"{'mode':<8}{'n':>5}{'ok':>5}{'fail':>5}{'q/s':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+          f"{'sql/q':>7}{'RSS MB':>8}")
+    for result in results:
+        print(f"{result['mode']:<8}{result['questions']:>5}{result['succeeded']:>5}{result['failed']:>5}"
+              f"{result['qps']:>8.2f}{result['p50']:>8.3f}{result['p95']:>8.3f}{result['p99']:>8.3f}"
+              f"{result['queries_per_question']:>7.1f}{result['peak_rss_mb']:>8.1f}")
+    print("fake server requests:", json.dumps(server.state.requests), "injected errors:", json.dumps(server.state.errors))
+
+    if args.json_path:
+        with open(args.json_path, "w") as json_file:
+            json.dump({
+                "settings": {key: value for key, value in vars(args).items() if key not in ("message", "json_path")},
+                "results": results,
+                "fake_server": {"requests": server.state.requests, "errors": server.state.errors}
+            }, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
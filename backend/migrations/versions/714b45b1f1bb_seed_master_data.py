@@ -0,0 +1,49 @@
+"""Seed master data
+
+Revision ID: 714b45b1f1bb
+Revises: 55ac9503c97c
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '714b45b1f1bb'
+down_revision = '55ac9503c97c'
+branch_labels = None
+depends_on = None
+
+
+statuses = sa.table('statuses', sa.column('id', sa.Integer), sa.column('name', sa.String))
+modes = sa.table('modes', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+STATUS_ROWS = [
+    {'id': 1, 'name': 'PENDING'},
+    {'id': 2, 'name': 'SUCCESS'},
+    {'id': 3, 'name': 'FAILURE'},
+]
+MODE_ROWS = [
+    {'id': 1, 'name': 'latest'},
+    {'id': 2, 'name': 'word'},
+]
+
+
+def _insert_missing(table, rows):
+    # 既に登録済み（以前の before_request での登録など）の行は追加しない
+    connection = op.get_bind()
+    existing = {row[0] for row in connection.execute(sa.select(table.c.id))}
+    missing = [row for row in rows if row['id'] not in existing]
+    if missing:
+        op.bulk_insert(table, missing)
+
+
+def upgrade():
+    _insert_missing(statuses, STATUS_ROWS)
+    _insert_missing(modes, MODE_ROWS)
+
+
+def downgrade():
+    op.execute(modes.delete().where(modes.c.id.in_([row['id'] for row in MODE_ROWS])))
+    op.execute(statuses.delete().where(statuses.c.id.in_([row['id'] for row in STATUS_ROWS])))
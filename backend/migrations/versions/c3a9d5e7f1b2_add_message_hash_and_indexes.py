@@ -0,0 +1,126 @@
+"""Add questions.message_hash and secondary indexes
+
+Revision ID: c3a9d5e7f1b2
+Revises: 714b45b1f1bb
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a9d5e7f1b2'
+down_revision = '714b45b1f1bb'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+questions = sa.table(
+    'questions',
+    sa.column('id', sa.String),
+    sa.column('message', sa.String),
+    sa.column('message_hash', sa.String),
+    sa.column('user_id', sa.String),
+    sa.column('mode_id', sa.Integer),
+    sa.column('created_at', sa.DateTime),
+)
+
+
+def _hash(message: str) -> str:
+    # app.models.model.hash_message と同じ値（マイグレーションはアプリケーションのコードに依存させない）
+    return hashlib.sha256(message.encode('utf-8')).hexdigest()
+
+
+def _backfill_message_hash(connection):
+    if connection.dialect.name == 'mysql':
+        # utf8mb4 の文字列に対する SHA2 は hashlib.sha256(message.encode('utf-8')) と同じ値になる
+        op.execute("UPDATE questions SET message_hash = SHA2(message, 256) WHERE message_hash IS NULL")
+        return
+
+    while True:
+        rows = connection.execute(
+            sa.select(questions.c.id, questions.c.message)
+            .where(questions.c.message_hash.is_(None))
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        connection.execute(
+            questions.update().where(questions.c.id == sa.bindparam('question_id')),
+            [{'question_id': row.id, 'message_hash': _hash(row.message)} for row in rows]
+        )
+
+
+def _disambiguate_duplicates(connection):
+    # 一意制約を作成できるよう、以前に重複して登録された質問は最も古いもの以外のハッシュ値を
+    # 質問IDを加えた値に変える（以降の重複チェックでは最も古い質問が見つかる）
+    duplicates = connection.execute(
+        sa.select(questions.c.user_id, questions.c.mode_id, questions.c.message_hash)
+        .group_by(questions.c.user_id, questions.c.mode_id, questions.c.message_hash)
+        .having(sa.func.count() > 1)
+    ).all()
+    for user_id, mode_id, message_hash in duplicates:
+        rows = connection.execute(
+            sa.select(questions.c.id, questions.c.message)
+            .where(questions.c.user_id == user_id)
+            .where(questions.c.mode_id == mode_id)
+            .where(questions.c.message_hash == message_hash)
+            .order_by(questions.c.created_at, questions.c.id)
+        ).all()
+        for row in rows[1:]:
+            connection.execute(
+                questions.update().where(questions.c.id == row.id)
+                .values(message_hash=_hash(f"{row.message}\0{row.id}"))
+            )
+
+
+def upgrade():
+    connection = op.get_bind()
+
+    with op.batch_alter_table('questions') as batch_op:
+        batch_op.add_column(sa.Column('message_hash', sa.String(length=64), nullable=True))
+
+    _backfill_message_hash(connection)
+    _disambiguate_duplicates(connection)
+
+    with op.batch_alter_table('questions') as batch_op:
+        batch_op.alter_column('message_hash', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_index(
+            'ix_questions_user_mode_message_hash', ['user_id', 'mode_id', 'message_hash'], unique=True
+        )
+        batch_op.create_index('ix_questions_user_created_at_id', ['user_id', 'created_at', 'id'])
+
+    op.create_index('ix_references_answer_id', 'references', ['answer_id'])
+    op.create_index('ix_related_words_answer_id', 'related_words', ['answer_id'])
+
+
+def _keep_foreign_key_index(connection, table: str, column: str, dropping: list[str]):
+    # MySQLは外部キーの列に索引を必須とし、同じ列で始まる索引を作成すると自動で作成した索引を
+    # 削除することがあるため、削除する索引以外に索引が残らない場合は列名の索引を作り直す
+    if connection.dialect.name != 'mysql':
+        return
+    indexes = sa.inspect(connection).get_indexes(table)
+    if not any(index['column_names'][:1] == [column] and index['name'] not in dropping for index in indexes):
+        op.create_index(column, table, [column])
+
+
+def downgrade():
+    connection = op.get_bind()
+
+    _keep_foreign_key_index(connection, 'related_words', 'answer_id', ['ix_related_words_answer_id'])
+    _keep_foreign_key_index(connection, 'references', 'answer_id', ['ix_references_answer_id'])
+    op.drop_index('ix_related_words_answer_id', table_name='related_words')
+    op.drop_index('ix_references_answer_id', table_name='references')
+
+    _keep_foreign_key_index(
+        connection, 'questions', 'user_id', ['ix_questions_user_created_at_id', 'ix_questions_user_mode_message_hash']
+    )
+    with op.batch_alter_table('questions') as batch_op:
+        batch_op.drop_index('ix_questions_user_created_at_id')
+        batch_op.drop_index('ix_questions_user_mode_message_hash')
+        batch_op.drop_column('message_hash')
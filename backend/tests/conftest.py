@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# app.config は読み込み時に環境変数を参照するため、アプリケーションを読み込む前に設定する
+_temp_dir = tempfile.mkdtemp(prefix="seiji_talk_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_temp_dir, 'test.db')}"
+# Googleの認証情報ファイル（app/google_config.json）がなくても読み込めるよう、ダミーを使う
+_google_config_path = os.path.join(_temp_dir, "google_config.json")
+with open(_google_config_path, "w") as google_config:
+    json.dump({"web": {"client_id": "test", "client_secret": "test",
+                       "redirect_uris": ["https://localhost:5000/api/auth/callback"]},
+               "search": {"api_key": "test", "search_engine_id": "test"}}, google_config)
+os.environ["GOOGLE_CONFIG_PATH"] = _google_config_path
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["QUESTION_WORKER_AUTOSTART"] = "False"
+os.environ["SEED_ON_STARTUP"] = "False"
+os.environ.setdefault("LOG_FORMAT", "text")
+
+from app import create_app, db  # noqa: E402
+from app.models.model import User  # noqa: E402
+from app.repositories.master_data import master_data  # noqa: E402
+from app.seeds import register_master_data  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        register_master_data()
+        master_data.invalidate()
+        db.session.add(User(id="user1", email="user1@example.com", name="user1"))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
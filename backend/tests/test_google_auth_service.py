@@ -0,0 +1,40 @@
+import pytest
+
+from app.config import Config
+from app.services import google_auth_service
+from app.services.google_auth_service import cache_user_info, fetch_user_info_cached
+
+
+USER_INFO = {"id": "user1", "email": "user1@example.com", "name": "user1"}
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    google_auth_service.user_info_cache.clear()
+    google_auth_service.token_expiry_cache.clear()
+
+
+@pytest.fixture
+def recorded_ttls(monkeypatch):
+    ttls = []
+    set_user_info = google_auth_service.user_info_cache.set
+    monkeypatch.setattr(google_auth_service.user_info_cache, "set",
+                        lambda key, value, ttl=None: (ttls.append(ttl), set_user_info(key, value, ttl)))
+    monkeypatch.setattr(google_auth_service, "fetch_user_info", lambda access_token: (USER_INFO, None))
+    return ttls
+
+
+def test_unknown_expiry_uses_short_ttl(recorded_ttls):
+    assert fetch_user_info_cached("token") == (USER_INFO, None)
+
+    assert recorded_ttls == [Config.USER_INFO_CACHE_UNKNOWN_EXPIRY_TTL]
+
+
+def test_refetch_is_limited_to_token_expiry(recorded_ttls):
+    cache_user_info("token", USER_INFO, 120)
+    google_auth_service.user_info_cache.clear()
+
+    assert fetch_user_info_cached("token") == (USER_INFO, None)
+
+    assert recorded_ttls[0] == 120
+    assert 119 <= recorded_ttls[1] <= 120
@@ -0,0 +1,22 @@
+import pytest
+
+from app.services.html_extract import extract_text, extract_text_lxml
+
+
+XML_DECLARED_PAGE = '<?xml version="1.0" encoding="utf-8"?><html><body><p>本文です</p></body></html>'
+
+
+def test_extract_text_lxml_ignores_xml_declaration():
+    pytest.importorskip("lxml.html")
+
+    assert extract_text(XML_DECLARED_PAGE, "lxml") == "本文です"
+
+
+def test_extract_text_lxml_falls_back_when_document_is_empty():
+    pytest.importorskip("lxml.html")
+
+    assert extract_text_lxml("<!-- only a comment -->") == ""
+
+
+def test_extract_text_stream_handles_xml_declaration():
+    assert extract_text(XML_DECLARED_PAGE, "stream") == "本文です"
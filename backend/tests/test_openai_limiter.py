@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from app.config import Config
+from app.services import openai_limiter
+from app.services.openai_limiter import ModelLimiter, create_chat_completion
+
+
+class FlakyCompletions:
+    def __init__(self, failures: int):
+        self.failures = failures
+
+    def create(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com"))
+        return SimpleNamespace(usage=None)
+
+
+def test_failed_attempts_refund_reserved_tokens(monkeypatch):
+    limiter = ModelLimiter(rpm=1000, tpm=1000, concurrency=1)
+    monkeypatch.setattr(openai_limiter, "get_limiter", lambda model: limiter)
+    monkeypatch.setattr(openai_limiter, "retry_delay", lambda error, attempt: 0)
+    monkeypatch.setattr(Config, "OPENAI_MAX_RETRIES", 3)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FlakyCompletions(failures=3)))
+
+    create_chat_completion(client, model="test", messages=[], max_tokens=300)
+
+    # 成功した1回分（300トークン）だけが消費される
+    assert 690 <= limiter.tokens._tokens <= 710
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from sqlalchemy import update
+
+from app import db
+from app.models.model import Question
+from app.repositories.master_data import master_data
+from app.repositories.repository import SeijiTalkRepository
+from app.routes.qa_controller import wait_for_question
+
+
+def test_wait_for_question_sees_completion_in_another_process(app):
+    app.config['QUESTION_WAIT_POLL_INTERVAL'] = 0.1
+    question = SeijiTalkRepository.create_question("user1", "消費税とは", "word")
+
+    def complete_without_notifying():
+        # 別のプロセス（flask word-batch poll など）での保存を模して、question_events に通知しない
+        time.sleep(0.3)
+        with app.app_context():
+            db.session.execute(
+                update(Question).where(Question.id == question.id)
+                .values(status_id=master_data.status_id("SUCCESS"))
+            )
+            db.session.commit()
+
+    thread = threading.Thread(target=complete_without_notifying)
+    thread.start()
+    started = time.monotonic()
+    reloaded = wait_for_question(question, 10)
+    thread.join()
+
+    assert master_data.status_name(reloaded.status_id) == "SUCCESS"
+    assert time.monotonic() - started < 2
+
+
+def test_wait_for_question_times_out_while_pending(app):
+    app.config['QUESTION_WAIT_POLL_INTERVAL'] = 0.1
+    question = SeijiTalkRepository.create_question("user1", "消費税とは", "word")
+
+    reloaded = wait_for_question(question, 0.35)
+
+    assert master_data.status_name(reloaded.status_id) == "PENDING"
+
+
+
+def test_stream_sees_completion_in_another_process(app, monkeypatch):
+    app.config['QUESTION_WAIT_POLL_INTERVAL'] = 0.1
+    monkeypatch.setattr(
+        "app.routes.qa_controller.fetch_user_info_cached",
+        lambda access_token: ({"id": "user1", "email": "user1@example.com", "name": "user1"}, None)
+    )
+    question = SeijiTalkRepository.create_question("user1", "消費税とは", "word")
+
+    def fail_without_notifying():
+        time.sleep(0.3)
+        with app.app_context():
+            db.session.execute(
+                update(Question).where(Question.id == question.id)
+                .values(status_id=master_data.status_id("FAILURE"))
+            )
+            db.session.commit()
+
+    thread = threading.Thread(target=fail_without_notifying)
+    thread.start()
+    started = time.monotonic()
+    response = app.test_client().get(
+        f"/api/questions/{question.id}/stream", headers={"Authorization": "Bearer token"}
+    )
+    body = response.get_data(as_text=True)
+    thread.join()
+
+    assert "event: result" in body
+    assert '"state": "FAILURE"' in body
+    assert time.monotonic() - started < 2
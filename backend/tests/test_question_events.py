@@ -0,0 +1,37 @@
+import threading
+import time
+
+from app.services.question_events import QuestionEvents
+
+
+def test_notify_wakes_only_waiters_of_that_question():
+    events = QuestionEvents()
+    results = {}
+
+    def wait(question_id):
+        results[question_id] = events.wait(question_id, 2)
+
+    threads = [threading.Thread(target=wait, args=(question_id,)) for question_id in ("q1", "q2")]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    events.notify("q1")
+    threads[0].join(2)
+
+    assert results == {"q1": True}
+    assert "q2" in events._conditions
+    events.notify("q2")
+    threads[1].join(2)
+    assert results == {"q1": True, "q2": True}
+    assert events._conditions == {}
+
+
+def test_wait_for_chunks_returns_published_text():
+    events = QuestionEvents()
+    events.publish("q1", "消費税")
+    events.publish("q1", "とは")
+
+    assert events.wait_for_chunks("q1", 1, 0) == (["とは"], False)
+    events.notify("q1")
+    assert events.wait_for_chunks("q1", 2, 1) == ([], True)
+    assert events.wait("q1", 0) is True
@@ -0,0 +1,25 @@
+from app.repositories.repository import SeijiTalkRepository
+from app.services.question_worker import QuestionWorkerPool
+
+
+def test_claim_error_marks_backlog(app, monkeypatch):
+    def fail(question_id, worker_id):
+        raise RuntimeError("database is unavailable")
+
+    monkeypatch.setattr(SeijiTalkRepository, "claim_question", staticmethod(fail))
+    pool = QuestionWorkerPool()
+    pool.init_app(app)
+
+    assert pool._claim("question1") is False
+    assert pool._backlog is True
+
+
+def test_recovery_requeues_pending_question(app):
+    question = SeijiTalkRepository.create_question("user1", "消費税とは", "latest")
+    pool = QuestionWorkerPool()
+    pool.init_app(app)
+
+    assert pool.recover_pending() == 1
+    assert pool.recover_pending() == 0
+    assert pool.stats()["pending"] == 1
+    assert question.id in pool._pending_ids
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.config import Config
+from app.services import ranking
+
+
+RESULTS = [
+    {"title": "天気予報", "url": "https://example.com/weather", "snippet": "明日は晴れ"},
+    {"title": "消費税の税率", "url": "https://www.nta.go.jp/tax", "snippet": "消費税の税率は10%です"},
+    {"title": "消費税とは", "url": "https://example.jp/tax", "snippet": "消費税の仕組み"},
+]
+
+
+def fail(*args):
+    raise ValueError("Failed to rank search results")
+
+
+async def fail_async(*args):
+    raise ValueError("Failed to rank search results")
+
+
+@pytest.mark.parametrize("ranker", ["llm", "llm_index"])
+def test_rank_results_falls_back_when_llm_ranker_raises(monkeypatch, ranker):
+    monkeypatch.setattr(Config, "SEARCH_RANKER", ranker)
+    monkeypatch.setattr(ranking, "rank_search_results", fail)
+    monkeypatch.setattr(ranking, "rank_search_results_by_index", fail)
+
+    ranked = ranking.rank_results("消費税", RESULTS)
+
+    assert ranked == ranking.rank_search_results_local("消費税", RESULTS)
+    assert ranked[0]["url"] == "https://www.nta.go.jp/tax"
+
+
+@pytest.mark.parametrize("ranker", ["llm", "llm_index"])
+def test_rank_results_async_falls_back_when_llm_ranker_raises(monkeypatch, ranker):
+    monkeypatch.setattr(Config, "SEARCH_RANKER", ranker)
+    monkeypatch.setattr(ranking, "rank_search_results_async", fail_async)
+    monkeypatch.setattr(ranking, "rank_search_results_by_index_async", fail_async)
+
+    ranked = asyncio.run(ranking.rank_results_async(None, "消費税", RESULTS))
+
+    assert ranked == ranking.rank_search_results_local("消費税", RESULTS)
@@ -0,0 +1,38 @@
+from app import db
+from app.models.model import Question
+from app.repositories.master_data import master_data
+from app.repositories.repository import SeijiTalkRepository
+
+
+def test_create_question_returns_existing_question(app):
+    first = SeijiTalkRepository.create_question("user1", "消費税とは", "word")
+    second = SeijiTalkRepository.create_question("user1", "消費税とは", "word")
+
+    assert second.id == first.id
+    assert Question.query.count() == 1
+
+
+def test_reasking_failed_question_reopens_it(app):
+    question = SeijiTalkRepository.create_question("user1", "消費税とは", "latest")
+    assert SeijiTalkRepository.claim_question(question.id, "host:1")
+    SeijiTalkRepository.mark_question_failed(question)
+    assert master_data.status_name(question.status_id) == "FAILURE"
+
+    reasked = SeijiTalkRepository.create_question("user1", "消費税とは", "latest")
+
+    assert reasked.id == question.id
+    assert master_data.status_name(reasked.status_id) == "PENDING"
+    assert reasked.claimed_by is None
+    assert reasked.claimed_at is None
+    assert SeijiTalkRepository.claim_question(reasked.id, "host:2")
+
+
+def test_reasking_pending_question_keeps_claim(app):
+    question = SeijiTalkRepository.create_question("user1", "消費税とは", "latest")
+    assert SeijiTalkRepository.claim_question(question.id, "host:1")
+
+    reasked = SeijiTalkRepository.create_question("user1", "消費税とは", "latest")
+
+    db.session.refresh(reasked)
+    assert reasked.claimed_by == "host:1"
+    assert not SeijiTalkRepository.claim_question(reasked.id, "host:2")
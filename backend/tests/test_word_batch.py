@@ -0,0 +1,20 @@
+from app.services import word_batch
+
+
+def test_poll_exits_with_error_when_batches_could_not_be_polled(app, monkeypatch):
+    monkeypatch.setattr(word_batch, "poll_word_batches",
+                        lambda: {"in_progress": 0, "saved": 0, "failed": 0, "errors": 1})
+
+    result = app.test_cli_runner().invoke(args=["word-batch", "poll", "--wait"])
+
+    assert result.exit_code == 1
+    assert "errors=1" in result.output
+
+
+def test_poll_exits_cleanly_without_errors(app, monkeypatch):
+    monkeypatch.setattr(word_batch, "poll_word_batches",
+                        lambda: {"in_progress": 0, "saved": 2, "failed": 0, "errors": 0})
+
+    result = app.test_cli_runner().invoke(args=["word-batch", "poll"])
+
+    assert result.exit_code == 0